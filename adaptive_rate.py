@@ -0,0 +1,165 @@
+import math
+import threading
+import time
+import zmq
+from geodesy import destination, haversine
+from wsmp_codec import peek_channel_load
+
+# wsmp_hle.channel_load is the channel busy ratio (CBR) in percent
+CHANNEL_LOAD_SCALE = 100.0
+
+# Reactive DCC in the spirit of ETSI TS 102 687: smoothed CBR upper bound
+# of each state and the minimum gap between beacons it allows (seconds)
+DCC_STATES = (
+    (0.30, 0.04),   # relaxed
+    (0.40, 0.1),    # active 1
+    (0.50, 0.2),    # active 2
+    (0.60, 0.4),    # active 3
+    (math.inf, 1.0),  # restrictive
+)
+
+# CAM-style triggers (ETSI EN 302 637-2 uses 4 deg, 4 m, 0.5 m/s). Position is
+# checked against where the receiver dead-reckons the leader from the last
+# beacon, and tighter than for cars since the follower flies metres behind.
+HEADING_TRIGGER_DEG = 4.0
+POSITION_TRIGGER_M = 1.0
+SPEED_TRIGGER_MPS = 0.5
+
+# Scheduler wake-ups are not exact, intervals are compared with this slack
+TICK_SLACK_S = 0.002
+
+def dcc_min_interval(cbr):
+    for limit, interval in DCC_STATES:
+        if cbr < limit:
+            return interval
+    return DCC_STATES[-1][1]
+
+class AdaptiveRate():
+    """
+    Decides per scheduler tick whether a beacon is due.
+
+    A beacon goes out when the leader's heading or speed has changed beyond
+    the trigger thresholds since the last one, when its position is further
+    than position_m from the last beacon dead-reckoned to now, or when
+    1/min_hz has passed regardless. Beacons are never closer together than
+    the larger of 1/max_hz and the DCC gap for the smoothed channel load,
+    so a dense channel throttles every transmitter and a parked leader
+    drops to min_hz. Call the check at max_hz or faster.
+    """
+    def __init__(self, min_hz=1.0, max_hz=10.0, heading_deg=HEADING_TRIGGER_DEG,
+                 position_m=POSITION_TRIGGER_M, speed_mps=SPEED_TRIGGER_MPS, cbr_alpha=0.5):
+        self.min_hz = min_hz
+        self.max_hz = max_hz
+        self.heading_deg = heading_deg
+        self.position_m = position_m
+        self.speed_mps = speed_mps
+        self.cbr_alpha = cbr_alpha
+        self.cbr = 0.0
+        self.last = None
+        self.last_time = None
+        self.reasons = {'heading': 0, 'position': 0, 'speed': 0, 'timeout': 0, 'first': 0}
+        self.dcc_held = 0
+
+    def set_channel_load(self, cbr):
+        """
+        cbr is the channel busy ratio in [0, 1].
+        """
+        self.cbr += self.cbr_alpha * (min(1.0, max(0.0, cbr)) - self.cbr)
+
+    def min_interval(self):
+        return max(1.0 / self.max_hz, dcc_min_interval(self.cbr))
+
+    def max_interval(self):
+        return max(1.0 / self.min_hz, self.min_interval())
+
+    def trigger(self, lat, lon, speed, heading, elapsed=0.0):
+        """
+        The trigger that fires for this state against the last beacon, or None.
+        """
+        if self.last is None:
+            return 'first'
+        last_lat, last_lon, last_speed, last_heading = self.last
+        if abs((heading - last_heading + 180.0) % 360.0 - 180.0) > self.heading_deg:
+            return 'heading'
+        if last_speed > 0 and elapsed > 0:
+            last_lat, last_lon = destination(last_lat, last_lon, last_heading, last_speed * elapsed)
+        if haversine(last_lat, last_lon, lat, lon) > self.position_m:
+            return 'position'
+        if abs(speed - last_speed) > self.speed_mps:
+            return 'speed'
+        return None
+
+    def due(self, lat, lon, speed, heading, now=None):
+        """
+        Returns the reason a beacon is due now, or None. Counts it as sent.
+        """
+        now = time.monotonic() if now is None else now
+        elapsed = None if self.last_time is None else now - self.last_time
+        reason = self.trigger(lat, lon, speed, heading, elapsed or 0.0)
+        if reason is None and elapsed is not None and elapsed >= self.max_interval() - TICK_SLACK_S:
+            reason = 'timeout'
+        if reason is None:
+            return None
+        if elapsed is not None and elapsed < self.min_interval() - TICK_SLACK_S:
+            if elapsed >= 1.0 / self.max_hz - TICK_SLACK_S:
+                # Only the channel load is holding this beacon back
+                self.dcc_held += 1
+            return None
+        self.reasons[reason] += 1
+        self.last = (lat, lon, speed, heading)
+        self.last_time = now
+        return reason
+
+    def summary(self):
+        return dict(self.reasons, cbr=round(self.cbr, 3), min_interval_s=self.min_interval(),
+                    dcc_held=self.dcc_held)
+
+class ChannelLoadMonitor():
+    """
+    Listens to the frames the stack delivers on the wsmp_hle PUB socket and
+    feeds their channel_load to an AdaptiveRate. Without frames for
+    idle_timeout seconds the channel is taken as idle.
+    """
+    def __init__(self, context, rate, endpoint="tcp://localhost:4444", topic=b"32", idle_timeout=5.0):
+        self.context = context
+        self.rate = rate
+        self.endpoint = endpoint
+        self.topic = topic
+        self.idle_timeout = idle_timeout
+        self.frames = 0
+        self.running = False
+        self.thread = None
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.running = False
+
+    def _run(self):
+        socket = self.context.socket(zmq.SUB)
+        socket.connect(self.endpoint)
+        socket.setsockopt(zmq.SUBSCRIBE, self.topic)
+        poller = zmq.Poller()
+        poller.register(socket, zmq.POLLIN)
+        last_frame = time.monotonic()
+        try:
+            while self.running:
+                if not poller.poll(500):
+                    if time.monotonic() - last_frame > self.idle_timeout:
+                        self.rate.set_channel_load(0.0)
+                    continue
+                message = socket.recv()
+                if message == self.topic:
+                    continue
+                load = peek_channel_load(message)
+                if load is None:
+                    continue
+                self.frames += 1
+                last_frame = time.monotonic()
+                self.rate.set_channel_load(load / CHANNEL_LOAD_SCALE)
+        finally:
+            socket.close(linger=0)
@@ -0,0 +1,108 @@
+import struct
+from collections import namedtuple
+
+# Application payload carried in the WSMP data field.
+#
+# Version 3 (current) is a fixed little-endian layout:
+#   version   u8   BEACON_VERSION
+#   flags     u8   reserved, 0
+#   seq       u32  beacon sequence number, wraps
+#   timestamp u64  send time, ms since the epoch
+#   latitude  i32  degrees * 1e7
+#   longitude i32  degrees * 1e7
+#   speed     i16  cm/s
+#   heading   i16  degrees * 100, in [-180, 180)
+#   fix_age   u16  ms between the GPS fix and the send time, capped
+#
+# Version 2 is the same without fix_age.
+# Anything whose first byte is not a known version is parsed as the legacy
+# "speed:..,latitude:..,longitude:..,heading_angle:.." text.
+BEACON_VERSION = 3
+BEACON_STRUCT = struct.Struct('<BBIQiihhH')
+BEACON_LEN = BEACON_STRUCT.size
+BEACON_V2 = 2
+BEACON_V2_STRUCT = struct.Struct('<BBIQiihh')
+# seq sits behind version and flags in every binary version, the timestamp behind seq
+SEQ_STRUCT = struct.Struct('<I')
+SEQ_OFFSET = 2
+TIMESTAMP_STRUCT = struct.Struct('<Q')
+TIMESTAMP_OFFSET = SEQ_OFFSET + SEQ_STRUCT.size
+
+LATLON_SCALE = 1e7
+SPEED_SCALE = 100.0
+HEADING_SCALE = 100.0
+
+Beacon = namedtuple('Beacon', ['seq', 'timestamp', 'latitude', 'longitude', 'speed', 'heading', 'fix_age_ms'])
+
+def _clamp16(value):
+    return max(-32768, min(32767, value))
+
+def encode_beacon_into(buf, offset, seq, timestamp, latitude, longitude, speed, heading, fix_age_ms=0):
+    heading = heading % 360.0
+    if heading >= 180.0:
+        heading -= 360.0
+    BEACON_STRUCT.pack_into(buf, offset, BEACON_VERSION, 0, seq & 0xFFFFFFFF, int(timestamp),
+                            int(round(latitude * LATLON_SCALE)),
+                            int(round(longitude * LATLON_SCALE)),
+                            _clamp16(int(round(speed * SPEED_SCALE))),
+                            _clamp16(int(round(heading * HEADING_SCALE))),
+                            max(0, min(0xFFFF, int(fix_age_ms))))
+    return BEACON_LEN
+
+def encode_beacon(seq, timestamp, latitude, longitude, speed, heading, fix_age_ms=0):
+    buf = bytearray(BEACON_LEN)
+    encode_beacon_into(buf, 0, seq, timestamp, latitude, longitude, speed, heading, fix_age_ms)
+    return bytes(buf)
+
+def peek_seq(buf, offset=0):
+    """
+    Sequence number of a binary beacon without decoding the rest, None for
+    legacy text or a truncated payload.
+    """
+    if len(buf) - offset < SEQ_OFFSET + SEQ_STRUCT.size or buf[offset] not in (BEACON_VERSION, BEACON_V2):
+        return None
+    return SEQ_STRUCT.unpack_from(buf, offset + SEQ_OFFSET)[0]
+
+def peek_timestamp(buf, offset=0):
+    """
+    Send timestamp of a binary beacon without decoding the rest, None for
+    legacy text or a truncated payload.
+    """
+    if len(buf) - offset < TIMESTAMP_OFFSET + TIMESTAMP_STRUCT.size or buf[offset] not in (BEACON_VERSION, BEACON_V2):
+        return None
+    return TIMESTAMP_STRUCT.unpack_from(buf, offset + TIMESTAMP_OFFSET)[0]
+
+def decode_legacy_beacon(data):
+    fields = {}
+    for pair in bytes(data).decode('utf-8', errors='ignore').split(','):
+        k, sep, v = pair.partition(':')
+        if sep:
+            fields[k.strip()] = v
+    try:
+        return Beacon(None, None, float(fields['latitude']), float(fields['longitude']),
+                      float(fields['speed']), float(fields['heading_angle']), None)
+    except (KeyError, ValueError):
+        return None
+
+def decode_beacon(buf, offset=0):
+    """
+    Decodes a beacon straight from the received buffer starting at offset.
+    Returns None if the payload is neither a known binary version nor
+    parsable legacy text.
+    """
+    if len(buf) <= offset:
+        return None
+    version = buf[offset]
+    if version == BEACON_VERSION:
+        if len(buf) - offset < BEACON_LEN:
+            return None
+        (_, _, seq, timestamp, lat, lon, speed, heading, fix_age) = BEACON_STRUCT.unpack_from(buf, offset)
+        return Beacon(seq, timestamp, lat / LATLON_SCALE, lon / LATLON_SCALE,
+                      speed / SPEED_SCALE, (heading / HEADING_SCALE) % 360.0, fix_age)
+    if version == BEACON_V2:
+        if len(buf) - offset < BEACON_V2_STRUCT.size:
+            return None
+        (_, _, seq, timestamp, lat, lon, speed, heading) = BEACON_V2_STRUCT.unpack_from(buf, offset)
+        return Beacon(seq, timestamp, lat / LATLON_SCALE, lon / LATLON_SCALE,
+                      speed / SPEED_SCALE, (heading / HEADING_SCALE) % 360.0, None)
+    return decode_legacy_beacon(memoryview(buf)[offset:])
@@ -0,0 +1,8 @@
+import timeit
+
+def per_second(func, number, repeat=5):
+    """
+    Calls per second of func, best of repeat runs of number calls.
+    """
+    best = min(timeit.repeat(func, number=number, repeat=repeat))
+    return number / best
@@ -0,0 +1,88 @@
+"""
+Runs every benchmark and optionally saves the results as JSON, or compares
+against an earlier run. No hardware needed. From the repository root:
+
+    python -m benchmarks --json bench.json
+    python -m benchmarks --compare bench.json
+"""
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import time
+from benchmarks import bench_csv, bench_follow, bench_geodesy, bench_payload, bench_recorder, bench_wsmp_codec
+
+UNITS = {
+    'wsmp_codec': 'frames/s',
+    'payload': 'frames/s',
+    'geodesy': 'points/s',
+    'csv': 'ms per lookup',
+    'follow': 'calls/s',
+    'recorder': 'records/s',
+}
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run_all(quick=False):
+    n = 5 if quick else 1
+    return {
+        'wsmp_codec': bench_wsmp_codec.run(50000 // n),
+        'payload': bench_payload.run(50000 // n),
+        'geodesy': bench_geodesy.run(20 // n + 1),
+        'csv': bench_csv.run(bench_csv.SIZES[:2] if quick else bench_csv.SIZES,
+                             budget=0.1 if quick else 0.5),
+        'follow': bench_follow.run(5000 // n),
+        'recorder': bench_recorder.run(3600 // n, 20000 // n),
+    }
+
+def flatten(results, prefix=''):
+    out = {}
+    for name, value in results.items():
+        if isinstance(value, dict):
+            out.update(flatten(value, prefix + name + '.'))
+        else:
+            out[prefix + name] = value
+    return out
+
+def compare(old, new):
+    """
+    Prints new / old for every metric present in both runs.
+    """
+    old_flat = flatten(old['results'])
+    for name, value in flatten(new['results']).items():
+        before = old_flat.get(name)
+        if before:
+            print(f"{name:40s} {before:14,.4g} -> {value:14,.4g}  x{value / before:.2f}")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="droneFollower benchmarks")
+    parser.add_argument('--json', help="write the results to this file")
+    parser.add_argument('--compare', help="earlier results file to compare against")
+    parser.add_argument('--quick', action='store_true', help="fewer iterations and smaller files")
+    args = parser.parse_args()
+
+    report = {
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'git': git_revision(),
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        'units': UNITS,
+        'results': run_all(args.quick),
+    }
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), report)
+    else:
+        for suite, results in report['results'].items():
+            print(f"[{suite}] ({UNITS[suite]})")
+            for name, value in flatten(results).items():
+                print(f"  {name:36s} {value:14,.4g}")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
@@ -0,0 +1,63 @@
+"""
+Latest-fix lookup time of drone4's read_latest_lat_lon_from_csv as the
+target CSV grows: the original read-the-whole-file version against CsvTail.
+A row is appended before every lookup, as the receiver does in flight.
+Run from the repository root:
+
+    python -m benchmarks.bench_csv
+"""
+import os
+import tempfile
+import time
+from benchmarks import legacy
+from csv_tail import CsvTail
+from target_link import TARGET_HEADER, format_record
+
+SIZES = (1000, 10000, 100000)
+
+def write_rows(f, start, count):
+    for i in range(start, start + count):
+        f.write(format_record(['2024-05-01 12:00:00', 48.1 + i * 1e-7, 11.7 + i * 1e-7, 5.0, 90.0,
+                               i, 1700000000000 + i * 100, 40, 1700000000020 + i * 100]))
+
+def lookup_ms(f, lookup, row, budget=0.5, max_calls=1000):
+    """
+    Mean milliseconds per append + lookup, for up to budget seconds.
+    """
+    calls = 0
+    start = time.perf_counter()
+    while calls < max_calls:
+        write_rows(f, row + calls, 1)
+        f.flush()
+        lookup()
+        calls += 1
+        if time.perf_counter() - start > budget:
+            break
+    return (time.perf_counter() - start) * 1000.0 / calls, calls
+
+def run(sizes=SIZES, budget=0.5):
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in sizes:
+            filename = os.path.join(tmp, f'gps_data_{size}.csv')
+            with open(filename, 'wb') as f:
+                f.write(format_record(TARGET_HEADER))
+                write_rows(f, 0, size)
+                f.flush()
+                row = size
+                legacy_ms, calls = lookup_ms(f, lambda: legacy.read_latest_lat_lon_from_csv(filename),
+                                             row, budget)
+                row += calls
+                tail = CsvTail(filename)
+                tail_ms, calls = lookup_ms(f, tail.latest, row, budget)
+                row += calls
+                # Both must see the row appended last
+                assert float(tail.latest()['Latitude']) == legacy.read_latest_lat_lon_from_csv(filename)[0]
+                tail.close()
+            results[f'rows_{size}'] = {'legacy_ms': legacy_ms, 'tail_ms': tail_ms,
+                                       'bytes': os.path.getsize(filename)}
+    return results
+
+if __name__ == '__main__':
+    for name, r in run().items():
+        print(f"{name:14s} legacy {r['legacy_ms']:10.3f} ms   tail {r['tail_ms']:8.4f} ms")
@@ -0,0 +1,48 @@
+"""
+Cycles per second of the per-beacon and per-command work on the drone:
+TargetEstimator update/predict, FollowController.step against the mock
+vehicle and the TrackBuffer heading. Run from the repository root:
+
+    python -m benchmarks.bench_follow
+"""
+from benchmarks import per_second
+from follow_controller import FollowController, LeaderState
+from target_estimator import TargetEstimator
+from track_buffer import TrackBuffer
+from sim.mock_vehicle import MockVehicle, VehicleMode
+from sim.tracks import circle
+
+def run(number=5000):
+    leader = circle()
+    samples = [leader(i * 0.1) for i in range(number)]
+
+    estimator = TargetEstimator()
+    it = iter(range(10 ** 9))
+
+    def estimator_update():
+        i = next(it)
+        lat, lon, speed, heading = samples[i % number]
+        estimator.update(lat, lon, speed, heading, i * 0.1)
+
+    vehicle = MockVehicle(samples[0][0], samples[0][1], alt=15.0)
+    vehicle.mode = VehicleMode('GUIDED')
+    vehicle.arm()
+    controller = FollowController(vehicle, 15.0)
+    state = LeaderState(*samples[10], 0.0)
+
+    track = TrackBuffer(capacity=64)
+    for i, (lat, lon, speed, _) in enumerate(samples[:64]):
+        track.append(i * 0.1, lat, lon, speed)
+
+    results = {'estimator_update': per_second(estimator_update, number)}
+    # Predict half a beacon period past the last update, inside the horizon
+    t = estimator.t + 0.05
+    assert estimator.predict(t) is not None
+    results['estimator_predict'] = per_second(lambda: estimator.predict(t), number)
+    results['controller_step'] = per_second(lambda: controller.step(state, now=0.0), number)
+    results['track_heading'] = per_second(track.heading, number)
+    return results
+
+if __name__ == '__main__':
+    for name, cps in run().items():
+        print(f"{name:22s} {cps:12,.0f} /s")
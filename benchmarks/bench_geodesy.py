@@ -0,0 +1,69 @@
+"""
+Points per second of the original get_cartesian / distance / get_heading
+helpers against geodesy, one call per point and batched over numpy arrays.
+Run from the repository root:
+
+    python -m benchmarks.bench_geodesy
+"""
+import numpy as np
+from benchmarks import legacy, per_second
+from geodesy import (bearing, bearing_batch, ecef, ecef_batch, haversine, haversine_batch,
+                     track_bearings)
+
+def sample_track(n, seed=1):
+    rng = np.random.default_rng(seed)
+    lat = 48.1 + np.cumsum(rng.normal(0, 1e-5, n))
+    lon = 11.7 + np.cumsum(rng.normal(0, 1e-5, n))
+    return lat, lon
+
+def run(number=20, points=1000):
+    lat, lon = sample_track(points)
+    lat2, lon2 = lat[::-1].copy(), lon[::-1].copy()
+    lat_l, lon_l, lat2_l, lon2_l = lat.tolist(), lon.tolist(), lat2.tolist(), lon2.tolist()
+    pairs = list(zip(lat_l, lon_l, lat2_l, lon2_l))
+    locations = [[a, b] for a, b in zip(lat_l, lon_l)]
+
+    def cartesian_legacy():
+        for a, b in zip(lat_l, lon_l):
+            legacy.get_cartesian(a, b)
+
+    def cartesian_scalar():
+        for a, b in zip(lat_l, lon_l):
+            ecef(a, b)
+
+    def distance_legacy():
+        for a, b, c, d in pairs:
+            legacy.distance(*legacy.get_cartesian(a, b), *legacy.get_cartesian(c, d))
+
+    def distance_scalar():
+        for a, b, c, d in pairs:
+            haversine(a, b, c, d)
+
+    def heading_legacy():
+        for i in range(1, points):
+            legacy.get_heading(locations[i - 1:i + 1])
+
+    def heading_scalar():
+        for i in range(1, points):
+            bearing(lat_l[i - 1], lon_l[i - 1], lat_l[i], lon_l[i])
+
+    # Results are in points per second
+    def rate(func):
+        return per_second(func, number) * points
+
+    return {
+        'cartesian_legacy': rate(cartesian_legacy),
+        'cartesian_scalar': rate(cartesian_scalar),
+        'cartesian_batch': rate(lambda: ecef_batch(lat, lon)),
+        'distance_legacy': rate(distance_legacy),
+        'distance_scalar': rate(distance_scalar),
+        'distance_batch': rate(lambda: haversine_batch(lat, lon, lat2, lon2)),
+        'heading_legacy': rate(heading_legacy),
+        'heading_scalar': rate(heading_scalar),
+        'heading_batch': rate(lambda: bearing_batch(lat[:-1], lon[:-1], lat[1:], lon[1:])),
+        'heading_track': rate(lambda: track_bearings(lat, lon)),
+    }
+
+if __name__ == '__main__':
+    for name, pps in run().items():
+        print(f"{name:22s} {pps:14,.0f} points/s")
@@ -0,0 +1,43 @@
+"""
+Payload parse throughput: the original text split in py_rx against the
+binary beacon and the legacy text fallback of beacon.decode_beacon, each
+starting from a received wsmp_hle frame. Run from the repository root:
+
+    python -m benchmarks.bench_payload
+"""
+from benchmarks import legacy, per_second
+from benchmarks.bench_wsmp_codec import PAYLOAD, rx_frame
+from beacon import decode_beacon, encode_beacon
+from wsmp_codec import decode_wsmp_hle
+
+def run(number=50000):
+    text_frame = rx_frame(PAYLOAD.encode('utf-8'))
+    binary_frame = rx_frame(encode_beacon(1, 1700000000000, 48.1234567, 11.7654321, 12.34, 271.5, 40))
+
+    def parse_legacy():
+        # The original decoded the whole frame and then sliced off 18
+        # characters, which only lines up when every header byte is ASCII
+        rx_clean = text_frame[18:].decode('utf-8', errors='ignore')
+        return legacy.parse_payload(rx_clean)
+
+    def parse_text():
+        return decode_beacon(decode_wsmp_hle(text_frame).data)
+
+    def parse_binary():
+        return decode_beacon(decode_wsmp_hle(binary_frame).data)
+
+    # All three must agree on the position
+    old = parse_legacy()
+    for beacon in (parse_text(), parse_binary()):
+        assert abs(beacon.latitude - old[0]) < 1e-7 and abs(beacon.longitude - old[1]) < 1e-7
+        assert abs(beacon.speed - old[2]) < 0.01 and abs(beacon.heading - old[3]) < 0.01
+
+    return {
+        'parse_legacy_text': per_second(parse_legacy, number),
+        'parse_codec_text': per_second(parse_text, number),
+        'parse_codec_binary': per_second(parse_binary, number),
+    }
+
+if __name__ == '__main__':
+    for name, fps in run().items():
+        print(f"{name:22s} {fps:12,.0f} frames/s")
@@ -0,0 +1,53 @@
+"""
+Records per second through the flight recorder: queueing a frame on the
+radio loop, scanning a whole log and reading one second out of it. The log
+is a simulated session of 10 Hz TX, RX, GPS and command records. Run from
+the repository root:
+
+    python -m benchmarks.bench_recorder
+"""
+import os
+import tempfile
+import time
+import flight_recorder as fr
+from benchmarks import per_second
+from wsmp_codec import HleWsmpEncoder
+
+def write_session(filename, seconds):
+    encoder = HleWsmpEncoder()
+    recorder = fr.FlightRecorder(filename, max_queue=0).start()
+    t0 = time.monotonic_ns()
+    for i in range(int(seconds * 10)):
+        t = t0 + i * 100000000
+        frame = encoder.encode_beacon(i, i * 100, 48.1 + i * 1e-7, 11.7, 5.0, 90.0, 40)
+        recorder.write(fr.TX_FRAME, frame, t)
+        recorder.write(fr.RX_FRAME, frame, t + 2000000)
+        recorder.write(fr.GPS_FIX, fr.GPS_STRUCT.pack(48.1, 11.7, 500.0, 5.0, 90.0, 1.7e9, 3), t + 3000000)
+        recorder.write(fr.COMMAND, fr.encode_command(48.1, 11.7, 15.0, 1.0, 2.0), t + 4000000)
+    recorder.close()
+    return recorder.written
+
+def run(seconds=3600, number=20000):
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        frame = bytes(HleWsmpEncoder().encode_beacon(1, 1700000000000, 48.1, 11.7, 5.0, 90.0, 40))
+        recorder = fr.FlightRecorder(os.path.join(tmp, 'queue.rec'), max_queue=0).start()
+        results['queue_frame'] = per_second(lambda: recorder.tx_frame(frame), number)
+        recorder.close()
+
+        filename = os.path.join(tmp, 'session.rec')
+        records = write_session(filename, seconds)
+        log = fr.FlightLog(filename)
+        start = time.perf_counter()
+        scanned = sum(1 for _ in log.records())
+        results['scan_all'] = scanned / (time.perf_counter() - start)
+        start = time.perf_counter()
+        in_range = sum(1 for _ in log.records(seconds / 2, seconds / 2 + 1))
+        results['range_1s'] = in_range / (time.perf_counter() - start)
+        assert scanned == records and in_range == 40
+        log.close()
+    return results
+
+if __name__ == '__main__':
+    for name, rate in run().items():
+        print(f"{name:22s} {rate:14,.0f} records/s")
@@ -0,0 +1,43 @@
+"""
+Frames per second of the WSMP header codec, original per-field classes
+against wsmp_codec. Run from the repository root:
+
+    python -m benchmarks.bench_wsmp_codec
+"""
+from benchmarks import legacy, per_second
+from wsmp_codec import HleWsmpEncoder, WSMP_HLE_STRUCT, decode_wsmp_hle
+
+PAYLOAD = "speed:12.34,latitude:48.1234567,longitude:11.7654321,heading_angle:271.5"
+
+def rx_frame(payload):
+    header = WSMP_HLE_STRUCT.pack(3, 172, 12, -9, 20, 0, bytes.fromhex('0f1e2d3c4b5a'), 32, len(payload))
+    return header + payload
+
+def run(number=50000):
+    encoder = HleWsmpEncoder()
+    payload = PAYLOAD.encode('utf-8')
+    frame = rx_frame(payload)
+
+    def legacy_decode():
+        legacy.wsmp_hle().decode(frame)
+
+    results = {
+        'encode_legacy': per_second(lambda: legacy.FillWsmpContent(PAYLOAD), number),
+        'encode_codec': per_second(lambda: encoder.encode(payload), number),
+        'encode_codec_beacon': per_second(
+            lambda: encoder.encode_beacon(1, 1700000000000, 48.1234567, 11.7654321, 12.34, 271.5), number),
+        'decode_legacy': per_second(legacy_decode, number),
+        'decode_codec': per_second(lambda: decode_wsmp_hle(frame), number),
+    }
+    # Both implementations must produce the same frames
+    assert bytes(encoder.encode(payload)) == legacy.FillWsmpContent(PAYLOAD)
+    old = legacy.wsmp_hle()
+    old.decode(frame)
+    new = decode_wsmp_hle(frame)
+    assert old.peer_mac_addr.value == new.peer_mac_addr.hex()
+    assert old.channel_load.value == new.channel_load and old.data == bytes(new.data)
+    return results
+
+if __name__ == '__main__':
+    for name, fps in run().items():
+        print(f"{name:22s} {fps:12,.0f} frames/s")
@@ -0,0 +1,188 @@
+# Verbatim copies of the original WSMP classes, payload parsing, geometry
+# helpers and CSV lookup, kept as the "before" reference for the benchmarks.
+# Not used at runtime.
+import csv
+import math
+
+def decoded(s):
+    return int.from_bytes(s, 'little')
+
+def encoded(value, length):
+    return value.to_bytes(length, 'little')
+
+def sdecoded(s):
+    return int.from_bytes(s, 'little', signed=True)
+
+def sencoded(value, length):
+    return value.to_bytes(length, 'little', signed=True)
+
+class Integer8():
+    def __init__(self):
+        self.value = None
+
+    def encode(self):
+        if self.value is None:
+            return None
+        return encoded(self.value, 1)
+
+    def decode(self, s):
+        self.value = decoded(s[:1])
+        return s[1:]
+
+class Integer16():
+    def __init__(self):
+        self.value = None
+
+    def encode(self):
+        return encoded(self.value, 2)
+
+    def decode(self, s):
+        self.value = decoded(s[:2])
+        return s[2:]
+
+class Integer32():
+    def __init__(self):
+        self.value = None
+
+    def encode(self):
+        return encoded(self.value, 4)
+
+    def decode(self, s):
+        self.value = decoded(s[:4])
+        return s[4:]
+
+class SInteger8():
+    def __init__(self):
+        self.value = None
+
+    def encode(self):
+        return sencoded(self.value, 1)
+
+    def decode(self, s):
+        self.value = sdecoded(s[:1])
+        return s[1:]
+
+class Integer48():
+    def __init__(self):
+        self.value = None
+
+    def encode(self):
+        return encoded(self.value, 6)
+
+    def decode(self, s):
+        self.value = s[:6].hex()
+        return s[6:]
+
+class hle_wsmp():
+    def __init__(self):
+        self.mode = Integer8()
+        self.ch_id = Integer8()
+        self.time_slot = Integer8()
+        self.data_rate = Integer8()
+        self.tx_pow = SInteger8()
+        self.ch_ld = Integer8()
+        self.info = Integer8()
+        self.usr_prio = Integer8()
+        self.expiry_time = Integer8()
+        self.mac = Integer48()
+        self.psid = Integer32()
+        self.dlen = Integer16()
+        self.data = None
+
+    def encode(self):
+        out = self.mode.encode() + self.ch_id.encode() + self.time_slot.encode() + self.data_rate.encode() + self.tx_pow.encode() + self.ch_ld.encode() + self.info.encode(
+                ) + self.usr_prio.encode() + self.expiry_time.encode() + self.mac.encode() + self.psid.encode() + self.dlen.encode() + self.data
+        return out
+
+def FillWsmpContent(data):
+    hle_msg = hle_wsmp()
+
+    hle_msg.mode.value = 1
+    hle_msg.ch_id.value = 172
+    hle_msg.time_slot.value = 0
+    hle_msg.data_rate.value = 12
+    hle_msg.tx_pow.value = -9
+    hle_msg.ch_ld.value = 0
+    hle_msg.info.value = 0
+    hle_msg.expiry_time.value = 0
+    hle_msg.usr_prio.value = 0
+    hle_msg.mac.value = 16557351571215
+    hle_msg.psid.value = 32
+    hle_msg.dlen.value = len(data)
+    hle_msg.data = bytes(data, 'utf-8')
+
+    out = hle_msg.encode()
+    return out
+
+class wsmp_hle():
+    def __init__(self):
+        self.wsmp_version = Integer8()
+        self.channel_no = Integer8()
+        self.data_rate = Integer8()
+        self.tx_pow_level = SInteger8()
+        self.channel_load = Integer8()
+        self.user_priority = Integer8()
+        self.peer_mac_addr = Integer48()
+        self.psid = Integer32()
+        self.dlen = Integer16()
+        self.data = None
+
+    def decode(self, s):
+        ret_ver = self.wsmp_version.decode(s)
+        ret_chh = self.channel_no.decode(ret_ver)
+        ret_dr = self.data_rate.decode(ret_chh)
+        ret_txpow = self.tx_pow_level.decode(ret_dr)
+        ret_chld = self.channel_load.decode(ret_txpow)
+        ret_usr_prio = self.user_priority.decode(ret_chld)
+        ret_peer = self.peer_mac_addr.decode(ret_usr_prio)
+        ret_psid = self.psid.decode(ret_peer)
+        ret_len = self.dlen.decode(ret_psid)
+        self.data = ret_len[:self.dlen.value]
+
+# Original py_rx payload parsing, from Wsmp_operation
+def parse_payload(rx_clean):
+    inp = rx_clean.split(',')
+    for pair in inp:
+        k, v = pair.split(':')
+        if k == 'speed':
+            flo = float(v)
+        elif k == 'latitude':
+            latitude_rec = float(v)
+        elif k == 'longitude':
+            longitude_rec = float(v)
+        elif k == 'heading_angle':
+            head_rec = float(v)
+    return latitude_rec, longitude_rec, flo, head_rec
+
+# Original py_rx / py_app_tx geometry helpers
+def get_heading(aLocation):
+    off_x = aLocation[-1][1] - aLocation[-2][1]
+    off_y = aLocation[-1][0] - aLocation[-2][0]
+    heading = 90.00 + math.atan2(-off_y, off_x) * 57.2957795
+    if heading < 0:
+        heading += 360.00
+    return heading
+
+def get_cartesian(lat=None, lon=None):
+    lat, lon = math.radians(lat), math.radians(lon)
+    R = 6371  # radius of the earth
+    x = R * math.cos(lat) * math.cos(lon)
+    y = R * math.cos(lat) * math.sin(lon)
+    z = R * math.sin(lat)
+    return x, y, z
+
+def distance(x1, y1, z1, x2, y2, z2):
+    return math.sqrt((x2 - x1) ** 2 + (y2 - y1) ** 2 + (z2 - z1) ** 2)
+
+# Original drone4 lookup, parses the whole file on every call
+def read_latest_lat_lon_from_csv(filename):
+    with open(filename, newline='') as csvfile:
+        reader = csv.DictReader(csvfile)
+        rows = list(reader)
+        if rows:  # Check if there are any rows
+            latest_row = rows[-1]  # Get the last row
+            lat = float(latest_row['Latitude'])
+            lon = float(latest_row['Longitude'])
+            return lat, lon
+        else:
+            return None, None
@@ -0,0 +1,127 @@
+import csv
+import os
+import time
+
+class CsvTail():
+    """
+    Follows a growing CSV file without re-reading it.
+
+    The reader remembers the byte offset of the last complete line it has
+    seen. In follow mode (from_start=True) poll() returns every new row in
+    order. Otherwise only the newest row matters, so poll() seeks backwards
+    from EOF and parses just the last complete line: the cost does not depend
+    on the size of the file. A file that shrinks or is replaced (new inode),
+    as happens when it is re-copied with SCP, is reopened from the header.
+    """
+    def __init__(self, filename, from_start=False, poll_interval=0.05):
+        self.filename = filename
+        self.from_start = from_start
+        self.poll_interval = poll_interval
+        self.file = None
+        self.file_id = None
+        self.fieldnames = None
+        self.offset = 0
+        self.latest_row = None
+        self.resets = 0
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+        self.file = None
+        self.file_id = None
+
+    def _open(self):
+        self.close()
+        try:
+            f = open(self.filename, 'rb')
+        except FileNotFoundError:
+            return False
+        header = f.readline()
+        if not header.endswith(b'\n'):
+            # Header not fully written yet
+            f.close()
+            return False
+        st = os.fstat(f.fileno())
+        self.file = f
+        self.file_id = (st.st_dev, st.st_ino)
+        self.fieldnames = next(csv.reader([header.decode('utf-8', errors='ignore')]))
+        self.header_end = f.tell()
+        self.offset = self.header_end
+        self.resets += 1
+        return True
+
+    def _to_row(self, line):
+        values = next(csv.reader([line]), None)
+        if not values:
+            return None
+        return dict(zip(self.fieldnames, values))
+
+    def _read_new_rows(self, size):
+        self.file.seek(self.offset)
+        data = self.file.read(size - self.offset)
+        end = data.rfind(b'\n')
+        if end < 0:
+            return []
+        self.offset += end + 1
+        rows = []
+        for line in data[:end].decode('utf-8', errors='ignore').splitlines():
+            row = self._to_row(line)
+            if row is not None:
+                rows.append(row)
+        return rows
+
+    def _read_last_row(self, size):
+        # Read backwards from EOF until a full line is in the buffer
+        chunk = 512
+        while True:
+            start = max(self.header_end, size - chunk)
+            self.file.seek(start)
+            data = self.file.read(size - start)
+            end = data.rfind(b'\n')
+            if end < 0 or start + end + 1 <= self.offset:
+                return []
+            begin = data.rfind(b'\n', 0, end) + 1
+            if begin > 0 or start == self.header_end:
+                self.offset = start + end + 1
+                row = self._to_row(data[begin:end].decode('utf-8', errors='ignore'))
+                return [row] if row is not None else []
+            chunk *= 2
+
+    def poll(self):
+        """
+        Returns the rows completed since the last call. In latest mode this
+        is at most one row, the newest one.
+        """
+        try:
+            st = os.stat(self.filename)
+        except FileNotFoundError:
+            return []
+        if self.file is None or (st.st_dev, st.st_ino) != self.file_id or st.st_size < self.offset:
+            if not self._open():
+                return []
+        if st.st_size <= self.offset:
+            return []
+        if self.from_start:
+            rows = self._read_new_rows(st.st_size)
+        else:
+            rows = self._read_last_row(st.st_size)
+        if rows:
+            self.latest_row = rows[-1]
+        return rows
+
+    def latest(self):
+        self.poll()
+        return self.latest_row
+
+    def wait(self, timeout=None):
+        """
+        Polls the file until new rows arrive or the timeout expires.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            rows = self.poll()
+            if rows:
+                return rows
+            if deadline is not None and time.monotonic() >= deadline:
+                return []
+            time.sleep(self.poll_interval)
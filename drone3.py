@@ -1,116 +1,173 @@
-import csv
-from dronekit import connect, VehicleMode, LocationGlobalRelative
+from dronekit import connect, VehicleMode, LocationGlobalRelative, Command
 import time
+from telemetry import Telemetry
+from startup import Startup, connect_vehicle
+from waypoint_queue import WaypointQueue
+from trail import TrailMission, SIMPLIFY_METHODS
+import argparse
+
+# A waypoint counts as reached within this distance (metres)
+ARRIVAL_RADIUS_M = 2.0
 
 # Connect to the Vehicle
 connection_string = '/dev/ttyACM0'
-vehicle = connect(connection_string, baud=57600, wait_ready=True)
+
+# Seconds to wait for the vehicle link and the attributes needed to arm
+VEHICLE_TIMEOUT_S = 60
+
+# Connected in the main script, concurrently with the rest of the setup
+vehicle = None
+
+# State changes are pushed by attribute listeners, waits end on the update that satisfies them
+telemetry = None
 
 # Function to arm the drone and take off
-def arm_and_takeoff(target_altitude):
+def arm_and_takeoff(target_altitude, startup=None):
     print("Basic pre-arm checks")
-    
+
     # Check if vehicle is armable
-    while not vehicle.is_armable:
-        print(" Waiting for vehicle to initialize...")
-        time.sleep(1)
+    telemetry.wait_armable()
 
     print("Arming vehicle")
     vehicle.mode = VehicleMode("GUIDED")
     vehicle.arm()
 
     # Wait until vehicle is armed
-    while not vehicle.armed:
-        print(" Waiting for arming...")
-        time.sleep(1)
+    telemetry.wait_armed()
+    if startup is not None:
+        startup.mark('armed')
 
     print("Taking off!")
     vehicle.simple_takeoff(target_altitude)
 
     # Wait until the vehicle reaches a safe height
-    while True:
-        print(" Altitude: ", vehicle.location.global_relative_frame.alt)
-        if vehicle.location.global_relative_frame.alt >= target_altitude * 0.95:
-            print("Reached target altitude")
-            break
-        time.sleep(1)
+    telemetry.wait_altitude(target_altitude)
+    print("Reached target altitude")
+    if startup is not None:
+        startup.mark('at_altitude')
 
 # Function to navigate to a specified location
-def goto_location(lat, lon, altitude):
+def goto_location(lat, lon, altitude, radius_m=ARRIVAL_RADIUS_M):
     target_location = LocationGlobalRelative(lat, lon, altitude)
     vehicle.simple_goto(target_location)
 
-    # Wait until the vehicle reaches the location
+    # Wait until the vehicle is within radius_m of the location
+    telemetry.wait_arrival(lat, lon, radius_m)
+    print("Reached waypoint")
+
+# Function to fly the whole trail as one AUTO mission, appending new points as they arrive
+def fly_trail_mission(waypoints, altitude, tolerance_m, method, radius_m, idle_timeout):
+    mission = TrailMission(vehicle, altitude, tolerance_m=tolerance_m, method=method,
+                           accept_radius_m=radius_m, command=Command)
+    waypoints.refresh()
+    consumed = len(waypoints.waypoints)
+    # Progress through the mission goes to the same journal as the goto legs
+    resumed = waypoints.visited
+    mission.start(waypoints.waypoints[resumed:])
+    if not mission.waypoints:
+        print("No waypoints in the trail.")
+        return
+    print(f"Uploaded {len(mission.waypoints)} waypoints for {mission.raw_points} trail points, "
+          f"{mission.length():.0f} m")
+
+    vehicle.commands.next = 0
+    vehicle.mode = VehicleMode("AUTO")
+
+    idle_since = time.monotonic()
     while True:
-        current_lat = vehicle.location.global_relative_frame.lat
-        current_lon = vehicle.location.global_relative_frame.lon
-        print(f"Current location: ({current_lat}, {current_lon})")
-        if abs(current_lat - lat) < 0.00005 and abs(current_lon - lon) < 0.00005:
-            print("Reached waypoint")
-            break
-        time.sleep(1)
-
-# Function to delete visited coordinates and update CSV
-def delete_visited_coordinate(filename, visited_lat, visited_lon):
-    with open(filename, newline='') as csvfile:
-        # Dynamically retrieve the fieldnames from the file
-        reader = csv.DictReader(csvfile)
-        fieldnames = reader.fieldnames  # Capture all fieldnames from the CSV
-        rows = list(reader)
-    
-    # Filter out visited coordinates
-    remaining_rows = [row for row in rows if not (float(row['Latitude']) == visited_lat and float(row['Longitude']) == visited_lon)]
-    
-    # Rewrite the CSV without visited coordinates
-    with open(filename, 'w', newline='') as csvfile:
-        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-        writer.writeheader()
-        writer.writerows(remaining_rows)
-
-# Function to read waypoints from CSV
-def read_waypoints_from_csv(filename):
-    waypoints = []
-    with open(filename, newline='') as csvfile:
-        reader = csv.DictReader(csvfile)
-        for row in reader:
-            lat = float(row['Latitude'])
-            lon = float(row['Longitude'])
-            waypoints.append((lat, lon))
-    return waypoints
+        # New trail points and mission progress are checked every 0.5 s
+        time.sleep(0.5)
+        waypoints.refresh()
+        if len(waypoints.waypoints) > consumed:
+            new = waypoints.waypoints[consumed:]
+            consumed = len(waypoints.waypoints)
+            idle_since = time.monotonic()
+            if mission.add(new):
+                print(f"Appended trail, {len(mission.waypoints)} waypoints, {mission.length():.0f} m")
+
+        last_lat, last_lon = mission.waypoints[-1]
+        dist = telemetry.distance_to(last_lat, last_lon)
+        at_end = vehicle.commands.next >= mission.last_index() and dist is not None and dist <= radius_m
+        passed = resumed + mission.passed(vehicle.commands.next, at_end)
+        if passed > waypoints.visited:
+            waypoints.mark_visited(passed - waypoints.visited)
+        if not at_end:
+            continue
+        if mission.pending:
+            # The mission ran out before the buffered points were uploaded
+            first_new = mission.last_index() + 1
+            mission.flush()
+            vehicle.commands.next = first_new
+            vehicle.mode = VehicleMode("AUTO")
+        elif time.monotonic() - idle_since > idle_timeout:
+            print(f"Trail complete, {mission.raw_points} points flown as {len(mission.waypoints)} waypoints.")
+            return
 
 # Main script
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fly the waypoints in the target CSV")
+    parser.add_argument('--arrival-radius', type=float, default=ARRIVAL_RADIUS_M,
+                        help="distance in metres at which a waypoint counts as reached")
+    parser.add_argument('--mission', action='store_true',
+                        help="fly the simplified trail as one AUTO mission instead of goto and hover legs")
+    parser.add_argument('--tolerance', type=float, default=2.0,
+                        help="--mission: max deviation (rdp) or spacing (decimate) in metres")
+    parser.add_argument('--simplify', choices=SIMPLIFY_METHODS, default='rdp',
+                        help="--mission: trail simplification method")
+    parser.add_argument('--idle', type=float, default=10.0,
+                        help="--mission: finish once the trail has not grown for this many seconds at its end")
+    args = parser.parse_args()
+
     # Define target altitude
     target_altitude = 15  # predefined altitude of 15 meters
 
     # CSV file path
     csv_file = 'gps_data.csv'
 
+    # The vehicle link comes up while the waypoints are loaded, time to armed
+    # goes to startup_drone.json
+    startup = Startup('drone', json_file='startup_drone.json')
+    startup.start('vehicle', connect_vehicle, connect, connection_string)
+
+    # Waypoints are loaded once and progress is journaled next to the CSV
+    waypoints = WaypointQueue(csv_file)
+    if waypoints.visited:
+        print(f"Resuming after {waypoints.visited} visited waypoints")
+
+    vehicle = startup.wait('vehicle', VEHICLE_TIMEOUT_S, required=True)
+    telemetry = Telemetry(vehicle).start()
+
     # Arm and take off
-    arm_and_takeoff(target_altitude)
+    arm_and_takeoff(target_altitude, startup)
+    startup.report()
 
-    # Loop until all waypoints are visited
-    while True:
-        # Read waypoints from CSV
-        waypoints = read_waypoints_from_csv(csv_file)
-
-        # If there are no more waypoints, break the loop
-        if not waypoints:
-            print("All waypoints visited.")
-            break
-
-        # Get the first waypoint
-        lat, lon = waypoints[0]
-        
-        # Navigate to the waypoint
-        print(f"Going to waypoint: lat={lat}, lon={lon}")
-        goto_location(lat, lon, target_altitude)
-
-        # Delete the visited waypoint from the CSV
-        delete_visited_coordinate(csv_file, lat, lon)
-
-        # Hover at the waypoint for 2 seconds
-        time.sleep(2)
+    if args.mission:
+        fly_trail_mission(waypoints, target_altitude, args.tolerance, args.simplify,
+                          args.arrival_radius, args.idle)
+    else:
+        # Loop until all waypoints are visited
+        while True:
+            # Get the next unvisited waypoint (picks up newly appended points)
+            waypoint = waypoints.peek()
+
+            # If there are no more waypoints, break the loop
+            if waypoint is None:
+                print("All waypoints visited.")
+                break
+
+            lat, lon = waypoint
+
+            # Navigate to the waypoint
+            print(f"Going to waypoint: lat={lat}, lon={lon}")
+            goto_location(lat, lon, target_altitude, args.arrival_radius)
+
+            # Record the visited waypoint in the journal
+            waypoints.mark_visited()
+
+            # Hover at the waypoint for 2 seconds
+            time.sleep(2)
+
+    waypoints.close()
 
     # Hover for 5 seconds and enable RTL
     print("Hovering for 5 seconds before returning home.")
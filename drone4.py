@@ -1,95 +1,191 @@
-import csv
-from dronekit import connect, VehicleMode, LocationGlobalRelative
+from dronekit import connect, VehicleMode
 import time
+from telemetry import Telemetry
+from startup import Startup, connect_vehicle
+from target_link import TargetLinkReceiver
+from csv_tail import CsvTail
+from follow_controller import FollowController, LeaderState
+from target_estimator import TargetEstimator, ClockOffset
+from latency_stats import LatencyRecorder
+from shm_slot import ShmSlotReader, SLOT_PATH
+from flight_recorder import FlightRecorder, session_path
+import argparse
 
 # Connect to the Vehicle
 connection_string = '/dev/ttyACM0'  # Adjust as per your setup
-vehicle = connect(connection_string, baud=57600, wait_ready=True)
+
+# Seconds to wait for the vehicle link and the attributes needed to arm
+VEHICLE_TIMEOUT_S = 60
+
+# Connected in the main script, concurrently with the rest of the setup
+vehicle = None
+
+# State changes are pushed by attribute listeners, waits end on the update that satisfies them
+telemetry = None
 
 # Function to arm the drone and take off
-def arm_and_takeoff(target_altitude):
+def arm_and_takeoff(target_altitude, startup=None):
     print("Basic pre-arm checks")
-    
+
     # Check if vehicle is armable
-    while not vehicle.is_armable:
-        print(" Waiting for vehicle to initialize...")
-        time.sleep(1)
+    telemetry.wait_armable()
 
     print("Arming vehicle")
     vehicle.mode = VehicleMode("GUIDED")
     vehicle.arm()
 
     # Wait until vehicle is armed
-    while not vehicle.armed:
-        print(" Waiting for arming...")
-        time.sleep(1)
+    telemetry.wait_armed()
+    if startup is not None:
+        startup.mark('armed')
 
     print("Taking off!")
     vehicle.simple_takeoff(target_altitude)
 
     # Wait until the vehicle reaches a safe height
-    while True:
-        print(" Altitude: ", vehicle.location.global_relative_frame.alt)
-        if vehicle.location.global_relative_frame.alt >= target_altitude * 0.95:
-            print("Reached target altitude")
-            break
-        time.sleep(1)
-
-# Function to navigate to a specified location
-def goto_location(lat, lon, altitude):
-    target_location = LocationGlobalRelative(lat, lon, altitude)
-    vehicle.simple_goto(target_location)
-
-# Function to read the latest latitude and longitude from CSV (ignore other data)
-def read_latest_lat_lon_from_csv(filename):
-    with open(filename, newline='') as csvfile:
-        reader = csv.DictReader(csvfile)
-        rows = list(reader)
-        if rows:  # Check if there are any rows
-            latest_row = rows[-1]  # Get the last row
-            lat = float(latest_row['Latitude'])
-            lon = float(latest_row['Longitude'])
-            return lat, lon
-        else:
-            return None, None
+    telemetry.wait_altitude(target_altitude)
+    print("Reached target altitude")
+    if startup is not None:
+        startup.mark('at_altitude')
 
 # Main script
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Follow the leader vehicle")
+    parser.add_argument('--standoff', type=float, default=5.0, help="distance behind the leader in metres")
+    parser.add_argument('--rate', type=float, default=10, help="follow control rate in Hz")
+    parser.add_argument('--shm', default=SLOT_PATH,
+                        help="shared memory slot written by py_rx.py on the same host, '' to disable")
+    parser.add_argument('--record', default='flights', help="directory for the binary flight log")
+    parser.add_argument('--no-record', action='store_true', help="do not write a flight log")
+    args = parser.parse_args()
+
     # Define target altitude
     target_altitude = 15  # Predefined altitude in meters
 
-    # Arm and take off
-    arm_and_takeoff(target_altitude)
+    # The vehicle link comes up while the target link, slot and logs are set
+    # up; time to armed and to the first follow command go to startup_drone.json
+    startup = Startup('drone', json_file='startup_drone.json')
+    startup.start('vehicle', connect_vehicle, connect, connection_string)
 
-    # Continuously check for new coordinates (lat/lon) from CSV every second
+    # With py_rx.py on the same host the latest target is read from shared
+    # memory. Otherwise updates are streamed from the receiver OBU over the
+    # target link and every record is also appended to the local CSV
     csv_file = 'gps_data.csv'
+    slot = ShmSlotReader(args.shm) if args.shm else None
+    receiver = TargetLinkReceiver(csv_file=csv_file).start()
+    csv_tail = CsvTail(csv_file)
+    # Rows already in the file are from before this start, maybe an earlier session
+    csv_tail.poll()
+    csv_leader = [None]
+    # CSV rows are as fresh as their own GPS time stamp, mapped onto the local clock
+    csv_clock = ClockOffset()
+
+    def csv_row_time(row):
+        now = time.monotonic()
+        try:
+            stamp_s = int(row.get('Rx ms') or row.get('Time ms')) / 1000.0
+        except (TypeError, ValueError):
+            # Legacy rows carry no time
+            return now
+        csv_clock.observe(stamp_s, now)
+        return csv_clock.local(stamp_s)
+
+    # Kalman filter over the streamed beacons, predicted forward to "now" on
+    # every control cycle so transport latency and lost beacons are bridged
+    estimator = TargetEstimator()
+    # The filter runs on this host's monotonic clock. Sender times are mapped
+    # onto it by the measured offset, the Pi wall clock may be far off GPS time
+    clock = ClockOffset()
+    seen = [None]
+    # (record, monotonic time it reached this host) of the last update used
+    current = [None, None]
+
+    # Age of the target at each stage up to the MAVLink command, saved to
+    # latency_drone.json. Wall clock differences assume the Pi is NTP/GPS synced.
+    latency = LatencyRecorder('drone', json_file='latency_drone.json')
+
+    # Every position target sent to the autopilot goes to a binary flight log
+    recorder = None
+    if not args.no_record:
+        recorder = FlightRecorder(session_path(args.record, 'drone')).start()
+        latency.add_counters('recorder', recorder.stats)
+
+    def newest_target():
+        # Shared memory slot first, then the target link
+        state = slot.read() if slot is not None else None
+        if state is not None and time.monotonic() - state.written <= controller.max_age:
+            return state.record, state.written, ('shm', state.generation)
+        if receiver.latest is not None:
+            return receiver.latest, receiver.latest_time, ('link', receiver.count)
+        return None, None, None
+
+    def latest_leader():
+        # Use the latest shared or streamed target, fall back to the CSV file
+        record, received, key = newest_target()
+        if record is not None:
+            if key != seen[0]:
+                seen[0] = key
+                current[0], current[1] = record, received
+                now_ms = time.time() * 1000.0
+                if record.rx_ms is not None:
+                    latency.record('rx_to_drone', now_ms - record.rx_ms)
+                latency.observe_seq(record.seq)
+                if record.sent_ms is not None:
+                    sent_s = record.sent_ms / 1000.0
+                    clock.observe(sent_s, received)
+                    t = clock.local(sent_s)
+                else:
+                    t = received
+                estimator.update(record.lat, record.lon, record.speed, record.heading, t)
+            estimate = estimator.predict(time.monotonic())
+            if estimate is None:
+                return None
+            return LeaderState(estimate.lat, estimate.lon, estimate.speed, estimate.heading, received)
+        for row in csv_tail.poll():
+            try:
+                csv_leader[0] = LeaderState(float(row['Latitude']), float(row['Longitude']),
+                                            float(row['Speed']), float(row['Heading Angle']), csv_row_time(row))
+            except (KeyError, ValueError):
+                pass
+        return csv_leader[0]
+
+    def after_command(leader, result):
+        if recorder is not None and controller.last_command is not None:
+            recorder.command(*controller.last_command)
+        if result is not None and startup.mark('first_follow_command'):
+            startup.write_json()
+        record, received = current
+        if record is None or leader is None:
+            latency.maybe_report()
+            return
+        latency.record('drone_receipt_to_command', (time.monotonic() - received) * 1000.0)
+        if record.sent_ms is not None:
+            age_ms = time.time() * 1000.0 - record.sent_ms
+            latency.record('tx_to_command', age_ms)
+            if record.fix_age_ms is not None:
+                latency.record('gps_fix_to_command', age_ms + record.fix_age_ms)
+        latency.maybe_report()
+
+    # Only now is the vehicle needed
+    vehicle = startup.wait('vehicle', VEHICLE_TIMEOUT_S, required=True)
+    telemetry = Telemetry(vehicle).start()
 
-    while True:
-        # Read the latest latitude and longitude from the CSV file
-        lat, lon = read_latest_lat_lon_from_csv(csv_file)
-
-        # If a valid coordinate is found, go to that location
-        if lat is not None and lon is not None:
-            print(f"Going to waypoint: lat={lat}, lon={lon}")
-            goto_location(lat, lon, target_altitude)
-
-            # Wait until the drone reaches the location
-            while True:
-                current_lat = vehicle.location.global_relative_frame.lat
-                current_lon = vehicle.location.global_relative_frame.lon
-                print(f"Current location: ({current_lat}, {current_lon})")
-                
-                # Check if the drone is close to the waypoint (small tolerance for GPS accuracy)
-                if abs(current_lat - lat) < 0.00005 and abs(current_lon - lon) < 0.00005:
-                    print("Reached waypoint")
-                    break
-                
-                time.sleep(1)  # Wait for 1 second before checking again
-
-        # Wait for 1 second before checking for the next updated coordinate
-        time.sleep(1)
-
-    print("No more waypoints. Returning to launch.")
+    # Arm and take off
+    arm_and_takeoff(target_altitude, startup)
+    startup.report()
+
+    # Retarget continuously towards a point behind the leader
+    controller = FollowController(vehicle, target_altitude, standoff_m=args.standoff, rate_hz=args.rate)
+    print(f"Following at {args.standoff} m behind the leader, {args.rate} Hz")
+    try:
+        controller.run(latest_leader, on_step=after_command)
+    except KeyboardInterrupt:
+        pass
+    latency.report()
+    if recorder is not None:
+        recorder.close()
+
+    print("Follow stopped. Returning to launch.")
     vehicle.mode = VehicleMode("RTL")  # Return to launch
 
     # Close vehicle object before exiting the script
@@ -0,0 +1,384 @@
+import argparse
+import bisect
+import math
+import mmap
+import os
+import queue
+import struct
+import threading
+import time
+from collections import namedtuple
+from wsmp_codec import hle_to_wsmp_hle
+
+# File header: magic, version, wall clock and monotonic time at the start of the session
+MAGIC = b'DFREC\x00'
+VERSION = 1
+FILE_HEADER = struct.Struct('<6sHdQ')
+
+# Every record is length-prefixed: payload length, kind, monotonic time in ns
+RECORD_HEADER = struct.Struct('<IBQ')
+
+# Sparse index beside the log (<log>.idx): (time ns, record offset) pairs
+INDEX_MAGIC = b'DFIDX\x00'
+INDEX_HEADER = struct.Struct('<6sH')
+INDEX_ENTRY = struct.Struct('<QQ')
+
+# Record kinds
+TX_FRAME = 1    # hle_wsmp frame as sent to the stack
+RX_FRAME = 2    # wsmp_hle frame as delivered by the stack
+GPS_FIX = 3
+COMMAND = 4     # position target sent to the autopilot
+
+KIND_NAMES = {TX_FRAME: 'tx', RX_FRAME: 'rx', GPS_FIX: 'gps', COMMAND: 'command'}
+KINDS = {name: kind for kind, name in KIND_NAMES.items()}
+
+# lat, lon, alt, speed, track, GPS time, mode; missing values are NaN
+GPS_STRUCT = struct.Struct('<ddfffdB')
+# lat, lon, alt, v_north, v_east
+COMMAND_STRUCT = struct.Struct('<ddfff')
+
+NAN = float('nan')
+
+# Records are queued from several threads and stamped before they are queued,
+# so the log is in time order only to within this much
+REORDER_SLACK_NS = 500000000
+
+# t is seconds since the start of the session, payload a memoryview into the log
+Record = namedtuple('Record', ['t', 'kind', 'payload'])
+RecordedFix = namedtuple('RecordedFix', ['lat', 'lon', 'alt', 'speed', 'track', 'time', 'mode'])
+RecordedCommand = namedtuple('RecordedCommand', ['lat', 'lon', 'alt', 'v_north', 'v_east'])
+
+def _nan(value):
+    return NAN if value is None else value
+
+def _none(value):
+    return None if math.isnan(value) else value
+
+def encode_gps(fix):
+    return GPS_STRUCT.pack(fix.lat, fix.lon, _nan(fix.alt), fix.speed, _nan(fix.track),
+                           _nan(fix.time), fix.mode)
+
+def decode_gps(payload):
+    lat, lon, alt, speed, track, gps_time, mode = GPS_STRUCT.unpack_from(payload)
+    return RecordedFix(lat, lon, _none(alt), speed, _none(track), _none(gps_time), mode)
+
+def encode_command(lat, lon, alt, v_north, v_east):
+    return COMMAND_STRUCT.pack(lat, lon, alt, v_north, v_east)
+
+def decode_command(payload):
+    return RecordedCommand(*COMMAND_STRUCT.unpack_from(payload))
+
+def session_path(directory, role):
+    # Milliseconds so a restart within the same second gets its own file
+    now = time.time()
+    stamp = time.strftime('%Y%m%d_%H%M%S', time.localtime(now))
+    return os.path.join(directory, f"{role}_{stamp}_{int(now * 1000) % 1000:03d}.rec")
+
+class FlightRecorder():
+    """
+    Append-only binary log of everything that crossed the radio, the GPS and
+    the autopilot link, written by a background thread.
+
+    Records are stamped with time.monotonic_ns() when write() is called and
+    queued, so the calling loop never touches the disk; when the queue is
+    full the record is dropped and counted. The writer adds an entry to the
+    sparse time index every index_interval seconds of log time. Each session
+    goes to a new file, nothing is ever overwritten.
+    """
+    def __init__(self, filename, max_queue=10000, flush_interval=1.0, index_interval=1.0):
+        self.filename = filename
+        self.index_filename = filename + '.idx'
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.flush_interval = flush_interval
+        self.index_interval_ns = int(index_interval * 1e9)
+        self.written = 0
+        self.dropped = 0
+        self.bytes = 0
+        self.file = None
+        self.index = None
+        self.thread = None
+
+    def start(self):
+        directory = os.path.dirname(self.filename)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        base, ext = os.path.splitext(self.filename)
+        attempt = 1
+        while True:
+            try:
+                self.file = open(self.filename, 'xb')
+                break
+            except FileExistsError:
+                # Never overwrite another session, take the next free name
+                self.filename = f"{base}_{attempt}{ext}"
+                self.index_filename = self.filename + '.idx'
+                attempt += 1
+        self.file.write(FILE_HEADER.pack(MAGIC, VERSION, time.time(), time.monotonic_ns()))
+        self.index = open(self.index_filename, 'wb')
+        self.index.write(INDEX_HEADER.pack(INDEX_MAGIC, VERSION))
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        return self
+
+    def write(self, kind, data, t_ns=None):
+        # Frames are often views of a reused buffer, the bytes are copied here
+        try:
+            self.queue.put_nowait((time.monotonic_ns() if t_ns is None else t_ns, kind, bytes(data)))
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    def tx_frame(self, frame):
+        return self.write(TX_FRAME, frame)
+
+    def rx_frame(self, frame):
+        return self.write(RX_FRAME, frame)
+
+    def gps_fix(self, fix):
+        return self.write(GPS_FIX, encode_gps(fix))
+
+    def command(self, lat, lon, alt, v_north, v_east):
+        return self.write(COMMAND, encode_command(lat, lon, alt, v_north, v_east))
+
+    def close(self):
+        self.queue.put(None)
+        if self.thread is not None:
+            self.thread.join()
+
+    def stats(self):
+        return {'written': self.written, 'dropped': self.dropped, 'bytes': self.bytes,
+                'file': self.filename}
+
+    def _run(self):
+        next_index = 0
+        deadline = time.monotonic() + self.flush_interval
+        while True:
+            try:
+                item = self.queue.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                item = False
+            if item is None:
+                break
+            if item:
+                t_ns, kind, data = item
+                if t_ns >= next_index:
+                    self.index.write(INDEX_ENTRY.pack(t_ns, self.file.tell()))
+                    next_index = t_ns + self.index_interval_ns
+                self.file.write(RECORD_HEADER.pack(len(data), kind, t_ns))
+                self.file.write(data)
+                self.written += 1
+                self.bytes += RECORD_HEADER.size + len(data)
+            if time.monotonic() >= deadline:
+                # The index only points at records that are already on disk
+                self.file.flush()
+                self.index.flush()
+                deadline = time.monotonic() + self.flush_interval
+        self.file.close()
+        self.index.close()
+
+class FlightLog():
+    """
+    Memory-mapped reader for a FlightRecorder log.
+
+    seek() bisects the sparse index and records() walks forward from there,
+    so a time range in a multi-hour log costs only the records in it. The
+    index is rebuilt in memory if it is missing or does not match the log;
+    a record cut short by a crash ends the log.
+    """
+    def __init__(self, filename, index_interval=1.0):
+        self.filename = filename
+        with open(filename, 'rb') as f:
+            self.size = os.fstat(f.fileno()).st_size
+            if self.size < FILE_HEADER.size:
+                raise ValueError(f"{filename} is not a flight log")
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.wall_start, self.start_ns = FILE_HEADER.unpack_from(self.map)
+        if magic != MAGIC or version != VERSION:
+            self.map.close()
+            raise ValueError(f"{filename} is not a version {VERSION} flight log")
+        self.index_times, self.index_offsets = self._load_index(filename + '.idx')
+        if not self.index_offsets:
+            self.index_times, self.index_offsets = self._build_index(int(index_interval * 1e9))
+
+    def close(self):
+        self.map.close()
+
+    def _load_index(self, index_filename):
+        times, offsets = [], []
+        try:
+            with open(index_filename, 'rb') as f:
+                data = f.read()
+        except OSError:
+            return times, offsets
+        if len(data) < INDEX_HEADER.size or INDEX_HEADER.unpack_from(data) != (INDEX_MAGIC, VERSION):
+            return times, offsets
+        end = INDEX_HEADER.size + (len(data) - INDEX_HEADER.size) // INDEX_ENTRY.size * INDEX_ENTRY.size
+        for t_ns, offset in INDEX_ENTRY.iter_unpack(data[INDEX_HEADER.size:end]):
+            # Entries past a log cut short by a crash are dropped, any other
+            # entry has to point at a record with the same time
+            header = self._header(offset)
+            if header is None:
+                break
+            if header[2] != t_ns:
+                return [], []
+            times.append(t_ns)
+            offsets.append(offset)
+        return times, offsets
+
+    def _build_index(self, interval_ns):
+        times, offsets = [], []
+        next_index = 0
+        offset = FILE_HEADER.size
+        while True:
+            header = self._header(offset)
+            if header is None:
+                break
+            length, _, t_ns = header
+            if t_ns >= next_index:
+                times.append(t_ns)
+                offsets.append(offset)
+                next_index = t_ns + interval_ns
+            offset += RECORD_HEADER.size + length
+        return times, offsets
+
+    def _header(self, offset):
+        if offset < FILE_HEADER.size or offset + RECORD_HEADER.size > self.size:
+            return None
+        header = RECORD_HEADER.unpack_from(self.map, offset)
+        if offset + RECORD_HEADER.size + header[0] > self.size:
+            return None
+        return header
+
+    def seek(self, t=None):
+        """
+        Offset to start reading at for records from t seconds into the session.
+        """
+        if t is None or not self.index_offsets:
+            return FILE_HEADER.size
+        i = bisect.bisect_right(self.index_times, self.start_ns + int(t * 1e9)) - 1
+        return self.index_offsets[max(i, 0)]
+
+    def records(self, start=None, end=None, kinds=None):
+        """
+        Yields Records with start <= t < end (seconds into the session),
+        optionally only the given kinds, in file order. Records up to
+        REORDER_SLACK_NS out of time order are still found. Payloads are
+        views into the map, copy them to keep them past close().
+        """
+        start_ns = None if start is None else self.start_ns + int(start * 1e9)
+        end_ns = None if end is None else self.start_ns + int(end * 1e9)
+        view = memoryview(self.map)
+        unpack = RECORD_HEADER.unpack_from
+        header_size = RECORD_HEADER.size
+        # Out of order records can sit a little before the index entry or past end
+        offset = self.seek(None if start is None else start - REORDER_SLACK_NS / 1e9)
+        stop_ns = None if end_ns is None else end_ns + REORDER_SLACK_NS
+        try:
+            while offset + header_size <= self.size:
+                length, kind, t_ns = unpack(self.map, offset)
+                payload_end = offset + header_size + length
+                if payload_end > self.size:
+                    break
+                if stop_ns is not None and t_ns >= stop_ns:
+                    break
+                if ((start_ns is None or t_ns >= start_ns) and (end_ns is None or t_ns < end_ns) and
+                        (kinds is None or kind in kinds)):
+                    yield Record((t_ns - self.start_ns) / 1e9, kind, view[offset + header_size:payload_end])
+                offset = payload_end
+        finally:
+            view.release()
+
+    def duration(self):
+        """
+        Seconds from the start of the session to the last indexed record.
+        """
+        if not self.index_times:
+            return 0.0
+        last = None
+        for record in self.records(start=(self.index_times[-1] - self.start_ns) / 1e9):
+            last = record.t
+        return last if last is not None else 0.0
+
+    def summary(self, start=None, end=None):
+        counts = {name: 0 for name in KINDS}
+        first = last = None
+        for record in self.records(start, end):
+            name = KIND_NAMES.get(record.kind, 'unknown')
+            counts[name] = counts.get(name, 0) + 1
+            if first is None:
+                first = record.t
+            last = record.t
+        return dict(counts, first_s=first, last_s=last, index_entries=len(self.index_offsets),
+                    started=time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(self.wall_start)))
+
+def replay(log, endpoint="tcp://*:4444", topic=b"32", speed=1.0, start=None, end=None,
+           kinds=(RX_FRAME,), settle=0.5):
+    """
+    Publishes the recorded frames on a wsmp_hle PUB socket, as the stack
+    does, so py_rx.py can run against a recorded session. speed scales the
+    recorded gaps (2 is twice real time), 0 sends as fast as possible.
+    TX frames are turned into the wsmp_hle frames a receiver would have seen.
+    Returns the number of frames published.
+    """
+    import zmq
+    context = zmq.Context()
+    socket = context.socket(zmq.PUB)
+    # Faster than real time must not drop frames at the high water mark
+    socket.setsockopt(zmq.SNDHWM, 0)
+    socket.bind(endpoint)
+    # Give subscribers time to connect before the first frame
+    time.sleep(settle)
+    sent = 0
+    first_t = None
+    wall_start = time.monotonic()
+    try:
+        for record in log.records(start, end, kinds):
+            if speed > 0:
+                if first_t is None:
+                    first_t = record.t
+                delay = (record.t - first_t) / speed - (time.monotonic() - wall_start)
+                if delay > 0:
+                    time.sleep(delay)
+            frame = record.payload.tobytes()
+            if record.kind == TX_FRAME:
+                frame = hle_to_wsmp_hle(frame)
+            socket.send_multipart([topic, frame])
+            sent += 1
+    finally:
+        socket.close(linger=1000)
+        context.term()
+    return sent
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Inspect or replay a flight recorder log")
+    parser.add_argument('command', choices=['info', 'dump', 'replay'])
+    parser.add_argument('log', help="flight log (.rec)")
+    parser.add_argument('--start', type=float, help="seconds into the session")
+    parser.add_argument('--end', type=float, help="seconds into the session")
+    parser.add_argument('--kind', choices=sorted(KINDS), action='append',
+                        help="record kinds to dump or replay, repeatable (replay default: rx)")
+    parser.add_argument('--speed', type=float, default=1.0, help="replay speed, 0 for as fast as possible")
+    parser.add_argument('--endpoint', default="tcp://*:4444", help="replay PUB socket")
+    args = parser.parse_args()
+
+    log = FlightLog(args.log)
+    kinds = None if args.kind is None else {KINDS[name] for name in args.kind}
+    if args.command == 'info':
+        for name, value in log.summary(args.start, args.end).items():
+            print(f"{name}: {value}")
+    elif args.command == 'dump':
+        for record in log.records(args.start, args.end, kinds):
+            if record.kind == GPS_FIX:
+                detail = decode_gps(record.payload)
+            elif record.kind == COMMAND:
+                detail = decode_command(record.payload)
+            else:
+                detail = record.payload.hex()
+            print(f"{record.t:12.6f} {KIND_NAMES.get(record.kind, record.kind):8s} {detail}")
+    else:
+        start = time.monotonic()
+        sent = replay(log, args.endpoint, speed=args.speed, start=args.start, end=args.end,
+                      kinds=kinds or {RX_FRAME})
+        print(f"replayed {sent} frames in {time.monotonic() - start:.1f} s")
+    log.close()
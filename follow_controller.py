@@ -0,0 +1,99 @@
+import math
+import time
+from collections import namedtuple
+from geodesy import destination, enu
+from rate_scheduler import RateScheduler
+
+# SET_POSITION_TARGET_GLOBAL_INT settings: relative altitude frame, use
+# position and velocity, ignore acceleration, yaw and yaw rate
+MAV_FRAME_GLOBAL_RELATIVE_ALT_INT = 6
+POS_VEL_TYPE_MASK = 0b0000110111000000
+
+# Latest leader state; received is the time.monotonic() it arrived
+LeaderState = namedtuple('LeaderState', ['lat', 'lon', 'speed', 'heading', 'received'])
+
+class FollowController():
+    """
+    Closed-loop follow mode.
+
+    At rate_hz the follower aims at a point standoff_m behind the leader
+    along its heading and sends SET_POSITION_TARGET_GLOBAL_INT with that
+    position and a velocity: the leader's own velocity as feed-forward plus
+    gain * position error, capped at max_speed. The target is recomputed
+    every cycle, there is no waiting to arrive. If the leader state is
+    older than max_age seconds the follower holds the position it had when
+    the leader went stale, until a fresh state arrives.
+    """
+    def __init__(self, vehicle, altitude, standoff_m=5.0, rate_hz=10, gain=0.5,
+                 max_speed=10.0, max_age=2.0):
+        self.vehicle = vehicle
+        self.altitude = altitude
+        self.standoff_m = standoff_m
+        self.rate_hz = rate_hz
+        self.gain = gain
+        self.max_speed = max_speed
+        self.max_age = max_age
+        self.commands = 0
+        # (lat, lon, alt, v_north, v_east) of the last position target sent
+        self.last_command = None
+        # (lat, lon) held while there is no fresh leader state
+        self.hold = None
+
+    def target(self, leader):
+        """
+        Returns (lat, lon, v_north, v_east) of the follow point.
+        """
+        lat, lon = destination(leader.lat, leader.lon, leader.heading + 180.0, self.standoff_m)
+        heading = math.radians(leader.heading)
+        return lat, lon, leader.speed * math.cos(heading), leader.speed * math.sin(heading)
+
+    def velocity_command(self, own_lat, own_lon, target_lat, target_lon, v_north, v_east):
+        err_e, err_n, _ = enu(target_lat, target_lon, own_lat, own_lon)
+        v_north += self.gain * err_n
+        v_east += self.gain * err_e
+        speed = math.hypot(v_north, v_east)
+        if speed > self.max_speed:
+            v_north *= self.max_speed / speed
+            v_east *= self.max_speed / speed
+        return v_north, v_east
+
+    def send_target(self, lat, lon, v_north, v_east):
+        msg = self.vehicle.message_factory.set_position_target_global_int_encode(
+            0, 0, 0, MAV_FRAME_GLOBAL_RELATIVE_ALT_INT, POS_VEL_TYPE_MASK,
+            int(lat * 1e7), int(lon * 1e7), self.altitude,
+            v_north, v_east, 0,
+            0, 0, 0, 0, 0)
+        self.vehicle.send_mavlink(msg)
+        self.commands += 1
+        self.last_command = (lat, lon, self.altitude, v_north, v_east)
+
+    def step(self, leader, now=None):
+        own = self.vehicle.location.global_relative_frame
+        if own.lat is None or own.lon is None:
+            return None
+        now = time.monotonic() if now is None else now
+        if leader is None or now - leader.received > self.max_age:
+            # No fresh leader state: hold where the vehicle was when it went stale
+            if self.hold is None:
+                self.hold = (own.lat, own.lon)
+            self.send_target(self.hold[0], self.hold[1], 0.0, 0.0)
+            return None
+        self.hold = None
+        lat, lon, v_north, v_east = self.target(leader)
+        v_north, v_east = self.velocity_command(own.lat, own.lon, lat, lon, v_north, v_east)
+        self.send_target(lat, lon, v_north, v_east)
+        return lat, lon, v_north, v_east
+
+    def run(self, get_leader, should_stop=None, on_step=None):
+        """
+        Runs step() at rate_hz with the leader state returned by get_leader()
+        until should_stop() returns True. on_step(leader, result) is called
+        right after each command is sent.
+        """
+        scheduler = RateScheduler(self.rate_hz)
+        while should_stop is None or not should_stop():
+            scheduler.wait()
+            leader = get_leader()
+            result = self.step(leader)
+            if on_step is not None:
+                on_step(leader, result)
@@ -0,0 +1,169 @@
+"""
+Geodesy helpers shared by the transmitter, receiver and drone scripts.
+
+Scalar functions use math and are meant for the live loops, one fix at a
+time. The *_batch functions take NumPy arrays (or anything np.asarray
+accepts) of degrees and work on whole tracks at once for post-flight
+analysis. Distances are in metres, bearings in degrees clockwise from
+true north in [0, 360).
+"""
+import math
+import numpy as np
+
+# WGS84 ellipsoid
+WGS84_A = 6378137.0
+WGS84_F = 1 / 298.257223563
+WGS84_E2 = WGS84_F * (2 - WGS84_F)
+
+# Mean earth radius used for great-circle distances
+EARTH_RADIUS_M = 6371008.8
+
+#####scalar fast paths#####
+
+def ecef(lat, lon, alt=0.0):
+    lat, lon = math.radians(lat), math.radians(lon)
+    sin_lat = math.sin(lat)
+    cos_lat = math.cos(lat)
+    n = WGS84_A / math.sqrt(1 - WGS84_E2 * sin_lat * sin_lat)
+    x = (n + alt) * cos_lat * math.cos(lon)
+    y = (n + alt) * cos_lat * math.sin(lon)
+    z = (n * (1 - WGS84_E2) + alt) * sin_lat
+    return x, y, z
+
+def enu(lat, lon, lat0, lon0, alt=0.0, alt0=0.0):
+    """
+    East/north/up offset in metres of (lat, lon) from the reference (lat0, lon0).
+    """
+    x, y, z = ecef(lat, lon, alt)
+    x0, y0, z0 = ecef(lat0, lon0, alt0)
+    dx, dy, dz = x - x0, y - y0, z - z0
+    phi, lam = math.radians(lat0), math.radians(lon0)
+    sin_phi, cos_phi = math.sin(phi), math.cos(phi)
+    sin_lam, cos_lam = math.sin(lam), math.cos(lam)
+    e = -sin_lam * dx + cos_lam * dy
+    n = -sin_phi * cos_lam * dx - sin_phi * sin_lam * dy + cos_phi * dz
+    u = cos_phi * cos_lam * dx + cos_phi * sin_lam * dy + sin_phi * dz
+    return e, n, u
+
+def geodetic(x, y, z):
+    """
+    ECEF to (lat, lon, alt), Bowring's closed form (sub-millimetre near the surface).
+    """
+    b = WGS84_A * (1 - WGS84_F)
+    ep2 = (WGS84_A * WGS84_A - b * b) / (b * b)
+    p = math.hypot(x, y)
+    theta = math.atan2(z * WGS84_A, p * b)
+    lat = math.atan2(z + ep2 * b * math.sin(theta) ** 3,
+                     p - WGS84_E2 * WGS84_A * math.cos(theta) ** 3)
+    lon = math.atan2(y, x)
+    sin_lat = math.sin(lat)
+    n = WGS84_A / math.sqrt(1 - WGS84_E2 * sin_lat * sin_lat)
+    cos_lat = math.cos(lat)
+    if abs(cos_lat) > 1e-12:
+        alt = p / cos_lat - n
+    else:
+        alt = abs(z) - b
+    return math.degrees(lat), math.degrees(lon), alt
+
+def enu_to_geodetic(e, n, u, lat0, lon0, alt0=0.0):
+    """
+    Inverse of enu(): (lat, lon, alt) of an east/north/up offset from the reference.
+    """
+    x0, y0, z0 = ecef(lat0, lon0, alt0)
+    phi, lam = math.radians(lat0), math.radians(lon0)
+    sin_phi, cos_phi = math.sin(phi), math.cos(phi)
+    sin_lam, cos_lam = math.sin(lam), math.cos(lam)
+    dx = -sin_lam * e - sin_phi * cos_lam * n + cos_phi * cos_lam * u
+    dy = cos_lam * e - sin_phi * sin_lam * n + cos_phi * sin_lam * u
+    dz = cos_phi * n + sin_phi * u
+    return geodetic(x0 + dx, y0 + dy, z0 + dz)
+
+def haversine(lat1, lon1, lat2, lon2):
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlam = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlam / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(min(1.0, math.sqrt(a)))
+
+def bearing(lat1, lon1, lat2, lon2):
+    """
+    Initial great-circle bearing from point 1 to point 2.
+    """
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dlam = math.radians(lon2 - lon1)
+    y = math.sin(dlam) * math.cos(phi2)
+    x = math.cos(phi1) * math.sin(phi2) - math.sin(phi1) * math.cos(phi2) * math.cos(dlam)
+    return math.degrees(math.atan2(y, x)) % 360.0
+
+def destination(lat, lon, bearing_deg, dist):
+    """
+    Point reached after travelling dist metres from (lat, lon) on bearing_deg.
+    """
+    phi1, lam1 = math.radians(lat), math.radians(lon)
+    theta = math.radians(bearing_deg)
+    delta = dist / EARTH_RADIUS_M
+    phi2 = math.asin(math.sin(phi1) * math.cos(delta) + math.cos(phi1) * math.sin(delta) * math.cos(theta))
+    lam2 = lam1 + math.atan2(math.sin(theta) * math.sin(delta) * math.cos(phi1),
+                             math.cos(delta) - math.sin(phi1) * math.sin(phi2))
+    return math.degrees(phi2), (math.degrees(lam2) + 540.0) % 360.0 - 180.0
+
+#####vectorized batch versions#####
+
+def ecef_batch(lat, lon, alt=0.0):
+    """
+    Returns an (N, 3) array of ECEF x, y, z in metres.
+    """
+    lat = np.radians(np.asarray(lat, dtype=np.float64))
+    lon = np.radians(np.asarray(lon, dtype=np.float64))
+    sin_lat = np.sin(lat)
+    cos_lat = np.cos(lat)
+    n = WGS84_A / np.sqrt(1 - WGS84_E2 * sin_lat * sin_lat)
+    out = np.empty(lat.shape + (3,))
+    out[..., 0] = (n + alt) * cos_lat * np.cos(lon)
+    out[..., 1] = (n + alt) * cos_lat * np.sin(lon)
+    out[..., 2] = (n * (1 - WGS84_E2) + alt) * sin_lat
+    return out
+
+def enu_batch(lat, lon, lat0, lon0, alt=0.0, alt0=0.0):
+    """
+    Returns an (N, 3) array of east/north/up offsets from the reference point.
+    """
+    d = ecef_batch(lat, lon, alt) - np.asarray(ecef(lat0, lon0, alt0))
+    phi, lam = math.radians(lat0), math.radians(lon0)
+    sin_phi, cos_phi = math.sin(phi), math.cos(phi)
+    sin_lam, cos_lam = math.sin(lam), math.cos(lam)
+    rot = np.array([[-sin_lam, cos_lam, 0.0],
+                    [-sin_phi * cos_lam, -sin_phi * sin_lam, cos_phi],
+                    [cos_phi * cos_lam, cos_phi * sin_lam, sin_phi]])
+    return d @ rot.T
+
+def haversine_batch(lat1, lon1, lat2, lon2):
+    phi1 = np.radians(np.asarray(lat1, dtype=np.float64))
+    phi2 = np.radians(np.asarray(lat2, dtype=np.float64))
+    dlam = np.radians(np.asarray(lon2, dtype=np.float64) - np.asarray(lon1, dtype=np.float64))
+    a = np.sin((phi2 - phi1) / 2) ** 2 + np.cos(phi1) * np.cos(phi2) * np.sin(dlam / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.minimum(1.0, np.sqrt(a)))
+
+def bearing_batch(lat1, lon1, lat2, lon2):
+    phi1 = np.radians(np.asarray(lat1, dtype=np.float64))
+    phi2 = np.radians(np.asarray(lat2, dtype=np.float64))
+    dlam = np.radians(np.asarray(lon2, dtype=np.float64) - np.asarray(lon1, dtype=np.float64))
+    y = np.sin(dlam) * np.cos(phi2)
+    x = np.cos(phi1) * np.sin(phi2) - np.sin(phi1) * np.cos(phi2) * np.cos(dlam)
+    return np.degrees(np.arctan2(y, x)) % 360.0
+
+def track_distances(lat, lon):
+    """
+    Distances between consecutive fixes of a track, length N-1.
+    """
+    lat = np.asarray(lat, dtype=np.float64)
+    lon = np.asarray(lon, dtype=np.float64)
+    return haversine_batch(lat[:-1], lon[:-1], lat[1:], lon[1:])
+
+def track_bearings(lat, lon):
+    """
+    Bearings between consecutive fixes of a track, length N-1.
+    """
+    lat = np.asarray(lat, dtype=np.float64)
+    lon = np.asarray(lon, dtype=np.float64)
+    return bearing_batch(lat[:-1], lon[:-1], lat[1:], lon[1:])
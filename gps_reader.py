@@ -0,0 +1,144 @@
+import math
+import threading
+import time
+from collections import namedtuple
+from gps import gps, WATCH_ENABLE, WATCH_NEWSTYLE
+from latency_stats import parse_gps_time
+
+# gpsd TPV modes
+MODE_NO_FIX = 1
+MODE_2D = 2
+MODE_3D = 3
+
+# One valid TPV report. time is the GPS time in seconds since the epoch
+# (None if gpsd sent none), received the time.monotonic() it was read.
+# epx/epy/eps are gpsd's 95% error estimates in m, m and m/s, or None.
+GpsFix = namedtuple('GpsFix', ['lat', 'lon', 'alt', 'speed', 'track', 'mode', 'time',
+                               'epx', 'epy', 'eps', 'received'])
+
+def _number(report, name):
+    value = getattr(report, name, None)
+    if isinstance(value, (int, float)) and not isinstance(value, bool) and math.isfinite(value):
+        return float(value)
+    return None
+
+def parse_tpv(report, received=None):
+    """
+    GpsFix from a gpsd report, None unless it is a TPV with a 2D/3D fix and
+    numeric lat/lon. Missing speed reads as 0.
+    """
+    if report.get('class') != 'TPV':
+        return None
+    mode = getattr(report, 'mode', 0)
+    lat = _number(report, 'lat')
+    lon = _number(report, 'lon')
+    if not isinstance(mode, int) or mode < MODE_2D or lat is None or lon is None:
+        return None
+    speed = _number(report, 'speed')
+    return GpsFix(lat, lon, _number(report, 'alt'), 0.0 if speed is None else speed,
+                  _number(report, 'track'), mode, parse_gps_time(getattr(report, 'time', None)),
+                  _number(report, 'epx'), _number(report, 'epy'), _number(report, 'eps'),
+                  time.monotonic() if received is None else received)
+
+class GpsReader():
+    """
+    Consumes the gpsd stream on its own thread and keeps the latest valid fix.
+
+    The fix is an immutable GpsFix swapped in with one assignment, so
+    latest() is a constant-time read that never blocks and never sees a
+    half-updated fix. SKY, DEVICE and other reports, and TPVs without a
+    usable fix, are only counted. on_fix(fix), if given, is called from the
+    reader thread for every new fix. The session is reopened after
+    reconnect_interval if gpsd goes away.
+    """
+    def __init__(self, host='127.0.0.1', port=2947, on_fix=None, reconnect_interval=1.0,
+                 rate_alpha=0.1):
+        self.host = host
+        self.port = port
+        self.on_fix = on_fix
+        self.reconnect_interval = reconnect_interval
+        self.rate_alpha = rate_alpha
+        self.fix = None
+        self.cond = threading.Condition()
+        self.reports = 0
+        self.fixes = 0
+        self.invalid = 0
+        self.reconnects = 0
+        self.interval = None
+        self.running = False
+        self.thread = None
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.running = False
+
+    def _run(self):
+        while self.running:
+            try:
+                session = gps(host=self.host, port=str(self.port), mode=WATCH_ENABLE | WATCH_NEWSTYLE)
+                self.reconnects += 1
+                while self.running:
+                    self._handle(session.next())
+            except (OSError, StopIteration) as e:
+                print("gpsd connection lost:", e)
+                time.sleep(self.reconnect_interval)
+
+    def _handle(self, report):
+        self.reports += 1
+        fix = parse_tpv(report)
+        if fix is None:
+            if report.get('class') == 'TPV':
+                self.invalid += 1
+            return
+        last = self.fix
+        if last is not None:
+            dt = fix.received - last.received
+            self.interval = dt if self.interval is None else self.interval + self.rate_alpha * (dt - self.interval)
+        with self.cond:
+            self.fix = fix
+            self.fixes += 1
+            self.cond.notify_all()
+        if self.on_fix is not None:
+            self.on_fix(fix)
+
+    def latest(self):
+        return self.fix
+
+    def age(self, now=None):
+        """
+        Seconds since the latest fix was read, None before the first fix.
+        """
+        fix = self.fix
+        if fix is None:
+            return None
+        return (time.monotonic() if now is None else now) - fix.received
+
+    def rate(self):
+        return 1.0 / self.interval if self.interval else None
+
+    def wait(self, after=None, timeout=None):
+        """
+        Blocks until there is a fix other than after, returns it or None on timeout.
+        """
+        with self.cond:
+            self.cond.wait_for(lambda: self.fix is not None and self.fix is not after, timeout)
+            return self.fix if self.fix is not after else None
+
+    def stats(self):
+        age = self.age()
+        rate = self.rate()
+        fix = self.fix
+        return {
+            'reports': self.reports,
+            'fixes': self.fixes,
+            'invalid_tpv': self.invalid,
+            'reconnects': self.reconnects,
+            'rate_hz': rate,
+            'age_s': age,
+            'mode': None if fix is None else fix.mode,
+        }
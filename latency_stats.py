@@ -0,0 +1,231 @@
+import json
+import math
+import os
+import threading
+import time
+from datetime import datetime
+
+def parse_gps_time(value):
+    """
+    gpsd ISO8601 time ("2024-05-01T12:00:00.000Z") to seconds since the epoch.
+    """
+    if not isinstance(value, str):
+        return None
+    try:
+        return datetime.fromisoformat(value.replace('Z', '+00:00')).timestamp()
+    except ValueError:
+        return None
+
+class GpsClock():
+    """
+    Wall clock disciplined by GPS fixes: the offset between the fix time and
+    time.monotonic() at reception is kept, so now() is GPS time without
+    depending on the host clock. Falls back to time.time() before the first fix.
+    """
+    def __init__(self):
+        self.offset = None
+
+    def on_fix(self, gps_time, received=None):
+        if gps_time is None:
+            return
+        received = time.monotonic() if received is None else received
+        self.offset = gps_time - received
+
+    def now(self):
+        if self.offset is None:
+            return time.time()
+        return time.monotonic() + self.offset
+
+    def now_ms(self):
+        return int(self.now() * 1000)
+
+class LatencyHistogram():
+    """
+    Log-bucketed histogram of latencies in milliseconds. Buckets grow by
+    10% from 10 us to 100 s, so memory is constant and percentiles are
+    accurate to within one bucket.
+    """
+    MIN_MS = 0.01
+    RATIO = 1.1
+
+    def __init__(self):
+        self.nbuckets = int(math.log(1e5 / self.MIN_MS) / math.log(self.RATIO)) + 2
+        self.buckets = [0] * self.nbuckets
+        self.count = 0
+        self.total = 0.0
+        self.max = None
+        self.min = None
+        self.negative = 0
+
+    def record(self, ms):
+        if ms < 0:
+            # Clock disagreement between hosts, keep it visible
+            self.negative += 1
+            ms = 0.0
+        if ms <= self.MIN_MS:
+            i = 0
+        else:
+            i = min(self.nbuckets - 1, int(math.log(ms / self.MIN_MS) / math.log(self.RATIO)) + 1)
+        self.buckets[i] += 1
+        self.count += 1
+        self.total += ms
+        self.max = ms if self.max is None else max(self.max, ms)
+        self.min = ms if self.min is None else min(self.min, ms)
+
+    def percentile(self, q):
+        if self.count == 0:
+            return None
+        rank = q / 100.0 * self.count
+        seen = 0
+        for i, n in enumerate(self.buckets):
+            seen += n
+            if seen >= rank and n:
+                return min(self.max, self.MIN_MS * self.RATIO ** i)
+        return self.max
+
+    def summary(self):
+        if self.count == 0:
+            return {'count': 0}
+        return {
+            'count': self.count,
+            'mean_ms': self.total / self.count,
+            'p50_ms': self.percentile(50),
+            'p95_ms': self.percentile(95),
+            'p99_ms': self.percentile(99),
+            'min_ms': self.min,
+            'max_ms': self.max,
+            'negative': self.negative,
+        }
+
+class SeqTracker():
+    """
+    Gap and loss counter over 32-bit wrapping sequence numbers.
+    """
+    def __init__(self):
+        self.last = None
+        self.received = 0
+        self.lost = 0
+        self.gaps = 0
+        self.duplicates = 0
+        self.reordered = 0
+
+    def observe(self, seq):
+        self.received += 1
+        if self.last is None:
+            self.last = seq
+            return
+        delta = (seq - self.last) & 0xFFFFFFFF
+        if delta == 0:
+            self.duplicates += 1
+        elif delta < 0x80000000:
+            if delta > 1:
+                self.lost += delta - 1
+                self.gaps += 1
+            self.last = seq
+        else:
+            # Late arrival of a sequence number already counted as lost
+            self.reordered += 1
+            if self.lost > 0:
+                self.lost -= 1
+
+    def summary(self):
+        expected = self.received - self.duplicates + self.lost
+        return {
+            'received': self.received,
+            'lost': self.lost,
+            'gaps': self.gaps,
+            'duplicates': self.duplicates,
+            'reordered': self.reordered,
+            'loss_ratio': self.lost / expected if expected else 0.0,
+        }
+
+class LatencyRecorder():
+    """
+    Per-stage latency histograms plus per-sender sequence trackers. Call
+    maybe_report() from the main loop: every report_interval seconds it
+    prints a one-line summary per stage and rewrites json_file. Loops that
+    must not touch the disk call start() instead, which reports from a
+    background thread.
+    """
+    def __init__(self, name, json_file=None, report_interval=10.0):
+        self.name = name
+        self.json_file = json_file
+        self.report_interval = report_interval
+        self.stages = {}
+        self.senders = {}
+        self.counters = {}
+        self.started = time.time()
+        self.next_report = time.monotonic() + report_interval
+        self.thread = None
+
+    def record(self, stage, ms):
+        hist = self.stages.get(stage)
+        if hist is None:
+            hist = self.stages[stage] = LatencyHistogram()
+        hist.record(ms)
+
+    def observe_seq(self, seq, sender='default'):
+        if seq is None:
+            return
+        tracker = self.senders.get(sender)
+        if tracker is None:
+            tracker = self.senders[sender] = SeqTracker()
+        tracker.observe(seq)
+
+    def add_counters(self, name, summary):
+        """
+        Includes summary(), a dict of counters, in every report.
+        """
+        self.counters[name] = summary
+
+    def snapshot(self):
+        return {
+            'name': self.name,
+            'started': self.started,
+            'time': time.time(),
+            # Copies, the reporter thread runs while the main loop adds stages
+            'stages': {stage: hist.summary() for stage, hist in list(self.stages.items())},
+            'senders': {str(sender): t.summary() for sender, t in list(self.senders.items())},
+            'counters': {name: summary() for name, summary in list(self.counters.items())},
+        }
+
+    def write_json(self, path=None):
+        path = path or self.json_file
+        if path is None:
+            return
+        tmp = path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(self.snapshot(), f, indent=2)
+        os.replace(tmp, path)
+
+    def report(self):
+        for stage, hist in list(self.stages.items()):
+            s = hist.summary()
+            if s['count']:
+                print(f"[{self.name}] {stage}: n={s['count']} p50={s['p50_ms']:.2f} "
+                      f"p95={s['p95_ms']:.2f} p99={s['p99_ms']:.2f} max={s['max_ms']:.2f} ms")
+        for sender, tracker in list(self.senders.items()):
+            s = tracker.summary()
+            print(f"[{self.name}] seq {sender}: received={s['received']} lost={s['lost']} "
+                  f"({100 * s['loss_ratio']:.1f}%) gaps={s['gaps']} dup={s['duplicates']} reordered={s['reordered']}")
+        for name, summary in list(self.counters.items()):
+            print(f"[{self.name}] {name}: " + ' '.join(f"{k}={v}" for k, v in summary().items()))
+        self.write_json()
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        return self
+
+    def _run(self):
+        while True:
+            time.sleep(max(0.0, self.next_report - time.monotonic()))
+            self.maybe_report()
+
+    def maybe_report(self):
+        now = time.monotonic()
+        if now < self.next_report:
+            return False
+        self.next_report = now + self.report_interval
+        self.report()
+        return True
@@ -0,0 +1,149 @@
+import time
+from geodesy import haversine
+
+SELECT_MODES = ('nearest', 'mac', 'priority')
+
+def normalize_mac(mac):
+    """
+    '0F:0F:0F:0F:0F:0F' or '0f0f0f0f0f0f' to the hex form used as table key.
+    """
+    return mac.replace(':', '').replace('-', '').lower()
+
+class LeaderEntry():
+    """
+    Latest state of one transmitting OBU. rate is a moving average of its
+    beacon rate in Hz.
+    """
+    __slots__ = ('mac', 'lat', 'lon', 'speed', 'heading', 'seq', 'sent_ms',
+                 'first_seen', 'last_seen', 'count', 'rate')
+
+    def __init__(self, mac, now):
+        self.mac = mac
+        self.first_seen = now
+        self.last_seen = None
+        self.count = 0
+        self.rate = 0.0
+
+    def update(self, beacon, now, alpha):
+        if self.last_seen is not None:
+            dt = now - self.last_seen
+            if dt > 0:
+                self.rate += alpha * (1.0 / dt - self.rate)
+        self.lat = beacon.latitude
+        self.lon = beacon.longitude
+        self.speed = beacon.speed
+        self.heading = beacon.heading
+        self.seq = beacon.seq
+        self.sent_ms = beacon.timestamp
+        self.last_seen = now
+        self.count += 1
+
+    def __repr__(self):
+        return (f"LeaderEntry({self.mac} lat={self.lat:.7f} lon={self.lon:.7f} "
+                f"rate={self.rate:.1f}Hz count={self.count})")
+
+class LeaderTable():
+    """
+    Per-sender table of the latest beacon state, keyed by peer MAC.
+
+    Entries not heard from for max_age seconds are evicted. select() picks
+    the leader to follow:
+      mac       only the configured MAC
+      priority  highest priority (priorities maps MAC to a number, unknown
+                MACs count as 0)
+      nearest   closest to the own position
+    The choice is sticky: the current leader is kept while it stays fresh,
+    and in nearest mode it is only replaced by one that is switch_margin_m
+    closer, so two vehicles at similar range do not make the follower jump.
+    """
+    def __init__(self, mode='nearest', mac=None, priorities=None, max_age=3.0,
+                 switch_margin_m=10.0, rate_alpha=0.2, evict_interval=1.0):
+        if mode not in SELECT_MODES:
+            raise ValueError(f"unknown leader selection mode {mode}")
+        if mode == 'mac' and mac is None:
+            raise ValueError("mac selection needs a leader MAC")
+        self.mode = mode
+        self.mac = None if mac is None else normalize_mac(mac)
+        self.priorities = {normalize_mac(m): p for m, p in (priorities or {}).items()}
+        self.max_age = max_age
+        self.switch_margin_m = switch_margin_m
+        self.rate_alpha = rate_alpha
+        self.evict_interval = evict_interval
+        self.entries = {}
+        self.selected = None
+        self.evicted = 0
+        self.switches = 0
+        self.next_evict = 0.0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def update(self, mac, beacon, now=None):
+        now = time.monotonic() if now is None else now
+        entry = self.entries.get(mac)
+        if entry is None:
+            entry = self.entries[mac] = LeaderEntry(mac, now)
+        entry.update(beacon, now, self.rate_alpha)
+        if now >= self.next_evict:
+            self.evict(now)
+        return entry
+
+    def get(self, mac):
+        return self.entries.get(mac)
+
+    def evict(self, now=None):
+        now = time.monotonic() if now is None else now
+        self.next_evict = now + self.evict_interval
+        stale = [mac for mac, e in self.entries.items() if now - e.last_seen > self.max_age]
+        for mac in stale:
+            del self.entries[mac]
+        self.evicted += len(stale)
+        if self.selected is not None and self.selected not in self.entries:
+            self.selected = None
+        return stale
+
+    def _fresh(self, entry, now):
+        return entry is not None and now - entry.last_seen <= self.max_age
+
+    def select(self, own_lat=None, own_lon=None, now=None):
+        """
+        Returns the entry of the leader to follow, or None.
+        """
+        now = time.monotonic() if now is None else now
+        current = self.entries.get(self.selected)
+        if not self._fresh(current, now):
+            current = None
+
+        if self.mode == 'mac':
+            best = self.entries.get(self.mac)
+            best = best if self._fresh(best, now) else None
+        elif self.mode == 'priority':
+            fresh = [e for e in self.entries.values() if self._fresh(e, now)]
+            best = max(fresh, default=None,
+                       key=lambda e: (self.priorities.get(e.mac, 0), e is current, e.last_seen))
+        elif own_lat is None or own_lon is None:
+            # No own fix yet, keep the current leader or take the newest
+            best = current
+            if best is None:
+                fresh = [e for e in self.entries.values() if self._fresh(e, now)]
+                best = max(fresh, key=lambda e: e.last_seen, default=None)
+        else:
+            best, best_dist = None, None
+            for entry in self.entries.values():
+                if not self._fresh(entry, now):
+                    continue
+                dist = haversine(own_lat, own_lon, entry.lat, entry.lon)
+                if entry is not current:
+                    dist += self.switch_margin_m
+                if best_dist is None or dist < best_dist:
+                    best, best_dist = entry, dist
+
+        mac = None if best is None else best.mac
+        if mac != self.selected:
+            if self.selected is not None and mac is not None:
+                self.switches += 1
+            self.selected = mac
+        return best
+
+    def summary(self):
+        return [repr(e) + (' *' if e.mac == self.selected else '') for e in self.entries.values()]
@@ -0,0 +1,95 @@
+import csv
+import os
+import queue
+import threading
+import time
+
+class LogWriter():
+    """
+    CSV log written by a background thread.
+
+    write() only puts the record on a bounded queue and never blocks; when
+    the queue is full the record is dropped and counted in self.dropped.
+    The writer thread flushes in batches, when batch_size records are
+    pending or flush_interval seconds have passed, and rotates the file
+    once it grows past max_bytes (filename.1 is the most recent backup).
+    """
+    def __init__(self, filename, header=None, max_queue=1000, batch_size=50,
+                 flush_interval=1.0, max_bytes=10 * 1024 * 1024, backup_count=5):
+        self.filename = filename
+        self.header = header
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.dropped = 0
+        self.written = 0
+        self.file = None
+        self.writer = None
+        self.thread = None
+
+    def start(self):
+        self._open()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        return self
+
+    def write(self, fields):
+        try:
+            self.queue.put_nowait(fields)
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    def close(self):
+        self.queue.put(None)
+        if self.thread is not None:
+            self.thread.join()
+
+    def _open(self):
+        self.file = open(self.filename, 'a', newline='')
+        self.writer = csv.writer(self.file)
+        if self.header is not None and self.file.tell() == 0:
+            self.writer.writerow(self.header)
+
+    def _rotate(self):
+        self.file.close()
+        for i in range(self.backup_count - 1, 0, -1):
+            src = f"{self.filename}.{i}"
+            if os.path.exists(src):
+                os.replace(src, f"{self.filename}.{i + 1}")
+        if self.backup_count > 0:
+            os.replace(self.filename, f"{self.filename}.1")
+        else:
+            os.remove(self.filename)
+        self._open()
+
+    def _flush(self, batch):
+        if self.file.tell() >= self.max_bytes:
+            self._rotate()
+        self.writer.writerows(batch)
+        self.file.flush()
+        self.written += len(batch)
+
+    def _run(self):
+        batch = []
+        deadline = time.monotonic() + self.flush_interval
+        while True:
+            try:
+                record = self.queue.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                record = False
+            if record is None:
+                break
+            if record is not False:
+                batch.append(record)
+            if len(batch) >= self.batch_size or (batch and time.monotonic() >= deadline):
+                self._flush(batch)
+                batch = []
+            if time.monotonic() >= deadline:
+                deadline = time.monotonic() + self.flush_interval
+        if batch:
+            self._flush(batch)
+        self.file.close()
@@ -1,8 +1,29 @@
 import threading, zmq
+import argparse
 from enum import Enum
 import time
-from gps import *
 import csv
+from wsmp_codec import HleWsmpEncoder
+from track_buffer import TrackBuffer
+from log_writer import LogWriter
+from target_link import CSV_HEADER
+from wsmp_sender import WsmpSender
+from rate_scheduler import RateScheduler, RateMeter
+from latency_stats import GpsClock, LatencyRecorder
+from gps_reader import GpsReader
+from adaptive_rate import AdaptiveRate, ChannelLoadMonitor
+from flight_recorder import FlightRecorder, session_path
+from startup import Startup
+from transport import WsmpLink, UdpLink, BleLink, MultiLinkSender
+
+TX_LOG_HEADER = ['Timestamp', 'Seq', 'Time ms', 'Latitude', 'Longitude', 'Speed', 'Heading Angle', 'Frame Len']
+
+# Heading is only updated once the vehicle has moved this far (metres)
+HEADING_MIN_MOVE_M = 0.5
+
+# Startup steps run concurrently, the beacon loop waits this long for the WME reply
+WME_TIMEOUT_S = 5.0
+BLE_TIMEOUT_S = 5.0
 class Results(Enum):
     Failure = 0
     Success = 1
@@ -92,157 +113,131 @@ class mode(Enum):
     SPS_MODE = 1
     ADHOC_MODE = 2
 
-class hle_wsmp():
-    def __init__(self):
-        self.mode = Integer8()
-        self.ch_id = Integer8()
-        self.time_slot = Integer8()
-        self.data_rate = Integer8()
-        self.tx_pow = SInteger8()
-        self.ch_ld = Integer8()
-        self.info = Integer8()
-        self.usr_prio = Integer8()
-        self.expiry_time = Integer8()
-        self.mac = Integer48()
-        self.psid = Integer32()
-        self.dlen = Integer16()
-        self.data = None
-
-    def encode(self):
-        out = self.mode.encode() + self.ch_id.encode() + self.time_slot.encode() + self.data_rate.encode() + self.tx_pow.encode() + self.ch_ld.encode() + self.info.encode(
-                ) + self.usr_prio.encode() + self.expiry_time.encode() + self.mac.encode() + self.psid.encode() + self.dlen.encode() + self.data
-        return out
 
-def getPositionData(gps):
-    nx = gpsd.next()
-    if nx['class'] == 'TPV':
-        latitude = getattr(nx,'lat', "Unknown")
-        longitude = getattr(nx,'lon', "Unknown")
-        speed = getattr(nx,'speed',"unknown")
-        #print("Your position: lon = " + str(longitude) + ", lat = " + str(latitude)+", track: "+str(track))
-        #print("aaaaaaaaaaaaaaa", type(track))
-        gps_data = [latitude,longitude,speed]
-        return gps_data
-gpsd = gps(mode=WATCH_ENABLE|WATCH_NEWSTYLE)
-
-#####conversion from LAT-LONG to X,Y,Z coordinate####
-def get_cartesian(lat=None,lon=None):
-    lat, lon = math.radians(lat), math.radians(lon)
-    R = 6371 # radius of the earth
-    x = R * math.cos(lat) * math.cos(lon)
-    y = R * math.cos(lat) * math.sin(lon)
-    z = R *math.sin(lat)
-    return x,y,z
-
-#####calculating heading angle#####
-
-def get_heading(aLocation):
-       off_x = aLocation[-1][1] - aLocation[-2][1]
-       off_y = aLocation[-1][0] - aLocation[-2][0]
-       heading = 90.00 + math.atan2(-off_y, off_x) * 57.2957795
-       if heading < 0:
-           heading += 360.00
-       return heading
+# Constant hle_wsmp header fields are packed once, frames reuse one buffer
+wsmp_encoder = HleWsmpEncoder(mode=mode.SPS_MODE.value, ch_id=172, time_slot=0, data_rate=12,
+                              tx_pow=-9, ch_ld=0, info=0, usr_prio=0, expiry_time=0,
+                              mac=16557351571215, psid=32)
 
 def FillWsmpContent(data):
+    # Returns a view of the shared frame buffer, send it before the next call
+    if not isinstance(data, bytes):
+        data = bytes(data,'utf-8')
+    return wsmp_encoder.encode(data)
 
-    hle_msg = hle_wsmp()
-
-    hle_msg.mode.value = mode.SPS_MODE.value
-    hle_msg.ch_id.value = 172
-    hle_msg.time_slot.value = 0
-    hle_msg.data_rate.value = 12
-    hle_msg.tx_pow.value = -9
-    hle_msg.ch_ld.value = 0
-    hle_msg.info.value = 0
-    hle_msg.expiry_time.value = 0
-    hle_msg.usr_prio.value = 0
-    hle_msg.mac.value = 16557351571215
-    hle_msg.psid.value = 32
-    hle_msg.dlen.value = len(data)
-    hle_msg.data = bytes(data,'utf-8')
-
-    out = hle_msg.encode()
-    return out
-
-def wsmp_operation():
+def wsmp_operation(rate_hz=10, socket_type='dealer', adaptive=False, min_rate_hz=2.0, record_dir='flights',
+                   gps_reader=None, startup=None, extra_links=()):
 
     wsmp_context = zmq.Context()
-    wsmp_socket = wsmp_context.socket(zmq.REQ)
-    wsmp_socket.connect("tcp://localhost:5555")
-   # context = zmq.Context()
-
-# Create a REP socket
-    #server_socket = context.socket(zmq.REP)
+    sender = WsmpSender(wsmp_context, socket_type=socket_type)
+    # Every beacon goes out over the sidelink and any extra links (BLE, UDP),
+    # a degraded link only loses its own copy
+    transport = MultiLinkSender([WsmpLink(sender)] + list(extra_links))
+    scheduler = RateScheduler(rate_hz)
+    meter = RateMeter()
+
+    # Adaptive: the scheduler ticks at rate_hz and a beacon only goes out when the
+    # leader's motion or the min_rate_hz timeout calls for it, throttled by channel load
+    rate_ctl = None
+    if adaptive:
+        rate_ctl = AdaptiveRate(min_hz=min_rate_hz, max_hz=rate_hz)
+        ChannelLoadMonitor(wsmp_context, rate_ctl).start()
+        print(f"Beaconing at {min_rate_hz} to {rate_hz} Hz (adaptive) over", socket_type, "socket")
+    else:
+        print("Beaconing at", rate_hz, "Hz over", socket_type, "socket")
+
+    # gpsd is read on its own thread, the loop only picks up the latest fix
+    if gps_reader is None:
+        gps_reader = GpsReader().start()
+    fix = None
+    seq = 0
+
+    # Beacon timestamps follow GPS time, per-stage latencies go to latency_tx.json
+    clock = GpsClock()
+    # Reported from a background thread, the radio loop never touches the disk
+    latency = LatencyRecorder('tx', json_file='latency_tx.json').start()
+    latency.add_counters('gps', gps_reader.stats)
+    if extra_links:
+        latency.add_counters('links', transport.stats)
+    if rate_ctl is not None:
+        latency.add_counters('adaptive_rate', rate_ctl.summary)
+
+    # Every sent frame and GPS fix goes to a new binary flight log for this session
+    recorder = None
+    if record_dir:
+        recorder = FlightRecorder(session_path(record_dir, 'tx')).start()
+        latency.add_counters('recorder', recorder.stats)
+        print("Recording to", recorder.filename)
 
-# Replace with your friend's public IP and port
-   # friend_address = 'tcp://0.0.0.0:1234'
-    #server_socket.bind(friend_address)
-
-    print("Server is listening for incoming connections...")
-    
-
-    application_data = "APPLICATION DATA"
-    result = FillWsmpContent(application_data)
-    print("data before sending wsmp and len: \n",result,len(result))
-    
-    k=[]
-    cnt=0
-    sv=0
     head_ang=0
     speed=0
-    alocation=[[0,0]]
-    file_name = 'gps_data.csv'
+    # Bounded track of own fixes, constant memory for any flight length
+    track = TrackBuffer(capacity=64)
+
+    # Logs are written by background threads, the radio loop never touches the disk
+    tx_log = LogWriter("OBU_TX.txt", header=TX_LOG_HEADER).start()
+    gps_log = LogWriter("gps_data.csv", header=CSV_HEADER).start()
     while True:
-        
-        file1 = open("OBU_TX.txt","a")
-        file2 = open("gps_data.csv","a")
-        ############## editing fromn here
-        gps_data = getPositionData(gpsd)
-        if gps_data != None:
-            speed = gps_data[2]
-            latitude = gps_data[0]
-            longitude = gps_data[1]
-            alocation.append([latitude, longitude])
-            field_names = ['Latitude','Longitude']
-            data1 = f"latitude:{latitude},longitude:{longitude}"
-           # server_socket.send(data1.encode())
-            # message = server_socket.recv_string()
-            # print("Received request:", message)
-
-    # Send a response back to the client
-            # response = "Hello, friend!"
-            # server_socket.send_string(response)
-            file2.write(data1)
-            #with open(file_name,'w',newline='') as file:
-               # writer = csv.DictWriter(file,fieldnames=field_names)
-                #writer.writeheader()
-                #data = [{'Latitude':latitude,'Longitude':longitude}]
-               # for row in data:
-                   # writer.writerow(row)
-            head_ang = get_heading(alocation)
-            #print("speed", speed)
-            application_data = "speed:" + str(speed) + "," + "latitude:" + str(latitude) + "," + "longitude:" + str(longitude) + ","  +"heading_angle:" + str(head_ang)
-            ##########slow vehicle######
-            #k.append(speed)
-            #print(k)
-            
-
-
-
-        file2.close()
-        file1.write(application_data)
-        file1.close()
-        print("length: ",len(application_data))
-
-        result = FillWsmpContent(application_data)
-        print("data before sending wsmp and len: \n",result,len(result))
-
-        wsmp_socket.send(result)
-        msg = wsmp_socket.recv()
-        print(msg)
-        time.sleep(.1)
-    
+        # Beacons go out on a fixed monotonic schedule
+        scheduler.wait()
+
+        # Latest valid fix, never blocks; no beacon goes out until the first one
+        latest = gps_reader.latest()
+        if latest is None:
+            continue
+        if latest is not fix:
+            if fix is None and startup is not None:
+                startup.mark('first_fix')
+            fix = latest
+            latitude = fix.lat
+            longitude = fix.lon
+            speed = fix.speed
+            clock.on_fix(fix.time, fix.received)
+            track.append(fix.received, latitude, longitude, speed)
+            heading = track.heading(HEADING_MIN_MOVE_M)
+            if heading is not None:
+                head_ang = heading
+            gps_log.write([time.strftime('%Y-%m-%d %H:%M:%S', time.localtime()), latitude, longitude, speed, head_ang])
+            if recorder is not None:
+                recorder.gps_fix(fix)
+
+        if rate_ctl is not None and rate_ctl.due(latitude, longitude, speed, head_ang) is None:
+            continue
+
+        seq += 1
+        encode_start = time.monotonic()
+        timestamp = clock.now_ms()
+        fix_age_ms = (encode_start - fix.received) * 1000.0
+        result = wsmp_encoder.encode_beacon(seq, timestamp, latitude, longitude, speed, head_ang, fix_age_ms)
+        if transport.send(result):
+            meter.tick()
+            if startup is not None and startup.mark('first_beacon'):
+                threading.Thread(target=startup.report, daemon=True).start()
+        if recorder is not None:
+            recorder.tx_frame(result)
+        sent = time.monotonic()
+        latency.record('gps_fix_to_tx', (sent - fix.received) * 1000.0)
+        latency.record('tx_encode_send', (sent - encode_start) * 1000.0)
+        transport.poll()
+        tx_log.write([time.strftime('%Y-%m-%d %H:%M:%S', time.localtime()), seq, timestamp,
+                      latitude, longitude, speed, head_ang, len(result)])
+
+        rate = meter.poll()
+        if rate is not None:
+            print(f"beacon rate {rate:.1f} Hz (target {rate_hz} Hz), sent {sender.sent}, "
+                  f"acked {sender.acked}, dropped {sender.dropped}, behind {sender.behind}, "
+                  f"missed slots {scheduler.missed}")
+            if extra_links:
+                print("links:", transport.stats())
+            gps_stats = gps_reader.stats()
+            print(f"gps {gps_stats['rate_hz'] or 0:.1f} Hz, mode {gps_stats['mode']}, fix age {gps_stats['age_s']:.2f} s, "
+                  f"{gps_stats['invalid_tpv']} invalid TPV of {gps_stats['reports']} reports")
+            if rate_ctl is not None:
+                summary = rate_ctl.summary()
+                print(f"adaptive: channel load {summary['cbr']:.2f}, min gap {summary['min_interval_s']:.2f} s, "
+                      f"heading {summary['heading']}, position {summary['position']}, speed {summary['speed']}, "
+                      f"timeout {summary['timeout']}, held by DCC {summary['dcc_held']}")
+
 
 class Action(Enum):
     Add = 1
@@ -259,7 +254,7 @@ class wme_sub():
         out = self.action.encode() + self.psid.encode() + self.appname.encode()
         return out
 
-def Wme_operation():
+def Wme_operation(timeout=None):
     wme_context = zmq.Context()
     wme_socket = wme_context.socket(zmq.REQ)
     wme_socket.connect("tcp://localhost:9999")
@@ -271,29 +266,75 @@ def Wme_operation():
     psid_sub_mag.appname.value = "TX_APPLICATION"
     out = psid_sub_mag.encode()  
     wme_socket.send(out)
+    if timeout is not None and not wme_socket.poll(int(timeout * 1000)):
+        wme_socket.close(linger=0)
+        raise TimeoutError(f"no WME reply within {timeout} s")
     cmh_recv_msg = wme_socket.recv()
     print("psid 32 subscribed to wme")   
 
-
-if __name__ == "__main__":
-    ############ Initialise BLE ############
-    serial_port_path = '/dev/ttymxc3'
-    baud_rate = 115200
-
+def setup_ble(serial_port_path):
     # Open the serial port as a file
     ser_file = open(serial_port_path, 'wb+', buffering=0)
 
     # create service ID
     ser_file.write("AT+UBTGSER=4906276bda6a4a6cbf9473c61b96433c\r\n".encode())
 
-# create characteristic ID
+    # create characteristic ID
     ser_file.write("AT+UBTGCHA=49af5250f17646c5b99aa163a672c042,12,1,1,00,1,1\r\n".encode())
+    return ser_file
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="V2X beacon transmitter")
+    parser.add_argument('--rate', type=float, default=10, help="beacon rate in Hz, e.g. 10, 20 or 50")
+    parser.add_argument('--socket', choices=['req', 'dealer', 'push'], default='dealer',
+                        help="WSMP transmit mode, req is the original lockstep mode")
+    parser.add_argument('--adaptive', action='store_true',
+                        help="send on heading/position/speed change and channel load, --rate is the maximum")
+    parser.add_argument('--min-rate', type=float, default=2.0,
+                        help="--adaptive: beacon rate when the leader is not manoeuvring")
+    parser.add_argument('--record', default='flights', help="directory for the binary flight log")
+    parser.add_argument('--no-record', action='store_true', help="do not write a flight log")
+    parser.add_argument('--link', action='append', default=[], metavar='ble|udp:HOST:PORT',
+                        help="also send every beacon over the BLE characteristic or UDP, repeatable")
+    parser.add_argument('--ble-handle', type=int,
+                        help="value handle of the BLE characteristic, read from the AT+UBTGCHA response if not given")
+    args = parser.parse_args()
+
+    # gpsd, the WME subscription and the BLE setup do not depend on each other,
+    # they all start now; time to first fix and first beacon go to startup_tx.json
+    startup = Startup('tx', json_file='startup_tx.json')
+    gps_reader = GpsReader().start()
+
+    ############ Initialise BLE ############
+    serial_port_path = '/dev/ttymxc3'
+    baud_rate = 115200
+    startup.start('ble', setup_ble, serial_port_path)
 ################
-    Wme_operation()
-    app_operation_th = threading.Thread(target=wsmp_operation)
+    startup.start('wme', Wme_operation, WME_TIMEOUT_S)
+
+    # The beacon loop only needs the PSID subscription, it waits for the first fix itself
+    extra_links = []
+    ble_link = None
+    for link in args.link:
+        if link == 'ble':
+            ble_link = BleLink(args.ble_handle)
+            extra_links.append(ble_link)
+        elif link.startswith('udp:'):
+            _, host, port = link.split(':')
+            extra_links.append(UdpLink(host, int(port)))
+        else:
+            parser.error(f"unknown link {link}")
+
+    startup.wait('wme', WME_TIMEOUT_S + 1.0)
+    app_operation_th = threading.Thread(target=wsmp_operation, args=(args.rate, args.socket, args.adaptive, args.min_rate,
+                                                                    None if args.no_record else args.record,
+                                                                    gps_reader, startup, extra_links))
     app_operation_th.start()
-    
-
-    ser_file.write("AT+UBTGSER=4906276bda6a4a6cbf9473c61b96433c\r\n".encode())
-    
 
+    ser_file = startup.wait('ble', BLE_TIMEOUT_S)
+    if ser_file is not None:
+        ser_file.write("AT+UBTGSER=4906276bda6a4a6cbf9473c61b96433c\r\n".encode())
+        if ble_link is not None:
+            # BLE beacons start once the module is set up and a central connects
+            ble_link.attach(ser_file)
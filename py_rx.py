@@ -1,12 +1,28 @@
+import argparse
+import asyncio
 import zmq
+import zmq.asyncio
 from enum import Enum
 import threading
 import time
-from gps import *
-import math
-import csv
-import paramiko
-from scp import SCPClient
+from target_link import TargetLinkSender, TARGET_HEADER
+from beacon import decode_beacon, peek_seq
+from wsmp_codec import decode_wsmp_hle, peek_peer_mac, WSMP_HLE_HDR_LEN
+from geodesy import haversine
+from track_buffer import TrackBuffer
+from leader_table import LeaderTable, SELECT_MODES
+from transport import LinkSelector, DatagramLink, BleLinkReceiver, LINK_MAC_LEN
+from shm_slot import ShmSlotWriter, SLOT_PATH
+from log_writer import LogWriter
+from latency_stats import GpsClock, LatencyRecorder
+from gps_reader import GpsReader
+from flight_recorder import FlightRecorder, session_path
+
+# Raspberry Pi on the drone running drone4.py (target link receiver)
+RASPBERRY_PI_IP = '192.168.1.9'  # Replace with your Raspberry Pi IP address
+
+# Heading is only updated once the vehicle has moved this far (metres)
+HEADING_MIN_MOVE_M = 0.5
 
 class Results(Enum):
     Failure = 0
@@ -84,31 +100,6 @@ class Opaque():
         out = self.value.encode('utf-8')
         return out
 
-class wsmp_hle():
-    def __init__(self):
-        self.wsmp_version = Integer8()
-        self.channel_no = Integer8()
-        self.data_rate = Integer8()
-        self.tx_pow_level = SInteger8()
-        self.channel_load = Integer8()
-        self.user_priority = Integer8()
-        self.peer_mac_addr = Integer48()
-        self.psid = Integer32()
-        self.dlen = Integer16()
-        self.data = None
-
-    def decode(self, s):
-        ret_ver = self.wsmp_version.decode(s)
-        ret_chh = self.channel_no.decode(ret_ver)
-        ret_dr = self.data_rate.decode(ret_chh)
-        ret_txpow = self.tx_pow_level.decode(ret_dr)
-        ret_chld = self.channel_load.decode(ret_txpow)
-        ret_usr_prio = self.user_priority.decode(ret_chld)
-        ret_peer = self.peer_mac_addr.decode(ret_usr_prio)
-        ret_psid = self.psid.decode(ret_peer)
-        ret_len = self.dlen.decode(ret_psid)
-        self.data = ret_len[:self.dlen.value]
-
 class Action(Enum):
     Add = 1
     Delete = 2
@@ -137,134 +128,233 @@ def Wme_operation():
     cmh_recv_msg = wme_socket.recv()
     print("psid 32 subscribed to wme")
 
-def getPositionData(gps):
-    nx = gpsd.next()
-    if nx['class'] == 'TPV':
-        latitude = getattr(nx, 'lat', 'Unknown')
-        longitude = getattr(nx, 'lon', 'Unknown')
-        speed = getattr(nx, 'speed', 'unknown')
-        gps_data = [latitude, longitude, speed]
-        return gps_data
-
-gpsd = gps(mode=WATCH_ENABLE | WATCH_NEWSTYLE)
-
-def get_heading(aLocation):
-    off_x = aLocation[-1][1] - aLocation[-2][1]
-    off_y = aLocation[-1][0] - aLocation[-2][0]
-    heading = 90.00 + math.atan2(-off_y, off_x) * 57.2957795
-    if heading < 0:
-        heading += 360.00
-    return heading
-
-def get_cartesian(lat=None, lon=None):
-    lat, lon = math.radians(lat), math.radians(lon)
-    R = 6371  # radius of the earth
-    x = R * math.cos(lat) * math.cos(lon)
-    y = R * math.cos(lat) * math.sin(lon)
-    z = R * math.sin(lat)
-    return x, y, z
-
-def distance(x1, y1, z1, x2, y2, z2):
-    return math.sqrt((x2 - x1) ** 2 + (y2 - y1) ** 2 + (z2 - z1) ** 2)
-
-def create_ssh_client(server, port, user, password):
+class EgoState():
     """
-    Creates an SSH client connection to the remote Raspberry Pi.
+    Latest own position. Updated on the event loop for every new fix from
+    the gps reader thread, read by the frame handler without ever waiting
+    on gpsd.
     """
-    client = paramiko.SSHClient()
-    client.load_system_host_keys()
-    client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-    client.connect(server, port, user, password)
-    return client
+    def __init__(self):
+        self.latitude = None
+        self.longitude = None
+        self.speed = 0.0
+        self.heading = 0.0
+        self.updated = None
+        # Receive times are stamped in GPS time, comparable with beacon timestamps
+        self.clock = GpsClock()
+        # Bounded track of own fixes, constant memory for any flight length
+        self.track = TrackBuffer(capacity=64)
+
+    def update(self, latitude, longitude, speed, fix_time=None, received=None):
+        now = time.monotonic() if received is None else received
+        self.clock.on_fix(fix_time, now)
+        self.track.append(now, latitude, longitude, speed)
+        heading = self.track.heading(HEADING_MIN_MOVE_M)
+        if heading is not None:
+            self.heading = heading
+        self.latitude = latitude
+        self.longitude = longitude
+        self.speed = speed
+        self.updated = now
 
-def scp_file(local_file, remote_path, raspberry_pi_ip, raspberry_pi_user, raspberry_pi_password):
+#########################################
+async def gps_task(ego, latency, recorder=None, report_interval=10.0):
+    # gpsd is consumed on the reader thread, each valid fix is handed to the loop
+    loop = asyncio.get_running_loop()
+
+    def on_fix(fix):
+        loop.call_soon_threadsafe(ego.update, fix.lat, fix.lon, fix.speed, fix.time, fix.received)
+        if recorder is not None:
+            recorder.gps_fix(fix)
+
+    gps_reader = GpsReader(on_fix=on_fix).start()
+    latency.add_counters('gps', gps_reader.stats)
+    while True:
+        await asyncio.sleep(report_interval)
+        if gps_reader.latest() is None:
+            print("waiting for a GPS fix,", gps_reader.reports, "gpsd reports so far")
+
+class BeaconHandler():
     """
-    Transfers the CSV file to the Raspberry Pi using SCP.
+    Takes a beacon from any link through dedupe, link selection, decoding
+    and leader selection, and hands the leader's records to the output.
     """
-    ssh = create_ssh_client(raspberry_pi_ip, 22, raspberry_pi_user, raspberry_pi_password)
-    with SCPClient(ssh.get_transport()) as scp:
-        scp.put(local_file, remote_path)
-    ssh.close()
-
-#########################################
-def Wsmp_operation():
-    wsmp_context = zmq.Context()
+    def __init__(self, ego, out_queue, latency, leaders, slot=None, recorder=None, selector=None):
+        self.ego = ego
+        self.out_queue = out_queue
+        self.latency = latency
+        self.leaders = leaders
+        self.slot = slot
+        self.recorder = recorder
+        # Duplicate and late beacons, also copies from other links, are
+        # dropped on (mac, seq) before any parsing
+        self.selector = selector or LinkSelector()
+        latency.add_counters('seq_window', self.selector.window.summary)
+        latency.add_counters('links', self.selector.summary)
+
+    def on_wsmp(self, message, received):
+        rx_ms = self.ego.clock.now_ms()
+        if self.recorder is not None:
+            # Raw frame as delivered, before any filtering
+            self.recorder.rx_frame(message)
+
+        peer = peek_peer_mac(message)
+        if peer is None:
+            return
+        mac = peer.hex()
+        self.latency.observe_seq(peek_seq(message, WSMP_HLE_HDR_LEN), mac)
+        if not self.selector.accept('wsmp', mac, message, WSMP_HLE_HDR_LEN, rx_ms, received):
+            return
+
+        # Header and beacon are decoded in place, legacy text is still accepted
+        wsmp = decode_wsmp_hle(message)
+        if wsmp is None:
+            return
+        self.handle(decode_beacon(wsmp.data), peer, received, rx_ms)
+
+    def on_link(self, name, data):
+        # Link frames are the sender MAC followed by the beacon
+        received = time.monotonic()
+        rx_ms = self.ego.clock.now_ms()
+        if len(data) <= LINK_MAC_LEN:
+            return
+        peer = bytes(data[:LINK_MAC_LEN])
+        if not self.selector.accept(name, peer.hex(), data, LINK_MAC_LEN, rx_ms, received):
+            return
+        self.handle(decode_beacon(data, LINK_MAC_LEN), peer, received, rx_ms)
+
+    def handle(self, beacon, peer, received, rx_ms):
+        if beacon is None:
+            return
+        latency = self.latency
+        latency.record('rx_decode', (time.monotonic() - received) * 1000.0)
+        if beacon.timestamp is not None:
+            # Both ends stamp GPS time, so this is the over-the-air latency
+            latency.record('tx_to_rx', rx_ms - beacon.timestamp)
+            if beacon.fix_age_ms is not None:
+                latency.record('gps_fix_to_rx', rx_ms - beacon.timestamp + beacon.fix_age_ms)
+
+        # Every sender is tracked, only the selected leader goes to the drone
+        ego = self.ego
+        entry = self.leaders.update(peer.hex(), beacon, received)
+        if self.leaders.select(ego.latitude, ego.longitude, received) is not entry:
+            if latency.maybe_report():
+                print("leaders:", self.leaders.summary())
+            return
+
+        # Follow distance in metres along the earth surface
+        dist = None
+        if ego.latitude is not None:
+            dist = haversine(ego.latitude, ego.longitude, beacon.latitude, beacon.longitude)
+        print("Received data: ", beacon, "distance: ", dist)
+
+        timestamp = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime())
+        record = [timestamp, beacon.latitude, beacon.longitude, beacon.speed, beacon.heading,
+                  beacon.seq, beacon.timestamp, beacon.fix_age_ms, rx_ms]
+        if self.slot is not None:
+            # Same-host handoff to drone4.py, published before any other output
+            self.slot.write(beacon.latitude, beacon.longitude, beacon.speed, beacon.heading, beacon.seq,
+                            beacon.timestamp, beacon.fix_age_ms, rx_ms, peer)
+            latency.record('rx_to_slot', (time.monotonic() - received) * 1000.0)
+        if self.out_queue.full():
+            # Output is behind, the newest target matters most
+            self.out_queue.get_nowait()
+        self.out_queue.put_nowait((record, received))
+        if latency.maybe_report():
+            print("leaders:", self.leaders.summary())
+
+async def sub_task(handler):
+    wsmp_context = zmq.asyncio.Context.instance()
     wsmp_socket = wsmp_context.socket(zmq.SUB)
     wsmp_socket.connect("tcp://localhost:4444")
     wsmp_socket.setsockopt(zmq.SUBSCRIBE, b"32")
-    x_self = 0.0
-    y_self = 0.0
-    z_self = 0.0
-    x_rec = 0.0
-    y_rec = 0.0
-    z_rec = 0.0
-    latitude_self = 0.0
-    longitude_self = 0.0
-    latitude_rec = 0.0
-    longitude_rec = 0.0
-    speed_self = 0.0
-    dist = 0.0
-    head_self = 0.0
-    head_rec = 0.0
-    aLocation = [[0, 0]]
-    pos_time_self = [[]]
-    pos_time_rec = [[]]
-
-    # Open the CSV file in append mode
-    with open('gps_data.csv', 'a', newline='') as csvfile:
-        csvwriter = csv.writer(csvfile)
-        
-        # Write the header only if the file is empty
-        if csvfile.tell() == 0:
-            csvwriter.writerow(['Timestamp', 'Latitude', 'Longitude', 'Speed', 'Heading Angle'])
-        
-        while True:
-            message = wsmp_socket.recv()
-            gps_data = getPositionData(gpsd)
-            if gps_data is not None:
-                latitude_self = gps_data[0]
-                longitude_self = gps_data[1]
-                speed_self = gps_data[2]
-                x_self, y_self, z_self = get_cartesian(latitude_self, longitude_self)
-                pos_time_self.append([x_self, y_self, z_self])
-                aLocation.append([latitude_self, longitude_self])
-                head_self = get_heading(aLocation)
-                
-            if message != b'32':
-                rx = message.decode('utf-8', errors='ignore')
-                rx_clean = rx[18:]
-                print("Received data: ", rx_clean)
-                inp = rx_clean.split(',')
-                for pair in inp:
-                    k, v = pair.split(':')
-                    if k == 'speed':
-                        flo = float(v)
-                    elif k == 'latitude':
-                        latitude_rec = float(v)
-                    elif k == 'longitude':
-                        longitude_rec = float(v)
-                    elif k == 'heading_angle':
-                        head_rec = float(v)
-
-                x_rec, y_rec, z_rec = get_cartesian(latitude_rec, longitude_rec)
-                dist = distance(x_self, y_self, z_self, x_rec, y_rec, z_rec)
-
-                # Save the received data to the CSV file
-                timestamp = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime())
-                csvwriter.writerow([timestamp, latitude_rec, longitude_rec, flo, head_rec])
-                csvfile.flush()  # Ensure the data is written to the file
-
-                # Transfer the CSV file to the Raspberry Pi using SCP
-                scp_file(
-                    local_file='gps_data.csv',
-                    remote_path='/home/pi/Desktop/cv2x/new/gps_data.csv',  # Adjust the remote path as needed
-                    raspberry_pi_ip='192.168.1.9',  # Replace with your Raspberry Pi IP address
-                    raspberry_pi_user='pi',  # Replace with your Raspberry Pi username
-                    raspberry_pi_password='raspberry'  # Replace with your Raspberry Pi password
-                )
+
+    while True:
+        message = await wsmp_socket.recv()
+        if message == b'32':
+            continue
+        handler.on_wsmp(message, time.monotonic())
+
+async def start_links(handler, udp_port=None, ble_path=None):
+    # Extra links carrying the same beacons, e.g. the transmitter's BLE characteristic
+    loop = asyncio.get_running_loop()
+    if udp_port is not None:
+        await loop.create_datagram_endpoint(lambda: DatagramLink(lambda data: handler.on_link('udp', data)),
+                                            local_addr=('0.0.0.0', udp_port))
+        print("Receiving link frames on UDP port", udp_port)
+    if ble_path is not None:
+        BleLinkReceiver(ble_path, lambda data: loop.call_soon_threadsafe(handler.on_link, 'ble', data)).start()
+        print("Receiving BLE notifications on", ble_path)
+
+async def output_task(out_queue, latency, csv_file='gps_data.csv'):
+    # One long-lived connection to the drone, new records are streamed as they arrive
+    target_link = TargetLinkSender(RASPBERRY_PI_IP).start()
+
+    # The CSV is only an audit log, written from a background thread
+    audit_log = None
+    if csv_file is not None:
+        audit_log = LogWriter(csv_file, header=TARGET_HEADER).start()
+
+    while True:
+        records = [await out_queue.get()]
+        while not out_queue.empty():
+            records.append(out_queue.get_nowait())
+        for record, received in records:
+            # Push only the new record to the drone over the persistent link
+            target_link.send(record)
+            latency.record('rx_handoff', (time.monotonic() - received) * 1000.0)
+            if audit_log is not None:
+                audit_log.write(record)
+
+async def receiver_main(leaders, slot_path=SLOT_PATH, csv_file='gps_data.csv', record_dir='flights',
+                        udp_port=None, ble_path=None):
+    ego = EgoState()
+    out_queue = asyncio.Queue(maxsize=100)
+    # Per-stage latencies and per-sender loss go to latency_rx.json
+    latency = LatencyRecorder('rx', json_file='latency_rx.json')
+    slot = ShmSlotWriter(slot_path) if slot_path else None
+    # Every received frame and GPS fix goes to a new binary flight log for this session
+    recorder = None
+    if record_dir:
+        recorder = FlightRecorder(session_path(record_dir, 'rx')).start()
+        latency.add_counters('recorder', recorder.stats)
+        print("Recording to", recorder.filename)
+    handler = BeaconHandler(ego, out_queue, latency, leaders, slot, recorder)
+    await start_links(handler, udp_port, ble_path)
+    await asyncio.gather(gps_task(ego, latency, recorder), sub_task(handler),
+                         output_task(out_queue, latency, csv_file))
+
+def Wsmp_operation(leaders=None, slot_path=SLOT_PATH, csv_file='gps_data.csv', record_dir='flights',
+                   udp_port=None, ble_path=None):
+    asyncio.run(receiver_main(leaders or LeaderTable(), slot_path, csv_file, record_dir, udp_port, ble_path))
+
+def parse_priority(value):
+    mac, sep, priority = value.partition('=')
+    if not sep:
+        raise argparse.ArgumentTypeError("expected MAC=PRIORITY")
+    return mac, float(priority)
 
 #########################################
 
 if __name__ == '__main__':
-    thread_wsmp = threading.Thread(target=Wsmp_operation)
+    parser = argparse.ArgumentParser(description="V2X beacon receiver")
+    parser.add_argument('--select', choices=SELECT_MODES, default='nearest',
+                        help="which transmitter to follow when several are in range")
+    parser.add_argument('--leader', help="MAC of the leader for --select mac")
+    parser.add_argument('--priority', type=parse_priority, action='append', default=[],
+                        metavar='MAC=N', help="leader priority for --select priority, repeatable")
+    parser.add_argument('--shm', default=SLOT_PATH,
+                        help="shared memory slot for drone4.py on the same host, '' to disable")
+    parser.add_argument('--csv', default='gps_data.csv', help="audit log of forwarded targets")
+    parser.add_argument('--no-csv', action='store_true', help="do not write the audit log")
+    parser.add_argument('--record', default='flights', help="directory for the binary flight log")
+    parser.add_argument('--no-record', action='store_true', help="do not write a flight log")
+    parser.add_argument('--udp', type=int, help="also receive beacons sent with py_app_tx.py --link udp on this port")
+    parser.add_argument('--ble', help="also receive BLE beacon notifications from the module on this serial port")
+    args = parser.parse_args()
+    leaders = LeaderTable(args.select, mac=args.leader, priorities=dict(args.priority))
+
+    thread_wsmp = threading.Thread(target=Wsmp_operation,
+                                   args=(leaders, args.shm, None if args.no_csv else args.csv,
+                                         None if args.no_record else args.record, args.udp, args.ble))
     thread_wsmp.start()
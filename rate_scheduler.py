@@ -0,0 +1,58 @@
+import time
+
+class RateScheduler():
+    """
+    Drift-free periodic schedule on the monotonic clock.
+
+    Deadlines are advanced by a fixed period from the previous deadline,
+    not from when the caller woke up, so jitter does not accumulate. If the
+    caller falls more than a period behind, the missed slots are counted
+    and the schedule restarts from now instead of sending a burst.
+    """
+    def __init__(self, rate_hz):
+        self.set_rate(rate_hz)
+        self.next_time = None
+        self.missed = 0
+
+    def set_rate(self, rate_hz):
+        self.rate_hz = rate_hz
+        self.period = 1.0 / rate_hz
+
+    def wait(self):
+        now = time.monotonic()
+        if self.next_time is None:
+            self.next_time = now
+        delay = self.next_time - now
+        if delay > 0:
+            time.sleep(delay)
+        elif delay < -self.period:
+            self.missed += int(-delay / self.period)
+            self.next_time = now
+        self.next_time += self.period
+
+class RateMeter():
+    """
+    Counts events and reports the achieved rate once per window.
+    """
+    def __init__(self, window=5.0):
+        self.window = window
+        self.count = 0
+        self.total = 0
+        self.window_start = time.monotonic()
+
+    def tick(self, n=1):
+        self.count += n
+        self.total += n
+
+    def poll(self):
+        """
+        Returns the rate over the last window once it has elapsed, else None.
+        """
+        now = time.monotonic()
+        elapsed = now - self.window_start
+        if elapsed < self.window:
+            return None
+        rate = self.count / elapsed
+        self.count = 0
+        self.window_start = now
+        return rate
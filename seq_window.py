@@ -0,0 +1,115 @@
+import time
+from collections import OrderedDict
+
+SEQ_MASK = 0xFFFFFFFF
+SEQ_HALF = 0x80000000
+
+class SeqWindow():
+    """
+    Per-sender sliding window over 32-bit wrapping beacon sequence numbers,
+    checked on the raw (mac, seq) before a frame is parsed.
+
+    For each sender the highest sequence number seen and a bitmask of the
+    window - 1 numbers below it are kept. A beacon is accepted if it is newer
+    than the highest. Repeats are dropped as duplicates and anything older
+    than the window as stale. Late beacons inside the window are dropped as
+    reordered, or accepted when accept_reordered is set. A sender that jumps
+    back more than restart_gap, sends restart_after beacons in a row that
+    are all rejected, or has had nothing accepted for reset_after seconds,
+    is assumed to have restarted its counter. At most max_senders are tracked, the least
+    recently heard is forgotten first.
+    """
+    def __init__(self, window=64, accept_reordered=False, restart_gap=1000, restart_after=8,
+                 reset_after=10.0, max_senders=256):
+        self.window = window
+        self.full = (1 << window) - 1
+        self.accept_reordered = accept_reordered
+        self.restart_gap = restart_gap
+        self.restart_after = restart_after
+        self.reset_after = reset_after
+        self.max_senders = max_senders
+        # mac -> [highest seq, seen bitmask, last accepted, rejected in a row]
+        self.senders = OrderedDict()
+        self.accepted = 0
+        self.duplicates = 0
+        self.reordered = 0
+        self.stale = 0
+        self.restarts = 0
+        self.unsequenced = 0
+
+    def _start(self, mac, seq, now):
+        self.senders[mac] = [seq, 1, now, 0]
+        self.senders.move_to_end(mac)
+        while len(self.senders) > self.max_senders:
+            self.senders.popitem(last=False)
+        self.accepted += 1
+        return True
+
+    def accept(self, mac, seq, now=None):
+        """
+        Returns True if the beacon should be processed.
+        """
+        if seq is None:
+            # Legacy text beacons carry no sequence number
+            self.unsequenced += 1
+            return True
+        now = time.monotonic() if now is None else now
+        state = self.senders.get(mac)
+        if state is None:
+            return self._start(mac, seq, now)
+        if now - state[2] > self.reset_after:
+            self.restarts += 1
+            return self._start(mac, seq, now)
+        self.senders.move_to_end(mac)
+
+        ahead = (seq - state[0]) & SEQ_MASK
+        if ahead == 0:
+            return self._reject(state, mac, seq, now, 'duplicates')
+        if ahead < SEQ_HALF:
+            state[1] = ((state[1] << ahead) | 1) & self.full if ahead < self.window else 1
+            state[0] = seq
+            state[2] = now
+            state[3] = 0
+            self.accepted += 1
+            return True
+
+        behind = (state[0] - seq) & SEQ_MASK
+        if behind > self.restart_gap:
+            self.restarts += 1
+            return self._start(mac, seq, now)
+        if behind >= self.window:
+            return self._reject(state, mac, seq, now, 'stale')
+        bit = 1 << behind
+        if state[1] & bit:
+            return self._reject(state, mac, seq, now, 'duplicates')
+        state[1] |= bit
+        if self.accept_reordered:
+            state[2] = now
+            state[3] = 0
+            self.accepted += 1
+            return True
+        return self._reject(state, mac, seq, now, 'reordered')
+
+    def _reject(self, state, mac, seq, now, counter):
+        state[3] += 1
+        if state[3] >= self.restart_after:
+            # Nothing new for restart_after beacons in a row: the counter
+            # restarted less than restart_gap back, maybe inside the window
+            self.restarts += 1
+            return self._start(mac, seq, now)
+        setattr(self, counter, getattr(self, counter) + 1)
+        return False
+
+    def dropped(self):
+        return self.duplicates + self.reordered + self.stale
+
+    def summary(self):
+        return {
+            'senders': len(self.senders),
+            'accepted': self.accepted,
+            'duplicates': self.duplicates,
+            'reordered': self.reordered,
+            'stale': self.stale,
+            'restarts': self.restarts,
+            'unsequenced': self.unsequenced,
+        }
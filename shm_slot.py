@@ -0,0 +1,144 @@
+import mmap
+import os
+import struct
+import tempfile
+import time
+from collections import namedtuple
+from target_link import TargetRecord
+
+# Latest leader state shared between py_rx.py and drone4.py on one host.
+#
+# The file holds a single fixed little-endian record:
+#   magic      4s   SLOT_MAGIC
+#   size       u32  payload size, guards against layout mismatches
+#   generation u64  seqlock counter, odd while a write is in progress
+#   payload    SLOT_PAYLOAD_STRUCT
+# The writer bumps generation to odd, packs the payload and bumps it to
+# even again. A reader copies the payload between two reads of generation
+# and retries if they differ or are odd, so neither side ever takes a lock.
+SLOT_MAGIC = b'DFT1'
+SLOT_HEADER_STRUCT = struct.Struct('<4sIQ')
+GENERATION_STRUCT = struct.Struct('<Q')
+GENERATION_OFFSET = 8
+
+# flags: which optional beacon fields are present
+HAS_SEQ = 0x01
+HAS_SENT = 0x02
+HAS_FIX_AGE = 0x04
+HAS_RX = 0x08
+
+#   lat, lon, speed, heading (f64), written monotonic ns (u64), seq (u32),
+#   sent ms (u64), rx ms (u64), fix age ms (u16), flags (u8), peer mac (6s)
+SLOT_PAYLOAD_STRUCT = struct.Struct('<ddddQIQQHB6s')
+SLOT_PAYLOAD_OFFSET = SLOT_HEADER_STRUCT.size
+SLOT_SIZE = SLOT_PAYLOAD_OFFSET + SLOT_PAYLOAD_STRUCT.size
+
+def default_slot_path():
+    shm = '/dev/shm'
+    base = shm if os.path.isdir(shm) else tempfile.gettempdir()
+    return os.path.join(base, 'drone_target.slot')
+
+SLOT_PATH = default_slot_path()
+
+# record is a TargetRecord; written is the writer's time.monotonic(), which
+# is system wide, so now - written is the age of the slot
+SlotState = namedtuple('SlotState', ['record', 'written', 'generation', 'mac'])
+
+class ShmSlotWriter():
+    """
+    Single writer of the latest target slot.
+    """
+    def __init__(self, path=SLOT_PATH):
+        self.path = path
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            os.ftruncate(fd, SLOT_SIZE)
+            self.map = mmap.mmap(fd, SLOT_SIZE)
+        finally:
+            os.close(fd)
+        magic, size, generation = SLOT_HEADER_STRUCT.unpack_from(self.map, 0)
+        if magic != SLOT_MAGIC or size != SLOT_PAYLOAD_STRUCT.size:
+            generation = 0
+        # Continue from an even generation so readers see the next write as new
+        self.generation = generation + (generation & 1)
+        SLOT_HEADER_STRUCT.pack_into(self.map, 0, SLOT_MAGIC, SLOT_PAYLOAD_STRUCT.size, self.generation)
+        self.writes = 0
+
+    def write(self, lat, lon, speed, heading, seq=None, sent_ms=None, fix_age_ms=None, rx_ms=None,
+              mac=b''):
+        flags = ((HAS_SEQ if seq is not None else 0) | (HAS_SENT if sent_ms is not None else 0) |
+                 (HAS_FIX_AGE if fix_age_ms is not None else 0) | (HAS_RX if rx_ms is not None else 0))
+        self.generation += 1
+        GENERATION_STRUCT.pack_into(self.map, GENERATION_OFFSET, self.generation)
+        SLOT_PAYLOAD_STRUCT.pack_into(self.map, SLOT_PAYLOAD_OFFSET, lat, lon, speed, heading,
+                                      time.monotonic_ns(), seq or 0, sent_ms or 0, rx_ms or 0,
+                                      min(0xFFFF, int(fix_age_ms or 0)), flags, mac)
+        self.generation += 1
+        GENERATION_STRUCT.pack_into(self.map, GENERATION_OFFSET, self.generation)
+        self.writes += 1
+
+    def close(self):
+        self.map.close()
+
+class ShmSlotReader():
+    """
+    Lock-free reader of the latest target slot. read() returns None until
+    the writer has created the file and published a first record.
+    """
+    def __init__(self, path=SLOT_PATH, max_retries=100):
+        self.path = path
+        self.max_retries = max_retries
+        self.map = None
+        self.retries = 0
+
+    def _open(self):
+        try:
+            fd = os.open(self.path, os.O_RDONLY)
+        except FileNotFoundError:
+            return False
+        try:
+            if os.fstat(fd).st_size < SLOT_SIZE:
+                return False
+            self.map = mmap.mmap(fd, SLOT_SIZE, prot=mmap.PROT_READ)
+        finally:
+            os.close(fd)
+        magic, size, _ = SLOT_HEADER_STRUCT.unpack_from(self.map, 0)
+        if magic != SLOT_MAGIC or size != SLOT_PAYLOAD_STRUCT.size:
+            self.map.close()
+            self.map = None
+            return False
+        return True
+
+    def generation(self):
+        if self.map is None and not self._open():
+            return 0
+        return GENERATION_STRUCT.unpack_from(self.map, GENERATION_OFFSET)[0]
+
+    def read(self):
+        if self.map is None and not self._open():
+            return None
+        for _ in range(self.max_retries):
+            before = GENERATION_STRUCT.unpack_from(self.map, GENERATION_OFFSET)[0]
+            if before & 1:
+                self.retries += 1
+                continue
+            fields = SLOT_PAYLOAD_STRUCT.unpack_from(self.map, SLOT_PAYLOAD_OFFSET)
+            if GENERATION_STRUCT.unpack_from(self.map, GENERATION_OFFSET)[0] == before:
+                break
+            self.retries += 1
+        else:
+            return None
+        if before == 0:
+            return None
+        lat, lon, speed, heading, written_ns, seq, sent_ms, rx_ms, fix_age_ms, flags, mac = fields
+        record = TargetRecord(None, lat, lon, speed, heading,
+                              seq if flags & HAS_SEQ else None,
+                              sent_ms if flags & HAS_SENT else None,
+                              fix_age_ms if flags & HAS_FIX_AGE else None,
+                              rx_ms if flags & HAS_RX else None)
+        return SlotState(record, written_ns / 1e9, before, mac.hex())
+
+    def close(self):
+        if self.map is not None:
+            self.map.close()
+            self.map = None
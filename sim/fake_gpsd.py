@@ -0,0 +1,89 @@
+"""
+Scripted stand-in for gpsd. Speaks enough of the gpsd JSON protocol for the
+gps Python client used by py_app_tx.py and py_rx.py: VERSION on connect,
+DEVICES/WATCH in reply to ?WATCH, then TPV reports from a scripted track
+(plus a SKY report every few fixes, as a real receiver sends).
+
+    python -m sim.fake_gpsd --track circle --rate 10
+"""
+import argparse
+import json
+import socket
+import threading
+import time
+from datetime import datetime, timezone
+from sim.tracks import TRACKS
+
+GPSD_PORT = 2947
+
+def tpv_report(lat, lon, speed, heading, when=None):
+    when = time.time() if when is None else when
+    stamp = datetime.fromtimestamp(when, timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3] + 'Z'
+    return {'class': 'TPV', 'device': '/dev/fake', 'mode': 3, 'time': stamp,
+            'lat': lat, 'lon': lon, 'alt': 0.0, 'speed': speed, 'track': heading,
+            'epx': 1.5, 'epy': 1.5, 'epv': 3.0, 'eps': 0.3}
+
+class FakeGpsd():
+    """
+    Serves every client its own copy of the scripted track at rate_hz, in real time.
+    """
+    def __init__(self, track, rate_hz=10, port=GPSD_PORT, sky_every=5):
+        self.track = track
+        self.rate_hz = rate_hz
+        self.port = port
+        self.sky_every = sky_every
+        self.server = None
+
+    def start(self):
+        self.server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.server.bind(('127.0.0.1', self.port))
+        self.server.listen(4)
+        threading.Thread(target=self._accept_loop, daemon=True).start()
+        return self
+
+    def stop(self):
+        if self.server is not None:
+            self.server.close()
+
+    def _accept_loop(self):
+        while True:
+            try:
+                conn, _ = self.server.accept()
+            except OSError:
+                break
+            threading.Thread(target=self._serve, args=(conn,), daemon=True).start()
+
+    def _send(self, conn, report):
+        conn.sendall((json.dumps(report) + '\r\n').encode('utf-8'))
+
+    def _serve(self, conn):
+        with conn:
+            try:
+                self._send(conn, {'class': 'VERSION', 'release': 'fake', 'rev': 'fake',
+                                  'proto_major': 3, 'proto_minor': 14})
+                conn.recv(1024)  # ?WATCH={...}
+                self._send(conn, {'class': 'DEVICES', 'devices': [{'class': 'DEVICE', 'path': '/dev/fake'}]})
+                self._send(conn, {'class': 'WATCH', 'enable': True, 'json': True})
+                start = time.monotonic()
+                period = 1.0 / self.rate_hz
+                n = 0
+                while True:
+                    n += 1
+                    target = start + n * period
+                    time.sleep(max(0.0, target - time.monotonic()))
+                    self._send(conn, tpv_report(*self.track(target - start)))
+                    if self.sky_every and n % self.sky_every == 0:
+                        self._send(conn, {'class': 'SKY', 'device': '/dev/fake', 'satellites': []})
+            except OSError:
+                pass
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Scripted gpsd stand-in")
+    parser.add_argument('--track', choices=sorted(TRACKS), default='circle')
+    parser.add_argument('--rate', type=float, default=10)
+    parser.add_argument('--port', type=int, default=GPSD_PORT)
+    args = parser.parse_args()
+    FakeGpsd(TRACKS[args.track](), rate_hz=args.rate, port=args.port).start()
+    print("fake gpsd on port", args.port)
+    threading.Event().wait()
@@ -0,0 +1,288 @@
+"""
+Kinematic stand-in for a dronekit Vehicle: the attributes and calls the
+drone scripts use, with a simple point-mass model stepped either explicitly
+(step(dt), for simulated time) or by a background thread in real time.
+"""
+import math
+import threading
+import time
+from collections import namedtuple
+from geodesy import destination, enu, haversine
+
+MAV_CMD_NAV_TAKEOFF = 22
+
+SetPositionTargetGlobalInt = namedtuple('SetPositionTargetGlobalInt', [
+    'time_boot_ms', 'target_system', 'target_component', 'coordinate_frame', 'type_mask',
+    'lat_int', 'lon_int', 'alt', 'vx', 'vy', 'vz', 'afx', 'afy', 'afz', 'yaw', 'yaw_rate'])
+
+class Location():
+    def __init__(self, lat, lon, alt):
+        self.lat = lat
+        self.lon = lon
+        self.alt = alt
+
+    def __repr__(self):
+        return f"Location(lat={self.lat}, lon={self.lon}, alt={self.alt})"
+
+class Locations():
+    def __init__(self, lat, lon, alt):
+        self.global_relative_frame = Location(lat, lon, alt)
+
+class VehicleMode():
+    def __init__(self, name):
+        self.name = name
+
+    def __eq__(self, other):
+        return getattr(other, 'name', other) == self.name
+
+    def __repr__(self):
+        return f"VehicleMode:{self.name}"
+
+class MessageFactory():
+    def set_position_target_global_int_encode(self, *args):
+        return SetPositionTargetGlobalInt(*args)
+
+class MockCommands():
+    """
+    vehicle.commands stand-in. next is the 1-based index of the mission item
+    being flown, as in dronekit; items become active on upload(). Like
+    dronekit, the mission must be downloaded before it is edited.
+    """
+    def __init__(self):
+        self.items = []
+        self.uploaded = []
+        self.next = 0
+        self.uploads = 0
+        self.downloaded = False
+
+    def download(self):
+        self.items = list(self.uploaded)
+        self.downloaded = True
+
+    def wait_ready(self, **kwargs):
+        return True
+
+    def _check_downloaded(self):
+        if not self.downloaded:
+            raise RuntimeError("mission edited before download()")
+
+    def clear(self):
+        self._check_downloaded()
+        self.items = []
+
+    def add(self, command):
+        self._check_downloaded()
+        self.items.append(command)
+
+    def upload(self, timeout=None):
+        self.uploaded = list(self.items)
+        self.uploads += 1
+
+    @property
+    def count(self):
+        return len(self.uploaded)
+
+    def __len__(self):
+        return len(self.uploaded)
+
+    def __getitem__(self, i):
+        return self.uploaded[i]
+
+class MockVehicle():
+    """
+    Point mass with velocity and acceleration limits. GUIDED targets come
+    from simple_goto() or SET_POSITION_TARGET_GLOBAL_INT (position plus
+    velocity feed-forward, tracked with a proportional position loop).
+    In AUTO the uploaded mission is flown item by item at goto_speed,
+    passing each waypoint within its acceptance radius (param2).
+    """
+    def __init__(self, lat, lon, alt=0.0, max_speed=12.0, max_accel=5.0, climb_rate=2.5,
+                 pos_gain=1.0, goto_speed=5.0):
+        self.location = Locations(lat, lon, alt)
+        self.max_speed = max_speed
+        self.max_accel = max_accel
+        self.climb_rate = climb_rate
+        self.pos_gain = pos_gain
+        self.goto_speed = goto_speed
+        self.message_factory = MessageFactory()
+        self.commands = MockCommands()
+        self.is_armable = True
+        self._armed = False
+        self._mode = VehicleMode('STABILIZE')
+        self.velocity = [0.0, 0.0, 0.0]
+        self.target = None
+        self.target_alt = alt
+        self.listeners = {}
+        self.mavlink_sent = 0
+        self.lock = threading.RLock()
+        self.thread = None
+        self.running = False
+
+    #####dronekit attribute API#####
+
+    @property
+    def armed(self):
+        return self._armed
+
+    @armed.setter
+    def armed(self, value):
+        self._armed = value
+        self.notify_attribute_listeners('armed', value)
+
+    @property
+    def mode(self):
+        return self._mode
+
+    @mode.setter
+    def mode(self, value):
+        self._mode = VehicleMode(getattr(value, 'name', value))
+        self.notify_attribute_listeners('mode', self._mode)
+
+    @property
+    def groundspeed(self):
+        return math.hypot(self.velocity[0], self.velocity[1])
+
+    @property
+    def heading(self):
+        return int(math.degrees(math.atan2(self.velocity[1], self.velocity[0])) % 360)
+
+    def add_attribute_listener(self, name, callback):
+        self.listeners.setdefault(name, []).append(callback)
+
+    def remove_attribute_listener(self, name, callback):
+        if callback in self.listeners.get(name, []):
+            self.listeners[name].remove(callback)
+
+    def on_attribute(self, name):
+        def decorator(callback):
+            self.add_attribute_listener(name, callback)
+            return callback
+        return decorator
+
+    def notify_attribute_listeners(self, name, value):
+        for callback in list(self.listeners.get(name, [])) + list(self.listeners.get('*', [])):
+            callback(self, name, value)
+
+    def wait_ready(self, *types, **kwargs):
+        return True
+
+    def close(self):
+        self.running = False
+        if self.thread is not None:
+            self.thread.join()
+
+    #####commands#####
+
+    def arm(self, wait=True, timeout=None):
+        self.armed = True
+
+    def simple_takeoff(self, alt):
+        if self._armed and self._mode.name == 'GUIDED':
+            self.target_alt = alt
+
+    def simple_goto(self, location, groundspeed=None):
+        with self.lock:
+            self.target = ('goto', location.lat, location.lon, groundspeed or self.goto_speed)
+            if location.alt is not None:
+                self.target_alt = location.alt
+
+    def send_mavlink(self, msg):
+        with self.lock:
+            self.mavlink_sent += 1
+            if isinstance(msg, SetPositionTargetGlobalInt):
+                self.target = ('posvel', msg.lat_int / 1e7, msg.lon_int / 1e7, msg.vx, msg.vy)
+                self.target_alt = msg.alt
+
+    #####physics#####
+
+    def _mission_target(self, here):
+        cmds = self.commands
+        while cmds.count:
+            cmds.next = max(1, min(cmds.next, cmds.count))
+            item = cmds[cmds.next - 1]
+            if item.command == MAV_CMD_NAV_TAKEOFF:
+                self.target_alt = max(self.target_alt, item.z)
+                if here.alt < item.z * 0.95 or cmds.next == cmds.count:
+                    return None
+            else:
+                self.target_alt = item.z
+                last = cmds.next == cmds.count
+                if last or haversine(here.lat, here.lon, item.x, item.y) > max(item.param2, 0.5):
+                    # Pass-through waypoints are flown at full speed, the last one is approached
+                    return ('goto' if last else 'pass', item.x, item.y, self.goto_speed)
+            cmds.next += 1
+        return None
+
+    def _desired_velocity(self, here):
+        if self._mode.name == 'AUTO' and here.alt >= 0.5:
+            target = self._mission_target(here)
+            if target is None:
+                return 0.0, 0.0
+            east, north, _ = enu(target[1], target[2], here.lat, here.lon)
+            dist = math.hypot(east, north)
+            if dist < 0.05:
+                return 0.0, 0.0
+            speed = target[3] if target[0] == 'pass' else min(target[3], self.pos_gain * dist)
+            return speed * north / dist, speed * east / dist
+        if self.target is None or self._mode.name != 'GUIDED' or here.alt < 0.5:
+            return 0.0, 0.0
+        kind, lat, lon = self.target[:3]
+        east, north, _ = enu(lat, lon, here.lat, here.lon)
+        if kind == 'goto':
+            dist = math.hypot(east, north)
+            if dist < 0.05:
+                return 0.0, 0.0
+            speed = min(self.target[3], self.pos_gain * dist)
+            return speed * north / dist, speed * east / dist
+        v_north, v_east = self.target[3], self.target[4]
+        return v_north + self.pos_gain * north, v_east + self.pos_gain * east
+
+    def step(self, dt):
+        with self.lock:
+            here = self.location.global_relative_frame
+            v_north, v_east = self._desired_velocity(here)
+            speed = math.hypot(v_north, v_east)
+            if speed > self.max_speed:
+                v_north *= self.max_speed / speed
+                v_east *= self.max_speed / speed
+            dv_n = v_north - self.velocity[0]
+            dv_e = v_east - self.velocity[1]
+            dv = math.hypot(dv_n, dv_e)
+            if dv > self.max_accel * dt:
+                dv_n *= self.max_accel * dt / dv
+                dv_e *= self.max_accel * dt / dv
+            self.velocity[0] += dv_n
+            self.velocity[1] += dv_e
+            moved = math.hypot(self.velocity[0], self.velocity[1]) * dt
+            if moved > 0:
+                here.lat, here.lon = destination(here.lat, here.lon, self.heading_exact(), moved)
+            if self._armed:
+                climb = max(-self.climb_rate * dt, min(self.climb_rate * dt, self.target_alt - here.alt))
+                here.alt += climb
+                self.velocity[2] = -climb / dt
+        self.notify_attribute_listeners('location.global_relative_frame', here)
+        self.notify_attribute_listeners('velocity', self.velocity)
+
+    def heading_exact(self):
+        return math.degrees(math.atan2(self.velocity[1], self.velocity[0])) % 360.0
+
+    def distance_to(self, lat, lon):
+        here = self.location.global_relative_frame
+        return haversine(here.lat, here.lon, lat, lon)
+
+    def start_realtime(self, rate_hz=50):
+        """
+        Steps the model from a background thread in real time.
+        """
+        def run():
+            period = 1.0 / rate_hz
+            last = time.monotonic()
+            while self.running:
+                time.sleep(period)
+                now = time.monotonic()
+                self.step(now - last)
+                last = now
+        self.running = True
+        self.thread = threading.Thread(target=run, daemon=True)
+        self.thread.start()
+        return self
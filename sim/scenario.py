@@ -0,0 +1,148 @@
+"""
+Offline leader -> follower run in simulated time.
+
+The leader follows a scripted track and beacons through the real codec
+(HleWsmpEncoder / hle_to_wsmp_hle / decode_wsmp_hle / decode_beacon) over
+a lossy, delayed link. The follower runs the real TargetEstimator and
+FollowController against a MockVehicle. Nothing sleeps, so a run takes a
+fraction of its simulated duration and is repeatable for a given seed.
+
+    python -m sim.scenario --duration 300 --loss 0.2 --delay 0.15
+"""
+import argparse
+import json
+import random
+import time
+from beacon import decode_beacon
+from follow_controller import FollowController, LeaderState
+from geodesy import destination, haversine
+from target_estimator import TargetEstimator
+from adaptive_rate import AdaptiveRate
+from wsmp_codec import HleWsmpEncoder, decode_wsmp_hle, hle_to_wsmp_hle
+from sim.mock_vehicle import MockVehicle, VehicleMode
+from sim.tracks import TRACKS
+from sim.wsmp_broker import LossyLink
+
+def percentile(values, q):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q / 100.0 * len(ordered)))]
+
+def run_scenario(duration=120.0, track='figure_eight', beacon_rate=10.0, loss=0.1, delay=0.1,
+                 jitter=0.02, standoff=5.0, control_rate=10.0, physics_rate=50.0,
+                 use_estimator=True, altitude=15.0, seed=1, adaptive=False, min_rate=2.0,
+                 channel_load=0.0):
+    rng = random.Random(seed)
+    leader = TRACKS[track]()
+    encoder = HleWsmpEncoder()
+    link = LossyLink(loss, delay, jitter, rng=rng)
+    estimator = TargetEstimator()
+    # With adaptive, beacon_rate is the maximum rate and beacons follow the leader's dynamics
+    rate = None
+    if adaptive:
+        rate = AdaptiveRate(min_hz=min_rate, max_hz=beacon_rate)
+        rate.cbr = channel_load
+
+    lat0, lon0, _, heading0 = leader(0.0)
+    start_lat, start_lon = destination(lat0, lon0, heading0 + 180.0, standoff)
+    vehicle = MockVehicle(start_lat, start_lon, alt=altitude)
+    vehicle.mode = VehicleMode('GUIDED')
+    vehicle.arm()
+    controller = FollowController(vehicle, altitude, standoff_m=standoff, rate_hz=control_rate)
+
+    dt = 1.0 / physics_rate
+    beacon_period = 1.0 / beacon_rate
+    control_period = 1.0 / control_rate
+    next_beacon = 0.0
+    next_control = 0.0
+    seq = 0
+    received = 0
+    latest = None
+    errors = []
+
+    wall_start = time.perf_counter()
+    steps = int(duration * physics_rate)
+    for i in range(steps):
+        t = i * dt
+        if t >= next_beacon:
+            next_beacon += beacon_period
+            lat, lon, speed, heading = leader(t)
+            if rate is not None and not rate.due(lat, lon, speed, heading, now=t):
+                continue
+            seq += 1
+            frame = encoder.encode_beacon(seq, int(t * 1000), lat, lon, speed, heading)
+            link.push(t, hle_to_wsmp_hle(frame))
+
+        for frame in link.pop_ready(t):
+            wsmp = decode_wsmp_hle(frame)
+            beacon = decode_beacon(wsmp.data)
+            received += 1
+            if use_estimator:
+                estimator.update(beacon.latitude, beacon.longitude, beacon.speed, beacon.heading,
+                                 beacon.timestamp / 1000.0)
+            latest = LeaderState(beacon.latitude, beacon.longitude, beacon.speed, beacon.heading, t)
+
+        if t >= next_control:
+            next_control += control_period
+            state = latest
+            if use_estimator and latest is not None:
+                estimate = estimator.predict(t)
+                state = None if estimate is None else LeaderState(
+                    estimate.lat, estimate.lon, estimate.speed, estimate.heading, latest.received)
+            controller.step(state, now=t)
+
+        vehicle.step(dt)
+
+        # Follow error against the ideal point behind the true leader
+        lat, lon, _, heading = leader(t + dt)
+        ideal_lat, ideal_lon = destination(lat, lon, heading + 180.0, standoff)
+        here = vehicle.location.global_relative_frame
+        if t >= 5.0:
+            errors.append(haversine(here.lat, here.lon, ideal_lat, ideal_lon))
+
+    wall = time.perf_counter() - wall_start
+    return {
+        'track': track,
+        'sim_time_s': duration,
+        'wall_time_s': wall,
+        'speedup': duration / wall if wall > 0 else None,
+        'beacons_sent': seq,
+        'beacon_rate_hz': seq / duration,
+        'beacons_received': received,
+        'loss': loss,
+        'delay_s': delay,
+        'use_estimator': use_estimator,
+        'estimator_outliers': estimator.outliers,
+        'commands': controller.commands,
+        'follow_error_mean_m': sum(errors) / len(errors) if errors else None,
+        'follow_error_p95_m': percentile(errors, 95),
+        'follow_error_max_m': max(errors) if errors else None,
+    }
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Offline leader/follower simulation")
+    parser.add_argument('--duration', type=float, default=120.0, help="simulated seconds")
+    parser.add_argument('--track', choices=sorted(TRACKS), default='figure_eight')
+    parser.add_argument('--beacon-rate', type=float, default=10.0)
+    parser.add_argument('--loss', type=float, default=0.1)
+    parser.add_argument('--delay', type=float, default=0.1)
+    parser.add_argument('--jitter', type=float, default=0.02)
+    parser.add_argument('--standoff', type=float, default=5.0)
+    parser.add_argument('--control-rate', type=float, default=10.0)
+    parser.add_argument('--no-estimator', action='store_true', help="follow the raw last beacon")
+    parser.add_argument('--adaptive', action='store_true',
+                        help="adaptive beacon rate, --beacon-rate is the maximum")
+    parser.add_argument('--min-rate', type=float, default=2.0, help="adaptive minimum beacon rate")
+    parser.add_argument('--channel-load', type=float, default=0.0, help="channel busy ratio 0..1")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--json', help="also write the results to this file")
+    args = parser.parse_args()
+    results = run_scenario(args.duration, args.track, args.beacon_rate, args.loss, args.delay,
+                           args.jitter, args.standoff, args.control_rate,
+                           use_estimator=not args.no_estimator, seed=args.seed, adaptive=args.adaptive,
+                           min_rate=args.min_rate, channel_load=args.channel_load)
+    print(json.dumps(results, indent=2))
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
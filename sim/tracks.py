@@ -0,0 +1,43 @@
+import math
+from geodesy import destination, bearing, haversine
+
+# Scripted leader trajectories. Each factory returns a function of time in
+# seconds giving (lat, lon, speed m/s, heading deg).
+
+def straight(lat0=48.0, lon0=11.0, speed=5.0, heading=90.0):
+    def at(t):
+        lat, lon = destination(lat0, lon0, heading, speed * t)
+        return lat, lon, speed, heading
+    return at
+
+def circle(lat0=48.0, lon0=11.0, radius=50.0, speed=5.0):
+    """
+    Counter-clockwise circle of radius metres around (lat0, lon0).
+    """
+    omega = speed / radius
+    def at(t):
+        angle = omega * t
+        lat, lon = destination(lat0, lon0, math.degrees(angle), radius)
+        heading = (math.degrees(angle) - 90.0) % 360.0
+        return lat, lon, speed, heading
+    return at
+
+def figure_eight(lat0=48.0, lon0=11.0, radius=40.0, speed=5.0):
+    """
+    Lemniscate through (lat0, lon0); speed and heading follow the path
+    tangent, speed is the average along the path.
+    """
+    period = 2 * math.pi * radius * 1.2 / speed
+    def point(t):
+        a = 2 * math.pi * t / period
+        east = radius * math.sin(a)
+        north = radius * math.sin(a) * math.cos(a)
+        lat, lon = destination(lat0, lon0, 90.0, east)
+        return destination(lat, lon, 0.0, north)
+    def at(t):
+        lat, lon = point(t)
+        lat2, lon2 = point(t + 0.05)
+        return lat, lon, haversine(lat, lon, lat2, lon2) / 0.05, bearing(lat, lon, lat2, lon2)
+    return at
+
+TRACKS = {'straight': straight, 'circle': circle, 'figure_eight': figure_eight}
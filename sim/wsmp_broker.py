@@ -0,0 +1,117 @@
+"""
+Stand-in for the OBU's WME/WSMP stack. Transmitter frames (hle_wsmp) are
+acked, passed through a lossy link model and published back to subscribers
+as received frames (wsmp_hle), so py_app_tx.py and py_rx.py can run against
+each other on one machine.
+
+    python -m sim.wsmp_broker --loss 0.1 --delay 0.05
+"""
+import argparse
+import heapq
+import random
+import threading
+import time
+import zmq
+from wsmp_codec import hle_to_wsmp_hle
+
+WSMP_TX_ENDPOINT = "tcp://127.0.0.1:5555"
+WSMP_RX_ENDPOINT = "tcp://127.0.0.1:4444"
+WME_ENDPOINT = "tcp://127.0.0.1:9999"
+class LossyLink():
+    """
+    Loss, duplication, delay and jitter model driven by an explicit clock,
+    so the same model serves real-time and simulated runs.
+    """
+    def __init__(self, loss=0.0, delay=0.0, jitter=0.0, duplicate=0.0, rng=None):
+        self.loss = loss
+        self.delay = delay
+        self.jitter = jitter
+        self.duplicate = duplicate
+        self.rng = rng or random.Random()
+        self.heap = []
+        self.n = 0
+        self.sent = 0
+        self.lost = 0
+
+    def push(self, now, item):
+        self.sent += 1
+        if self.rng.random() < self.loss:
+            self.lost += 1
+            return False
+        copies = 2 if self.rng.random() < self.duplicate else 1
+        for _ in range(copies):
+            due = now + self.delay + self.rng.uniform(0.0, self.jitter)
+            self.n += 1
+            heapq.heappush(self.heap, (due, self.n, item))
+        return True
+
+    def next_due(self):
+        return self.heap[0][0] if self.heap else None
+
+    def pop_ready(self, now):
+        ready = []
+        while self.heap and self.heap[0][0] <= now:
+            ready.append(heapq.heappop(self.heap)[2])
+        return ready
+
+class WsmpBroker():
+    """
+    ROUTER on the WSMP TX endpoint (serves both REQ and DEALER senders), REP
+    for WME subscriptions and PUB on the RX endpoint. Runs on its own thread.
+    """
+    def __init__(self, link=None, channel_load=0, psid_topic=b"32"):
+        self.link = link or LossyLink()
+        self.channel_load = channel_load
+        self.psid_topic = psid_topic
+        self.running = False
+        self.thread = None
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.running = False
+        if self.thread is not None:
+            self.thread.join()
+
+    def _run(self):
+        context = zmq.Context()
+        tx = context.socket(zmq.ROUTER)
+        tx.bind(WSMP_TX_ENDPOINT)
+        wme = context.socket(zmq.REP)
+        wme.bind(WME_ENDPOINT)
+        rx = context.socket(zmq.PUB)
+        rx.bind(WSMP_RX_ENDPOINT)
+        poller = zmq.Poller()
+        poller.register(tx, zmq.POLLIN)
+        poller.register(wme, zmq.POLLIN)
+        while self.running:
+            due = self.link.next_due()
+            timeout = 100 if due is None else max(0, min(100, int((due - time.monotonic()) * 1000)))
+            events = dict(poller.poll(timeout))
+            if tx in events:
+                identity, delimiter, frame = tx.recv_multipart()
+                tx.send_multipart([identity, delimiter, b'ok'])
+                self.link.push(time.monotonic(), hle_to_wsmp_hle(frame, self.channel_load))
+            if wme in events:
+                wme.recv()
+                wme.send(b'ok')
+            for frame in self.link.pop_ready(time.monotonic()):
+                rx.send_multipart([self.psid_topic, frame])
+        context.destroy(linger=0)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="WME/WSMP stack stand-in")
+    parser.add_argument('--loss', type=float, default=0.0, help="frame loss probability")
+    parser.add_argument('--delay', type=float, default=0.0, help="link delay in seconds")
+    parser.add_argument('--jitter', type=float, default=0.0, help="extra uniform delay in seconds")
+    parser.add_argument('--duplicate', type=float, default=0.0, help="frame duplication probability")
+    parser.add_argument('--channel-load', type=int, default=0, help="reported channel busy ratio in percent")
+    args = parser.parse_args()
+    link = LossyLink(args.loss, args.delay, args.jitter, args.duplicate)
+    WsmpBroker(link, args.channel_load).start()
+    print("WSMP broker: tx", WSMP_TX_ENDPOINT, "rx", WSMP_RX_ENDPOINT, "wme", WME_ENDPOINT)
+    threading.Event().wait()
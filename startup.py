@@ -0,0 +1,144 @@
+import json
+import os
+import threading
+import time
+
+# Attributes arming and guided flight need up front. wait_ready=True also
+# waits for the full parameter download, which dronekit finishes in the
+# background anyway and which takes most of the connect time over telemetry radios.
+READY_ATTRIBUTES = ('gps_0', 'armed', 'mode', 'attitude')
+
+def process_age():
+    """
+    Seconds since this process was launched (10 ms resolution), so startup
+    times include the interpreter and imports. 0 where /proc is not available.
+    """
+    try:
+        with open('/proc/self/stat') as f:
+            # Fields after the command name, starttime is field 22 of the whole line
+            fields = f.read().rsplit(')', 1)[1].split()
+        started = int(fields[19]) / os.sysconf('SC_CLK_TCK')
+        return max(0.0, time.clock_gettime(time.CLOCK_BOOTTIME) - started)
+    except (OSError, ValueError, IndexError, AttributeError):
+        return 0.0
+
+class StartupTask():
+    """
+    One initialization step running on its own daemon thread.
+    """
+    def __init__(self, name, func, args, started):
+        self.name = name
+        self.func = func
+        self.args = args
+        self.started = started
+        self.finished = None
+        self.result = None
+        self.error = None
+        self.done = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        try:
+            self.result = self.func(*self.args)
+        except Exception as e:
+            self.error = e
+        self.finished = time.monotonic()
+        self.done.set()
+
+    def status(self):
+        if not self.done.is_set():
+            return 'running'
+        return 'ok' if self.error is None else 'failed'
+
+class Startup():
+    """
+    Runs the independent startup steps of a script concurrently and times them.
+
+    start() launches a step on a daemon thread right away; wait() blocks
+    for it only when its result is needed, for at most timeout seconds.
+    A step that times out keeps running in the background and is reported
+    as still running. mark() records milestones such as the first beacon,
+    all times are seconds since the process was launched.
+    """
+    def __init__(self, name, json_file=None):
+        self.name = name
+        self.json_file = json_file
+        self.t0 = time.monotonic() - process_age()
+        self.tasks = {}
+        self.marks = {}
+
+    def start(self, name, func, *args):
+        task = StartupTask(name, func, args, time.monotonic())
+        self.tasks[name] = task
+        task.thread.start()
+        return task
+
+    def wait(self, name, timeout=None, required=False):
+        """
+        Result of the step, None if it failed or is still running after
+        timeout. With required, that raises instead.
+        """
+        task = self.tasks[name]
+        if not task.done.wait(timeout):
+            if required:
+                raise TimeoutError(f"{name} not ready after {timeout} s")
+            print(f"[{self.name}] {name} not ready after {timeout} s, continuing without it")
+            return None
+        if task.error is not None:
+            if required:
+                raise task.error
+            print(f"[{self.name}] {name} failed: {task.error}")
+            return None
+        return task.result
+
+    def mark(self, name):
+        """
+        Records the first time a milestone is reached, returns True that time.
+        """
+        if name in self.marks:
+            return False
+        self.marks[name] = time.monotonic() - self.t0
+        return True
+
+    def snapshot(self):
+        tasks = {}
+        for name, task in self.tasks.items():
+            tasks[name] = {
+                'status': task.status(),
+                'started_s': task.started - self.t0,
+                'finished_s': None if task.finished is None else task.finished - self.t0,
+                'duration_s': None if task.finished is None else task.finished - task.started,
+                'error': None if task.error is None else str(task.error),
+            }
+        return {'name': self.name, 'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                'tasks': tasks, 'marks': dict(self.marks)}
+
+    def write_json(self, path=None):
+        path = path or self.json_file
+        if path is None:
+            return
+        tmp = path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(self.snapshot(), f, indent=2)
+        os.replace(tmp, path)
+
+    def report(self):
+        snapshot = self.snapshot()
+        for name, task in snapshot['tasks'].items():
+            if task['finished_s'] is None:
+                print(f"[{self.name}] {name}: still running")
+            else:
+                print(f"[{self.name}] {name}: {task['status']} in {task['duration_s']:.2f} s, "
+                      f"done at {task['finished_s']:.2f} s")
+        for name, t in snapshot['marks'].items():
+            print(f"[{self.name}] {name} at {t:.2f} s")
+        self.write_json()
+
+def connect_vehicle(connect, connection_string, baud=57600, attributes=READY_ATTRIBUTES, timeout=60):
+    """
+    dronekit connect() that only waits for the given attributes. connect is
+    dronekit.connect, passed in so this module does not need dronekit.
+    """
+    vehicle = connect(connection_string, baud=baud, wait_ready=False, heartbeat_timeout=timeout)
+    vehicle.wait_ready(*attributes, timeout=timeout)
+    return vehicle
@@ -0,0 +1,152 @@
+import math
+from collections import namedtuple
+import numpy as np
+from geodesy import enu, enu_to_geodetic, EARTH_RADIUS_M
+
+# Chi-square 99.9% quantile for 4 degrees of freedom, the innovation gate
+GATE_CHI2_4DOF = 18.47
+
+# Sender to local clock offsets more than this above the estimate mean the
+# sender clock stepped back (or a restart), the estimate starts over
+CLOCK_STEP_S = 5.0
+
+Estimate = namedtuple('Estimate', ['lat', 'lon', 'speed', 'heading', 'cov', 't'])
+
+class ClockOffset():
+    """
+    Maps sender timestamps onto a local clock without trusting the local
+    wall clock, which on a Pi without RTC or network can be far from GPS time.
+
+    Each beacon gives local receive time - sender time, which is the clock
+    offset plus that beacon's transport delay. The smallest value seen is the
+    offset plus the fastest delay, so local(t) puts every beacon at the time
+    it would have arrived over the fastest path. The estimate creeps up by
+    drift (s/s) so a clock running slow is followed, and starts over after
+    a sender clock step back of more than step_s.
+    """
+    def __init__(self, drift=1e-4, step_s=CLOCK_STEP_S):
+        self.drift = drift
+        self.step_s = step_s
+        self.offset = None
+        self.last = None
+        self.steps = 0
+
+    def observe(self, sent_s, received):
+        sample = received - sent_s
+        if self.offset is None:
+            self.offset = sample
+        else:
+            offset = self.offset + self.drift * max(0.0, received - self.last)
+            if sample - offset > self.step_s:
+                self.steps += 1
+                offset = sample
+            self.offset = min(offset, sample)
+        self.last = received
+        return self.offset
+
+    def local(self, sent_s):
+        return sent_s + self.offset
+
+class TargetEstimator():
+    """
+    Constant-velocity Kalman filter over received leader beacons.
+
+    The state is [east, north, v_east, v_north] in metres and m/s in a
+    local tangent plane anchored at the first beacon. Each beacon measures
+    the full state: position from lat/lon, velocity from speed and heading.
+    Process noise is white acceleration of accel_sigma m/s^2.
+
+    update() takes beacon time t in seconds on the local clock (the sender
+    timestamp mapped through ClockOffset when the beacon carries one).
+    Beacons older than the filter time are ignored and innovations beyond
+    the chi-square gate are rejected as outliers; after max_misses
+    consecutive rejections the filter restarts on the next beacon.
+    predict(t) extrapolates to any query time up to max_horizon seconds past
+    the last accepted beacon.
+    """
+    def __init__(self, pos_sigma=3.0, vel_sigma=0.5, accel_sigma=1.0, gate=GATE_CHI2_4DOF,
+                 max_misses=5, max_horizon=3.0):
+        self.R = np.diag([pos_sigma ** 2, pos_sigma ** 2, vel_sigma ** 2, vel_sigma ** 2])
+        self.accel_var = accel_sigma ** 2
+        self.gate = gate
+        self.max_misses = max_misses
+        self.max_horizon = max_horizon
+        self.outliers = 0
+        self.stale = 0
+        self.reset()
+
+    def reset(self):
+        self.x = None
+        self.P = None
+        self.t = None
+        self.anchor = None
+        self.misses = 0
+
+    def _measure(self, lat, lon, speed, heading):
+        e, n, _ = enu(lat, lon, self.anchor[0], self.anchor[1])
+        h = math.radians(heading)
+        return np.array([e, n, speed * math.sin(h), speed * math.cos(h)])
+
+    def _transition(self, dt):
+        F = np.eye(4)
+        F[0, 2] = F[1, 3] = dt
+        q = self.accel_var
+        dt2, dt3, dt4 = dt * dt, dt ** 3, dt ** 4
+        Q = np.zeros((4, 4))
+        Q[0, 0] = Q[1, 1] = dt4 / 4 * q
+        Q[0, 2] = Q[2, 0] = Q[1, 3] = Q[3, 1] = dt3 / 2 * q
+        Q[2, 2] = Q[3, 3] = dt2 * q
+        return F, Q
+
+    def _propagate(self, t):
+        dt = t - self.t
+        if dt <= 0:
+            return self.x, self.P
+        F, Q = self._transition(dt)
+        return F @ self.x, F @ self.P @ F.T + Q
+
+    def update(self, lat, lon, speed, heading, t):
+        """
+        Returns True if the beacon was accepted.
+        """
+        if self.x is None:
+            self.anchor = (lat, lon)
+            self.x = self._measure(lat, lon, speed, heading)
+            self.P = self.R.copy()
+            self.t = t
+            return True
+        if t < self.t:
+            self.stale += 1
+            return False
+        z = self._measure(lat, lon, speed, heading)
+        x, P = self._propagate(t)
+        y = z - x
+        S = P + self.R
+        S_inv = np.linalg.inv(S)
+        if float(y @ S_inv @ y) > self.gate:
+            self.outliers += 1
+            self.misses += 1
+            if self.misses >= self.max_misses:
+                # Persistent disagreement: the track was lost, start over
+                self.reset()
+            return False
+        K = P @ S_inv
+        self.x = x + K @ y
+        self.P = (np.eye(4) - K) @ P
+        self.t = t
+        self.misses = 0
+        return True
+
+    def predict(self, t):
+        """
+        Leader estimate at time t, or None if there is no track or t is too
+        far past the last accepted beacon.
+        """
+        if self.x is None or t - self.t > self.max_horizon:
+            return None
+        x, P = self._propagate(t)
+        e, n, ve, vn = x
+        lat, lon, _ = enu_to_geodetic(e, n, -(e * e + n * n) / (2 * EARTH_RADIUS_M),
+                                      self.anchor[0], self.anchor[1])
+        heading = math.degrees(math.atan2(ve, vn)) % 360.0
+        return Estimate(lat, lon, math.hypot(ve, vn), heading, P, max(t, self.t))
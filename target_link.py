@@ -0,0 +1,235 @@
+import socket
+import threading
+import time
+from collections import deque, namedtuple
+
+# TCP port the drone listens on for target updates from the receiver OBU
+TARGET_LINK_PORT = 7070
+
+# A link with data unacked, or idle and unanswered, for this long is dropped
+# and reopened; without it a half-open link blocks until TCP gives up (minutes)
+LINK_TIMEOUT_S = 1.5
+
+CSV_HEADER = ['Timestamp', 'Latitude', 'Longitude', 'Speed', 'Heading Angle']
+
+# Target records add the beacon sequence number, send time (ms since the
+# epoch) and GPS fix age at send, all empty for legacy text beacons, and the
+# GPS-disciplined time the receiver OBU got the beacon
+TARGET_HEADER = CSV_HEADER + ['Seq', 'Time ms', 'Fix age ms', 'Rx ms']
+
+TargetRecord = namedtuple('TargetRecord', ['timestamp', 'lat', 'lon', 'speed', 'heading', 'seq', 'sent_ms',
+                                           'fix_age_ms', 'rx_ms'])
+
+def format_record(fields):
+    return (','.join('' if f is None else str(f) for f in fields) + '\n').encode('utf-8')
+
+def _optional_int(fields, i):
+    if len(fields) > i and fields[i]:
+        return int(fields[i])
+    return None
+
+def parse_record(line):
+    fields = line.decode('utf-8', errors='ignore').strip().split(',')
+    if len(fields) < 5:
+        return None
+    try:
+        return TargetRecord(fields[0], float(fields[1]), float(fields[2]),
+                            float(fields[3]), float(fields[4]),
+                            _optional_int(fields, 5), _optional_int(fields, 6),
+                            _optional_int(fields, 7), _optional_int(fields, 8))
+    except ValueError:
+        return None
+
+class TargetLinkSender():
+    """
+    Keeps a single TCP connection open to the drone and pushes every new
+    target record as one CSV line. A background thread owns the socket and
+    reconnects on failure, so send() never blocks the caller on the network.
+    Records that pile up while the link is down are dropped oldest first.
+    A connection that stops acking (Wi-Fi gone without a reset) is closed
+    after link_timeout seconds by the send timeout, TCP_USER_TIMEOUT and
+    keepalive probes, and reopened.
+    """
+    def __init__(self, host, port=TARGET_LINK_PORT, reconnect_interval=1.0, max_pending=100,
+                 link_timeout=LINK_TIMEOUT_S):
+        self.host = host
+        self.port = port
+        self.link_timeout = link_timeout
+        self.reconnect_interval = reconnect_interval
+        self.pending = deque(maxlen=max_pending)
+        self.cond = threading.Condition()
+        self.sock = None
+        self.connected = False
+        self.sent = 0
+        self.reconnects = 0
+        self.running = False
+        self.thread = None
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        with self.cond:
+            self.running = False
+            self.cond.notify()
+        if self.thread is not None:
+            self.thread.join()
+        self._close()
+
+    def send(self, fields):
+        with self.cond:
+            self.pending.append(format_record(fields))
+            self.cond.notify()
+
+    def _connect(self):
+        try:
+            sock = socket.create_connection((self.host, self.port), timeout=2.0)
+        except OSError:
+            return False
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._set_timeouts(sock)
+        self.sock = sock
+        self.connected = True
+        self.reconnects += 1
+        print("target link connected to", self.host, self.port)
+        return True
+
+    def _set_timeouts(self, sock):
+        sock.settimeout(self.link_timeout)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+        # Linux only options, elsewhere the send timeout alone applies
+        interval = max(1, int(self.link_timeout / 2))
+        for name, value in (('TCP_USER_TIMEOUT', int(self.link_timeout * 1000)),
+                            ('TCP_KEEPIDLE', interval), ('TCP_KEEPINTVL', interval), ('TCP_KEEPCNT', 2)):
+            option = getattr(socket, name, None)
+            if option is not None:
+                try:
+                    sock.setsockopt(socket.IPPROTO_TCP, option, value)
+                except OSError:
+                    pass
+
+    def _close(self):
+        if self.sock is not None:
+            try:
+                self.sock.close()
+            except OSError:
+                pass
+        self.sock = None
+        self.connected = False
+
+    def _run(self):
+        while self.running:
+            if self.sock is None and not self._connect():
+                time.sleep(self.reconnect_interval)
+                continue
+            with self.cond:
+                while self.running and not self.pending:
+                    self.cond.wait()
+                if not self.running:
+                    break
+                # Coalesce everything queued so far into one write
+                data = b''.join(self.pending)
+                count = len(self.pending)
+                self.pending.clear()
+            try:
+                self.sock.sendall(data)
+                self.sent += count
+            except OSError:
+                print("target link lost, reconnecting")
+                self._close()
+
+class TargetLinkReceiver():
+    """
+    TCP server on the drone side of the target link. Every received line is
+    parsed into a TargetRecord, kept as the latest target and, if csv_file is
+    given, appended to the local CSV so file based consumers keep working.
+    """
+    def __init__(self, port=TARGET_LINK_PORT, bind_addr='0.0.0.0', csv_file=None):
+        self.port = port
+        self.bind_addr = bind_addr
+        self.csv_file = csv_file
+        self.csv_lock = threading.Lock()
+        self.csv = None
+        self.cond = threading.Condition()
+        self.latest = None
+        self.latest_time = None
+        self.count = 0
+        self.server = None
+        self.thread = None
+
+    def start(self):
+        if self.csv_file is not None:
+            self.csv = open(self.csv_file, 'ab')
+            if self.csv.tell() == 0:
+                self.csv.write(format_record(TARGET_HEADER))
+                self.csv.flush()
+        self.server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.server.bind((self.bind_addr, self.port))
+        self.server.listen(2)
+        self.thread = threading.Thread(target=self._accept_loop, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        if self.server is not None:
+            self.server.close()
+        if self.csv is not None:
+            with self.csv_lock:
+                self.csv.close()
+                self.csv = None
+
+    def _accept_loop(self):
+        while True:
+            try:
+                conn, addr = self.server.accept()
+            except OSError:
+                break
+            print("target link from", addr)
+            threading.Thread(target=self._serve, args=(conn,), daemon=True).start()
+
+    def _serve(self, conn):
+        conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        with conn, conn.makefile('rb') as stream:
+            try:
+                for line in stream:
+                    self._handle_line(line)
+            except OSError:
+                pass
+
+    def _handle_line(self, line):
+        if not line.endswith(b'\n'):
+            # Cut off by a dropped connection, the numbers may be truncated
+            return
+        record = parse_record(line)
+        if record is None:
+            return
+        if self.csv is not None:
+            with self.csv_lock:
+                if self.csv is not None:
+                    self.csv.write(line)
+                    self.csv.flush()
+        with self.cond:
+            self.latest = record
+            self.latest_time = time.monotonic()
+            self.count += 1
+            self.cond.notify_all()
+
+    def wait_for_update(self, last_count, timeout=None):
+        """
+        Blocks until a record newer than last_count arrives or the timeout
+        expires. Returns (record, count); record is None on timeout.
+        """
+        with self.cond:
+            if not self.cond.wait_for(lambda: self.count != last_count, timeout):
+                return None, last_count
+            return self.latest, self.count
+
+    def latest_lat_lon(self):
+        record = self.latest
+        if record is None:
+            return None, None
+        return record.lat, record.lon
@@ -0,0 +1,111 @@
+import threading
+import time
+from geodesy import haversine
+
+# Attributes whose changes can make a waited-for condition true. is_armable
+# has no listener of its own, it follows from these.
+WATCHED_ATTRIBUTES = ('location.global_relative_frame', 'armed', 'mode', 'velocity',
+                      'gps_0', 'ekf_ok', 'system_status')
+
+class Telemetry():
+    """
+    Event-driven view of a dronekit vehicle.
+
+    Attribute listeners wake up every wait_* call as soon as the vehicle
+    reports a change, so state transitions happen on the telemetry update
+    that satisfies them instead of on the next one-second poll. recheck is
+    only a safety net for conditions whose inputs have no listener.
+    Status is printed at most every log_interval seconds.
+    """
+    def __init__(self, vehicle, log_interval=2.0, recheck=0.5):
+        self.vehicle = vehicle
+        self.log_interval = log_interval
+        self.recheck = recheck
+        self.cond = threading.Condition()
+        self.updates = 0
+        self.next_log = 0.0
+        self.status = None
+        self.attributes = []
+
+    def start(self):
+        for name in WATCHED_ATTRIBUTES:
+            try:
+                self.vehicle.add_attribute_listener(name, self._on_attribute)
+            except (AttributeError, KeyError):
+                continue
+            self.attributes.append(name)
+        return self
+
+    def stop(self):
+        for name in self.attributes:
+            self.vehicle.remove_attribute_listener(name, self._on_attribute)
+        self.attributes = []
+
+    def _on_attribute(self, vehicle, name, value):
+        # Runs on the MAVLink thread, keep it short
+        with self.cond:
+            self.updates += 1
+            self.cond.notify_all()
+        # wait_for() clears status on the main thread, read it once
+        status = self.status
+        if status is not None:
+            now = time.monotonic()
+            if now >= self.next_log:
+                self.next_log = now + self.log_interval
+                print(status())
+
+    def wait_for(self, predicate, timeout=None, status=None):
+        """
+        Blocks until predicate() is true or the timeout expires. status()
+        returns a progress line, printed at most every log_interval.
+        Returns the final value of predicate().
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        self.status = status
+        try:
+            with self.cond:
+                while not predicate():
+                    wait = self.recheck
+                    if deadline is not None:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            return False
+                        wait = min(wait, remaining)
+                    self.cond.wait(wait)
+                return True
+        finally:
+            self.status = None
+
+    def position(self):
+        return self.vehicle.location.global_relative_frame
+
+    def distance_to(self, lat, lon):
+        here = self.position()
+        if here.lat is None or here.lon is None:
+            return None
+        return haversine(here.lat, here.lon, lat, lon)
+
+    def wait_armable(self, timeout=None):
+        return self.wait_for(lambda: self.vehicle.is_armable, timeout,
+                             lambda: " Waiting for vehicle to initialize...")
+
+    def wait_armed(self, timeout=None):
+        return self.wait_for(lambda: self.vehicle.armed, timeout, lambda: " Waiting for arming...")
+
+    def wait_altitude(self, altitude, fraction=0.95, timeout=None):
+        def reached():
+            alt = self.position().alt
+            return alt is not None and alt >= altitude * fraction
+        return self.wait_for(reached, timeout, lambda: f" Altitude: {self.position().alt}")
+
+    def wait_arrival(self, lat, lon, radius_m=2.0, timeout=None):
+        """
+        Waits until the vehicle is within radius_m metres of lat/lon.
+        """
+        def arrived():
+            dist = self.distance_to(lat, lon)
+            return dist is not None and dist <= radius_m
+        def status():
+            dist = self.distance_to(lat, lon)
+            return " Distance to waypoint: " + ("unknown" if dist is None else f"{dist:.1f} m")
+        return self.wait_for(arrived, timeout, status)
@@ -0,0 +1,48 @@
+from seq_window import SeqWindow
+
+MAC = 'aa:bb:cc:dd:ee:ff'
+
+def test_duplicates_and_reordered_are_dropped():
+    window = SeqWindow()
+    assert window.accept(MAC, 10, now=0.0)
+    assert not window.accept(MAC, 10, now=0.1)
+    assert window.accept(MAC, 12, now=0.2)
+    assert not window.accept(MAC, 11, now=0.3)
+    assert window.duplicates == 1 and window.reordered == 1
+
+def test_quick_restart_below_restart_gap_is_followed():
+    # 500 beacons, then the sender restarts its counter 2 s later
+    window = SeqWindow()
+    for seq in range(500):
+        window.accept(MAC, seq, now=seq * 0.1)
+    t0 = 500 * 0.1 + 2.0
+    accepted = [seq for seq in range(500) if window.accept(MAC, seq, now=t0 + seq * 0.1)]
+    assert window.restarts == 1
+    assert accepted == list(range(window.restart_after - 1, 500))
+
+def test_silent_sender_resets_even_while_rejected_frames_arrive():
+    window = SeqWindow(restart_after=1000)
+    window.accept(MAC, 100, now=0.0)
+    # Stale copies keep arriving, the sender is reset once reset_after has
+    # passed since the last accepted beacon
+    accepted = [i for i in range(1, 200) if window.accept(MAC, 0, now=i * 0.1)]
+    assert accepted[0] * 0.1 > window.reset_after
+    assert window.restarts == 1
+
+def test_restart_with_counter_inside_the_window_is_followed():
+    # The old counter never got past the window, so the new sequence numbers
+    # land on bits that are already set
+    window = SeqWindow()
+    for seq in range(30):
+        window.accept(MAC, seq, now=seq * 0.1)
+    t0 = 30 * 0.1 + 1.0
+    accepted = [seq for seq in range(100) if window.accept(MAC, seq, now=t0 + seq * 0.1)]
+    assert window.restarts == 1
+    assert accepted == list(range(window.restart_after - 1, 100))
+
+def test_copies_from_a_second_link_do_not_restart_the_sender():
+    window = SeqWindow()
+    for seq in range(200):
+        assert window.accept(MAC, seq, now=seq * 0.1)
+        assert not window.accept(MAC, seq, now=seq * 0.1 + 0.01)
+    assert window.restarts == 0 and window.duplicates == 200
@@ -0,0 +1,98 @@
+from array import array
+import numpy as np
+from geodesy import haversine, bearing
+
+TRACK_FIELDS = ('t', 'lat', 'lon', 'speed')
+
+class TrackBuffer():
+    """
+    Fixed-capacity ring of track samples stored in one array('d').
+
+    Each sample is written twice, at slot i and at slot i + capacity, so the
+    newest n samples are always contiguous and last()/window() can hand out
+    views without copying. Memory stays constant for any flight length.
+    Views alias the buffer: use them before appending again.
+    """
+    def __init__(self, capacity=256, fields=TRACK_FIELDS):
+        self.capacity = capacity
+        self.fields = tuple(fields)
+        self.width = len(self.fields)
+        self.data = array('d', [0.0]) * (2 * capacity * self.width)
+        self.view = memoryview(self.data)
+        self.head = 0
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def append(self, *values):
+        w = self.width
+        i = self.head * w
+        j = i + self.capacity * w
+        data = self.data
+        for k in range(w):
+            data[i + k] = data[j + k] = values[k]
+        self.head = (self.head + 1) % self.capacity
+        if self.count < self.capacity:
+            self.count += 1
+
+    def clear(self):
+        self.head = 0
+        self.count = 0
+
+    def _span(self, n):
+        n = min(n, self.count)
+        end = self.head + self.capacity
+        return n, (end - n) * self.width, end * self.width
+
+    def latest(self):
+        if self.count == 0:
+            return None
+        i = ((self.head - 1) % self.capacity) * self.width
+        return tuple(self.data[i:i + self.width])
+
+    def last(self, n):
+        """
+        The newest n samples, oldest first, as an (n, width) memoryview.
+        """
+        n, start, end = self._span(n)
+        if n == 0:
+            return None
+        return self.view[start:end].cast('B').cast('d', [n, self.width])
+
+    def window(self, n):
+        """
+        The newest n samples, oldest first, as an (n, width) NumPy view.
+        """
+        n, start, end = self._span(n)
+        return np.frombuffer(self.data, dtype=np.float64, count=end - start,
+                             offset=start * self.data.itemsize).reshape(n, self.width)
+
+    def column(self, name, n):
+        return self.window(n)[:, self.fields.index(name)]
+
+    def heading(self, min_move_m=0.5):
+        """
+        Bearing from the most recent sample at least min_move_m away to the
+        newest one, or None if the track has not moved that far.
+        """
+        if self.count < 2:
+            return None
+        lat_i = self.fields.index('lat')
+        lon_i = self.fields.index('lon')
+        w = self.width
+        end = self.head + self.capacity
+        data = self.data
+        lat2 = data[(end - 1) * w + lat_i]
+        lon2 = data[(end - 1) * w + lon_i]
+        for p in range(end - 2, end - self.count - 1, -1):
+            lat1 = data[p * w + lat_i]
+            lon1 = data[p * w + lon_i]
+            if haversine(lat1, lon1, lat2, lon2) >= min_move_m:
+                return bearing(lat1, lon1, lat2, lon2)
+        return None
+
+    def mean_speed(self, n):
+        if self.count == 0:
+            return None
+        return float(self.column('speed', n).mean())
@@ -0,0 +1,203 @@
+import math
+from collections import namedtuple
+import numpy as np
+from geodesy import enu_batch, track_bearings, track_distances
+
+# Mission items, numeric MAVLink values as in follow_controller
+MAV_FRAME_GLOBAL_RELATIVE_ALT = 3
+MAV_CMD_NAV_WAYPOINT = 16
+MAV_CMD_NAV_TAKEOFF = 22
+
+SIMPLIFY_METHODS = ('rdp', 'decimate')
+
+# Same positional fields as dronekit.Command, used when dronekit is not around
+MissionItem = namedtuple('MissionItem', [
+    'target_system', 'target_component', 'seq', 'frame', 'command', 'current', 'autocontinue',
+    'param1', 'param2', 'param3', 'param4', 'x', 'y', 'z'])
+
+def rdp(lat, lon, tolerance_m):
+    """
+    Ramer-Douglas-Peucker on a lat/lon track. Returns the sorted indices of
+    the points kept; no dropped point is further than tolerance_m from the
+    simplified path. Both ends are always kept.
+    """
+    n = len(lat)
+    if n < 3:
+        return list(range(n))
+    xy = enu_batch(lat, lon, lat[0], lon[0])[:, :2]
+    keep = np.zeros(n, dtype=bool)
+    keep[0] = keep[-1] = True
+    # Explicit stack instead of recursion, trails can be long
+    stack = [(0, n - 1)]
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+        seg = xy[last] - xy[first]
+        rel = xy[first + 1:last] - xy[first]
+        length = math.hypot(seg[0], seg[1])
+        if length == 0:
+            dist = np.hypot(rel[:, 0], rel[:, 1])
+        else:
+            dist = np.abs(seg[0] * rel[:, 1] - seg[1] * rel[:, 0]) / length
+        i = int(np.argmax(dist))
+        if dist[i] > tolerance_m:
+            split = first + 1 + i
+            keep[split] = True
+            stack.append((first, split))
+            stack.append((split, last))
+    return np.flatnonzero(keep).tolist()
+
+def decimate(lat, lon, min_dist_m, min_angle_deg=15.0):
+    """
+    Keeps a point once it is min_dist_m from the last kept point, or earlier
+    if the course has turned by more than min_angle_deg since then. Both
+    ends are always kept.
+    """
+    n = len(lat)
+    if n < 3:
+        return list(range(n))
+    steps = track_distances(lat, lon)
+    courses = track_bearings(lat, lon)
+    keep = [0]
+    travelled = 0.0
+    course = None
+    for i in range(1, n - 1):
+        travelled += steps[i - 1]
+        if steps[i - 1] > 0 and course is None:
+            course = courses[i - 1]
+        turn = 0.0
+        if course is not None and steps[i] > 0:
+            turn = abs((courses[i] - course + 180.0) % 360.0 - 180.0)
+        if travelled >= min_dist_m or (turn > min_angle_deg and travelled > 0):
+            keep.append(i)
+            travelled = 0.0
+            course = None
+    keep.append(n - 1)
+    return keep
+
+def simplify_indices(points, tolerance_m, method='rdp', min_angle_deg=15.0):
+    """
+    Sorted indices of the (lat, lon) points kept by the simplification.
+    """
+    if len(points) < 3:
+        return list(range(len(points)))
+    lat = np.array([p[0] for p in points])
+    lon = np.array([p[1] for p in points])
+    if method == 'rdp':
+        return rdp(lat, lon, tolerance_m)
+    if method == 'decimate':
+        return decimate(lat, lon, tolerance_m, min_angle_deg)
+    raise ValueError(f"unknown simplification method {method}")
+
+def simplify(points, tolerance_m, method='rdp', min_angle_deg=15.0):
+    """
+    Simplified copy of a list of (lat, lon) points.
+    """
+    return [points[i] for i in simplify_indices(points, tolerance_m, method, min_angle_deg)]
+
+def path_length(points):
+    if len(points) < 2:
+        return 0.0
+    return float(np.sum(track_distances([p[0] for p in points], [p[1] for p in points])))
+
+class TrailMission():
+    """
+    Flies a breadcrumb trail as one AUTO mission instead of goto-and-hover legs.
+
+    Raw points are simplified and uploaded through vehicle.commands as
+    pass-through waypoints (no hold time, acceptance radius accept_radius_m),
+    so the vehicle flies the path at cruise speed without stopping. New
+    points are buffered and appended once they add min_append_m of path,
+    or on flush(); each batch is simplified starting from the last uploaded
+    waypoint so the joins are as clean as the rest of the path. passed()
+    maps the mission progress back to the number of raw points flown past.
+    """
+    def __init__(self, vehicle, altitude, tolerance_m=2.0, method='rdp', min_angle_deg=15.0,
+                 accept_radius_m=2.0, min_append_m=20.0, command=MissionItem):
+        if method not in SIMPLIFY_METHODS:
+            raise ValueError(f"unknown simplification method {method}")
+        self.vehicle = vehicle
+        self.altitude = altitude
+        self.tolerance_m = tolerance_m
+        self.method = method
+        self.min_angle_deg = min_angle_deg
+        self.accept_radius_m = accept_radius_m
+        self.min_append_m = min_append_m
+        self.command = command
+        self.waypoints = []
+        # Raw points up to and including each waypoint
+        self.covers = []
+        self.pending = []
+        self.raw_points = 0
+        self.uploads = 0
+
+    def _item(self, cmd, lat, lon, param2=0.0):
+        return self.command(0, 0, 0, MAV_FRAME_GLOBAL_RELATIVE_ALT, cmd, 0, 1,
+                            0.0, param2, 0.0, 0.0, lat, lon, self.altitude)
+
+    def start(self, points):
+        """
+        Replaces the vehicle's mission with the simplified trail.
+        """
+        cmds = self.vehicle.commands
+        # dronekit only edits a mission it has downloaded
+        cmds.download()
+        cmds.wait_ready()
+        cmds.clear()
+        # Ignored by the autopilot when already airborne
+        cmds.add(self._item(MAV_CMD_NAV_TAKEOFF, 0.0, 0.0))
+        self.waypoints = []
+        self.covers = []
+        self.pending = []
+        self.raw_points = 0
+        self.add(points, force=True)
+        return len(self.waypoints)
+
+    def add(self, points, force=False):
+        """
+        Buffers new raw points and uploads them once enough path has built
+        up. Returns the number of waypoints appended.
+        """
+        self.raw_points += len(points)
+        self.pending.extend(points)
+        if not self.pending:
+            return 0
+        anchor = self.waypoints[-1:]
+        if not force and path_length(anchor + self.pending) < self.min_append_m:
+            return 0
+        points = anchor + self.pending
+        keep = simplify_indices(points, self.tolerance_m, self.method, self.min_angle_deg)
+        # Raw index of the first pending point
+        first = self.raw_points - len(self.pending) - len(anchor)
+        new = [points[i] for i in keep if i >= len(anchor)]
+        self.covers.extend(first + i + 1 for i in keep if i >= len(anchor))
+        self.pending = []
+        cmds = self.vehicle.commands
+        for lat, lon in new:
+            cmds.add(self._item(MAV_CMD_NAV_WAYPOINT, lat, lon, self.accept_radius_m))
+        self.waypoints.extend(new)
+        cmds.upload()
+        self.uploads += 1
+        return len(new)
+
+    def flush(self):
+        return self.add([], force=True)
+
+    def length(self):
+        return path_length(self.waypoints)
+
+    def passed(self, next_index, at_end=False):
+        """
+        Raw trail points flown past when the vehicle is on mission item
+        next_index, all uploaded ones once at_end.
+        """
+        # Item 1 is the takeoff, waypoint k is item k + 2
+        done = len(self.waypoints) if at_end else min(max(0, next_index - 2), len(self.waypoints))
+        return self.covers[done - 1] if done else 0
+
+    def last_index(self):
+        """
+        1-based mission index of the last waypoint, as in vehicle.commands.next.
+        """
+        return self.vehicle.commands.count
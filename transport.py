@@ -0,0 +1,401 @@
+import asyncio
+import queue
+import socket
+import threading
+import time
+from beacon import peek_seq, peek_timestamp
+from seq_window import SeqWindow
+from wsmp_codec import HLE_MAC_OFFSET, HLE_WSMP_HDR_LEN
+
+# Links other than WSMP carry the sender MAC, as in the hle_wsmp header,
+# followed by the beacon payload
+LINK_MAC_LEN = 6
+
+# u-blox AT interface of the BLE module: the response to AT+UBTGCHA gives
+# the characteristic's value handle, connect/disconnect URCs the handle of
+# the central, notifications are sent with AT+UBTGSN and arrive as +UUBTGN
+BLE_CHA_RESPONSE = '+UBTGCHA:'
+BLE_CONNECTED = '+UUBTACLC:'
+BLE_DISCONNECTED = '+UUBTACLD:'
+BLE_NOTIFICATION = '+UUBTGN:'
+
+# Other links fill the primary's gaps while their latency is within this of
+# the primary's. Latencies are only compared between links, so an offset
+# between the sender's and receiver's clocks cancels out.
+MAX_LINK_EXTRA_LATENCY_MS = 200.0
+# All links are used once the primary has not delivered for this long
+FAILOVER_AFTER_S = 0.5
+# A link not heard for this long is down
+LINK_SILENCE_S = 2.0
+# Loss counts as this much latency when ranking links
+LOSS_PENALTY_MS = 1000.0
+# The primary link only changes for one ranked this much better
+SWITCH_MARGIN_MS = 100.0
+# Frames a link must have delivered before it can take over from a primary that is still up
+MIN_PRIMARY_FRAMES = 20
+
+def link_frame(frame):
+    """
+    Sender MAC + beacon payload of an hle_wsmp frame, for the non-WSMP links.
+    """
+    return bytes(frame[HLE_MAC_OFFSET:HLE_MAC_OFFSET + LINK_MAC_LEN]) + bytes(frame[HLE_WSMP_HDR_LEN:])
+
+class WsmpLink():
+    """
+    The V2X sidelink: hle_wsmp frames handed to the OBU stack by a WsmpSender.
+    """
+    name = 'wsmp'
+
+    def __init__(self, sender):
+        self.sender = sender
+
+    def send(self, frame):
+        return self.sender.send(frame)
+
+    def poll(self):
+        self.sender.poll_acks()
+
+    def stats(self):
+        return {'sent': self.sender.sent, 'acked': self.sender.acked, 'dropped': self.sender.dropped,
+                'behind': self.sender.behind}
+
+class UdpLink():
+    """
+    Link frames as UDP datagrams, for tests and a local network.
+    """
+    name = 'udp'
+
+    def __init__(self, host, port):
+        self.address = (host, port)
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.socket.setblocking(False)
+        self.sent = 0
+        self.dropped = 0
+
+    def send(self, frame):
+        try:
+            self.socket.sendto(link_frame(frame), self.address)
+        except OSError:
+            self.dropped += 1
+            return False
+        self.sent += 1
+        return True
+
+    def poll(self):
+        pass
+
+    def stats(self):
+        return {'sent': self.sent, 'dropped': self.dropped}
+
+class BleLink():
+    """
+    Link frames as notifications of the GATT characteristic created with
+    AT+UBTGCHA, written to the module by a background thread.
+
+    Only the newest max_queue frames wait for the serial port, older ones
+    are dropped, so a slow or stuck BLE module never holds up the beacon
+    loop. A second thread reads the module's responses for the value
+    handle (unless value_handle is given) and the connection handle of the
+    central; until both are known frames are counted as not_ready. The
+    characteristic and the connection MTU must fit LINK_MAC_LEN + the beacon.
+    """
+    name = 'ble'
+
+    def __init__(self, value_handle=None, max_queue=4):
+        self.value_handle = value_handle
+        self.conn_handle = None
+        self.port = None
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.sent = 0
+        self.dropped = 0
+        self.not_ready = 0
+
+    def attach(self, port):
+        """
+        Starts sending on the opened serial port (read/write, unbuffered).
+        """
+        self.port = port
+        threading.Thread(target=self._write_loop, daemon=True).start()
+        threading.Thread(target=self._read_loop, daemon=True).start()
+        return self
+
+    def send(self, frame):
+        if self.port is None or self.value_handle is None or self.conn_handle is None:
+            self.not_ready += 1
+            return False
+        line = f"AT+UBTGSN={self.conn_handle},{self.value_handle},{link_frame(frame).hex()}\r\n".encode()
+        while True:
+            try:
+                self.queue.put_nowait(line)
+                return True
+            except queue.Full:
+                # Newest first, the oldest queued beacon is the one to drop
+                try:
+                    self.queue.get_nowait()
+                    self.dropped += 1
+                except queue.Empty:
+                    pass
+
+    def poll(self):
+        pass
+
+    def stats(self):
+        return {'sent': self.sent, 'dropped': self.dropped, 'not_ready': self.not_ready,
+                'connected': self.conn_handle is not None}
+
+    def _write_loop(self):
+        while True:
+            line = self.queue.get()
+            try:
+                self.port.write(line)
+                self.sent += 1
+            except OSError as e:
+                self.dropped += 1
+                print("BLE write failed:", e)
+                time.sleep(1.0)
+
+    def _read_loop(self):
+        buf = b''
+        while True:
+            try:
+                chunk = self.port.read(256)
+            except OSError:
+                chunk = b''
+            if not chunk:
+                time.sleep(0.1)
+                continue
+            buf += chunk
+            *lines, buf = buf.split(b'\n')
+            for raw in lines:
+                self._on_line(raw.decode('ascii', errors='ignore').strip())
+
+    def _on_line(self, line):
+        if line.startswith(BLE_CHA_RESPONSE) and self.value_handle is None:
+            self.value_handle = int(line[len(BLE_CHA_RESPONSE):].split(',')[0])
+        elif line.startswith(BLE_CONNECTED):
+            self.conn_handle = int(line[len(BLE_CONNECTED):].split(',')[0])
+        elif line.startswith(BLE_DISCONNECTED):
+            self.conn_handle = None
+
+class MultiLinkSender():
+    """
+    Sends every beacon over all links. A link that fails or falls behind
+    only loses its own copy, the others are not held up.
+    """
+    def __init__(self, links):
+        self.links = list(links)
+
+    def send(self, frame):
+        sent = False
+        for link in self.links:
+            if link.send(frame):
+                sent = True
+        return sent
+
+    def poll(self):
+        for link in self.links:
+            link.poll()
+
+    def stats(self):
+        return {link.name: link.stats() for link in self.links}
+
+def parse_ble_notification(line):
+    """
+    Payload of a +UUBTGN notification URC, None for any other line.
+    """
+    if not line.startswith(BLE_NOTIFICATION):
+        return None
+    parts = line[len(BLE_NOTIFICATION):].split(',')
+    if len(parts) < 3:
+        return None
+    try:
+        return bytes.fromhex(parts[2].strip())
+    except ValueError:
+        return None
+
+class BleLinkReceiver():
+    """
+    Reads beacon notifications from a BLE module connected as central to the
+    transmitter's characteristic, with notifications enabled. on_frame(data)
+    is called from the reader thread with every link frame.
+    """
+    def __init__(self, path, on_frame, reopen_interval=1.0):
+        self.path = path
+        self.on_frame = on_frame
+        self.reopen_interval = reopen_interval
+        self.frames = 0
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        return self
+
+    def _run(self):
+        while True:
+            try:
+                with open(self.path, 'rb', buffering=0) as port:
+                    buf = b''
+                    while True:
+                        chunk = port.read(256)
+                        if not chunk:
+                            time.sleep(0.01)
+                            continue
+                        buf += chunk
+                        *lines, buf = buf.split(b'\n')
+                        for raw in lines:
+                            data = parse_ble_notification(raw.decode('ascii', errors='ignore').strip())
+                            if data is not None:
+                                self.frames += 1
+                                self.on_frame(data)
+            except OSError as e:
+                print("BLE receiver:", e)
+                time.sleep(self.reopen_interval)
+
+class DatagramLink(asyncio.DatagramProtocol):
+    """
+    asyncio receiver for UdpLink datagrams, on_frame(data) runs on the loop.
+    """
+    def __init__(self, on_frame):
+        self.on_frame = on_frame
+        self.frames = 0
+
+    def datagram_received(self, data, addr):
+        self.frames += 1
+        self.on_frame(data)
+
+class LinkHealth():
+    """
+    Loss and latency of the beacons one link delivers, duplicates included.
+    """
+    def __init__(self, name, latency_alpha=0.1, loss_decay=0.98):
+        self.name = name
+        self.latency_alpha = latency_alpha
+        self.loss_decay = loss_decay
+        self.latency_ms = None
+        # Decayed counts of expected and missing sequence numbers
+        self.expected = 0.0
+        self.missing = 0.0
+        self.last_seq = {}
+        self.last_heard = None
+        self.frames = 0
+        self.used = 0
+        self.suppressed = 0
+
+    def observe(self, mac, seq, latency_ms, now):
+        self.frames += 1
+        self.last_heard = now
+        if latency_ms is not None:
+            if self.latency_ms is None:
+                self.latency_ms = latency_ms
+            else:
+                self.latency_ms += self.latency_alpha * (latency_ms - self.latency_ms)
+        if seq is None:
+            return
+        last = self.last_seq.get(mac)
+        self.last_seq[mac] = seq
+        if last is None:
+            return
+        ahead = (seq - last) & 0xFFFFFFFF
+        if 0 < ahead < 1000:
+            self.expected = self.expected * self.loss_decay + ahead
+            self.missing = self.missing * self.loss_decay + ahead - 1
+
+    def loss(self):
+        return self.missing / self.expected if self.expected else 0.0
+
+    def score(self):
+        """
+        Lower is better: latency with loss as a penalty.
+        """
+        return (self.latency_ms or 0.0) + LOSS_PENALTY_MS * self.loss()
+
+    def heard(self, now, silence_s):
+        return self.last_heard is not None and now - self.last_heard <= silence_s
+
+    def summary(self):
+        return {'frames': self.frames, 'used': self.used, 'suppressed': self.suppressed,
+                'loss': round(self.loss(), 3),
+                'latency_ms': None if self.latency_ms is None else round(self.latency_ms, 1)}
+
+class LinkSelector():
+    """
+    Receive side of several links carrying the same beacons.
+
+    Every copy updates its link's loss and latency. The primary is the link
+    with the best latency and loss that is still heard; it only changes for
+    one ranked switch_margin_ms better or when it goes down, changes are
+    counted as switches. Beacons are taken from the primary and from every
+    link within max_extra_latency_ms of it, whichever copy arrives first is
+    used and the shared SeqWindow drops the others on (mac, seq), so those
+    links only add beacons the primary missed. Links much faster or slower
+    than the primary are ignored until the primary has been quiet for
+    failover_after seconds. A lossy fast link thus gives way to a clean
+    slow one instead of making its beacons arrive out of order.
+    """
+    def __init__(self, window=None, max_extra_latency_ms=MAX_LINK_EXTRA_LATENCY_MS,
+                 failover_after=FAILOVER_AFTER_S, silence_s=LINK_SILENCE_S, switch_margin_ms=SWITCH_MARGIN_MS):
+        self.window = window or SeqWindow()
+        self.max_extra_latency_ms = max_extra_latency_ms
+        self.failover_after = failover_after
+        self.silence_s = silence_s
+        self.switch_margin_ms = switch_margin_ms
+        self.links = {}
+        self.primary = None
+        self.switches = 0
+
+    def link(self, name):
+        health = self.links.get(name)
+        if health is None:
+            health = self.links[name] = LinkHealth(name)
+        return health
+
+    def _update_primary(self, heard):
+        current = self.links.get(self.primary)
+        if current is not None and current in heard:
+            heard = [h for h in heard if h is current or h.frames >= MIN_PRIMARY_FRAMES]
+        best = min(heard, key=LinkHealth.score)
+        if current is None or current not in heard or best.score() < current.score() - self.switch_margin_ms:
+            if current is not None and best is not current:
+                self.switches += 1
+                print(f"link {best.name} is now primary (was {current.name})")
+            self.primary = best.name
+
+    def usable(self, health, now):
+        """
+        Whether copies from this link are used right now.
+        """
+        heard = [h for h in self.links.values() if h.heard(now, self.silence_s)]
+        if not heard:
+            return True
+        self._update_primary(heard)
+        primary = self.links[self.primary]
+        if health is primary or now - primary.last_heard > self.failover_after:
+            return True
+        if health.latency_ms is None or primary.latency_ms is None:
+            return True
+        # A copy much earlier or later than the primary's would interleave
+        # beacons of different age, and the SeqWindow then drops the older
+        return abs(health.latency_ms - primary.latency_ms) <= self.max_extra_latency_ms
+
+    def accept(self, name, mac, buf, offset, rx_ms, now=None):
+        """
+        Returns True if this copy of the beacon at buf[offset:] should be processed.
+        """
+        now = time.monotonic() if now is None else now
+        seq = peek_seq(buf, offset)
+        sent_ms = peek_timestamp(buf, offset)
+        health = self.link(name)
+        latency_ms = rx_ms - sent_ms if sent_ms is not None and rx_ms is not None else None
+        health.observe(mac, seq, latency_ms, now)
+        if len(self.links) > 1 and not self.usable(health, now):
+            health.suppressed += 1
+            return False
+        if not self.window.accept(mac, seq, now):
+            return False
+        health.used += 1
+        return True
+
+    def summary(self):
+        return dict({name: h.summary() for name, h in self.links.items()},
+                    primary=self.primary, switches=self.switches)
@@ -0,0 +1,72 @@
+import os
+from csv_tail import CsvTail
+
+class WaypointQueue():
+    """
+    Waypoints from the breadcrumb CSV, consumed in file order.
+
+    The CSV is read once and then followed incrementally, so newly appended
+    points are picked up without re-parsing the file. The CSV itself is never
+    rewritten: progress is kept in an append-only journal next to it
+    (<csv>.cursor), one line with the number of visited waypoints per visit.
+    After a crash the queue resumes from the last journal entry. Delete the
+    journal to fly a new trail from the beginning.
+    """
+    def __init__(self, filename, journal_file=None):
+        self.tail = CsvTail(filename, from_start=True)
+        self.tail_resets = 0
+        self.waypoints = []
+        self.journal_file = journal_file or filename + '.cursor'
+        self.visited = self._load_cursor()
+        self.journal = open(self.journal_file, 'a')
+
+    def _load_cursor(self):
+        try:
+            with open(self.journal_file, 'rb') as f:
+                f.seek(0, os.SEEK_END)
+                size = f.tell()
+                f.seek(max(0, size - 64))
+                lines = f.read().split(b'\n')
+        except FileNotFoundError:
+            return 0
+        # The last line may be torn if we crashed mid-write
+        for line in reversed(lines):
+            try:
+                return int(line)
+            except ValueError:
+                continue
+        return 0
+
+    def refresh(self):
+        rows = self.tail.poll()
+        if self.tail.resets != self.tail_resets:
+            # File was (re)opened from the start, rows holds its full content
+            self.tail_resets = self.tail.resets
+            self.waypoints = []
+        for row in rows:
+            try:
+                self.waypoints.append((float(row['Latitude']), float(row['Longitude'])))
+            except (KeyError, ValueError):
+                continue
+
+    def peek(self):
+        """
+        Returns the next unvisited (lat, lon), or None if there is none yet.
+        """
+        self.refresh()
+        if self.visited < len(self.waypoints):
+            return self.waypoints[self.visited]
+        return None
+
+    def mark_visited(self, count=1):
+        self.visited += count
+        self.journal.write(f"{self.visited}\n")
+        self.journal.flush()
+        os.fsync(self.journal.fileno())
+
+    def remaining(self):
+        return max(0, len(self.waypoints) - self.visited)
+
+    def close(self):
+        self.journal.close()
+        self.tail.close()
@@ -0,0 +1,130 @@
+import struct
+from collections import namedtuple
+from beacon import encode_beacon_into
+
+# Field schemas of the WSMP messages exchanged with the OBU stack over
+# ZeroMQ, in wire order (little endian). hle_wsmp goes from the application
+# to the stack, wsmp_hle comes back from the stack with each received frame.
+HLE_WSMP_FIELDS = [
+    ('mode', 'B'),
+    ('ch_id', 'B'),
+    ('time_slot', 'B'),
+    ('data_rate', 'B'),
+    ('tx_pow', 'b'),
+    ('ch_ld', 'B'),
+    ('info', 'B'),
+    ('usr_prio', 'B'),
+    ('expiry_time', 'B'),
+    ('mac', '6s'),
+    ('psid', 'I'),
+    ('dlen', 'H'),
+]
+
+WSMP_HLE_FIELDS = [
+    ('wsmp_version', 'B'),
+    ('channel_no', 'B'),
+    ('data_rate', 'B'),
+    ('tx_pow_level', 'b'),
+    ('channel_load', 'B'),
+    ('user_priority', 'B'),
+    ('peer_mac_addr', '6s'),
+    ('psid', 'I'),
+    ('dlen', 'H'),
+]
+
+def schema_struct(fields):
+    return struct.Struct('<' + ''.join(fmt for _, fmt in fields))
+
+HLE_WSMP_STRUCT = schema_struct(HLE_WSMP_FIELDS)
+HLE_WSMP_PREFIX_STRUCT = schema_struct(HLE_WSMP_FIELDS[:-1])
+HLE_WSMP_HDR_LEN = HLE_WSMP_STRUCT.size
+WSMP_HLE_STRUCT = schema_struct(WSMP_HLE_FIELDS)
+WSMP_HLE_HDR_LEN = WSMP_HLE_STRUCT.size
+DLEN_STRUCT = struct.Struct('<H')
+PEER_MAC_OFFSET = schema_struct(WSMP_HLE_FIELDS[:6]).size
+PEER_MAC_STRUCT = struct.Struct('<6s')
+CHANNEL_LOAD_OFFSET = schema_struct(WSMP_HLE_FIELDS[:4]).size
+# Sender's own MAC in hle_wsmp, the peer_mac_addr receivers see
+HLE_MAC_OFFSET = schema_struct(HLE_WSMP_FIELDS[:9]).size
+
+# wsmp_version the stack reports in received frames
+WSMP_VERSION = 3
+
+WsmpHle = namedtuple('WsmpHle', [name for name, _ in WSMP_HLE_FIELDS] + ['data'])
+
+def mac_to_bytes(mac):
+    return mac.to_bytes(6, 'little')
+
+class HleWsmpEncoder():
+    """
+    Builds hle_wsmp frames into one reusable buffer. Everything up to dlen
+    is constant for a transmitter, so it is packed once at construction and
+    each frame only writes dlen and the payload.
+
+    encode() returns a memoryview into the internal buffer, valid until the
+    next call. Hand it to zmq send() (which copies it) before encoding again.
+    """
+    def __init__(self, mode=1, ch_id=172, time_slot=0, data_rate=12, tx_pow=-9, ch_ld=0,
+                 info=0, usr_prio=0, expiry_time=0, mac=16557351571215, psid=32, max_len=1400):
+        self.buf = bytearray(HLE_WSMP_HDR_LEN + max_len)
+        self.view = memoryview(self.buf)
+        self.max_len = max_len
+        HLE_WSMP_PREFIX_STRUCT.pack_into(self.buf, 0, mode, ch_id, time_slot, data_rate, tx_pow,
+                                         ch_ld, info, usr_prio, expiry_time, mac_to_bytes(mac), psid)
+
+    def _finish(self, dlen):
+        DLEN_STRUCT.pack_into(self.buf, HLE_WSMP_HDR_LEN - DLEN_STRUCT.size, dlen)
+        return self.view[:HLE_WSMP_HDR_LEN + dlen]
+
+    def encode(self, data):
+        dlen = len(data)
+        if dlen > self.max_len:
+            raise ValueError("WSMP payload of %d bytes exceeds %d" % (dlen, self.max_len))
+        self.buf[HLE_WSMP_HDR_LEN:HLE_WSMP_HDR_LEN + dlen] = data
+        return self._finish(dlen)
+
+    def encode_beacon(self, seq, timestamp, latitude, longitude, speed, heading, fix_age_ms=0):
+        """
+        Packs a beacon payload directly behind the header, no intermediate bytes.
+        """
+        dlen = encode_beacon_into(self.buf, HLE_WSMP_HDR_LEN, seq, timestamp,
+                                  latitude, longitude, speed, heading, fix_age_ms)
+        return self._finish(dlen)
+
+def decode_wsmp_hle(buf):
+    """
+    Decodes a wsmp_hle frame without copying: data is a memoryview of the
+    payload inside buf. Returns None if buf is shorter than the header.
+    """
+    if len(buf) < WSMP_HLE_HDR_LEN:
+        return None
+    fields = WSMP_HLE_STRUCT.unpack_from(buf, 0)
+    data = memoryview(buf)[WSMP_HLE_HDR_LEN:WSMP_HLE_HDR_LEN + fields[-1]]
+    return WsmpHle(*fields, data)
+
+def hle_to_wsmp_hle(frame, channel_load=0):
+    """
+    Turns a transmitted hle_wsmp frame into the wsmp_hle frame a receiver sees.
+    """
+    (_, ch_id, _, data_rate, tx_pow, _, _, usr_prio, _, mac, psid, dlen) = HLE_WSMP_STRUCT.unpack_from(frame, 0)
+    data = bytes(frame[HLE_WSMP_HDR_LEN:HLE_WSMP_HDR_LEN + dlen])
+    return WSMP_HLE_STRUCT.pack(WSMP_VERSION, ch_id, data_rate, tx_pow, channel_load,
+                                usr_prio, mac, psid, len(data)) + data
+
+def peek_peer_mac(buf):
+    """
+    Sender MAC of a wsmp_hle frame without decoding the header, None if buf
+    is too short.
+    """
+    if len(buf) < WSMP_HLE_HDR_LEN:
+        return None
+    return PEER_MAC_STRUCT.unpack_from(buf, PEER_MAC_OFFSET)[0]
+
+def peek_channel_load(buf):
+    """
+    channel_load of a wsmp_hle frame without decoding the header, None if
+    buf is too short.
+    """
+    if len(buf) < WSMP_HLE_HDR_LEN:
+        return None
+    return buf[CHANNEL_LOAD_OFFSET]
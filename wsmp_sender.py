@@ -0,0 +1,99 @@
+import time
+import zmq
+
+WSMP_ENDPOINT = "tcp://localhost:5555"
+# Frames handed to the stack and not yet acked before new beacons are skipped
+MAX_OUTSTANDING = 4
+# Unacked frames are written off after this long without any ack
+ACK_TIMEOUT_S = 1.0
+
+class WsmpSender():
+    """
+    Hands hle_wsmp frames to the OBU stack.
+
+    socket_type selects the transmit mode:
+      'req'    - original lockstep REQ, every send waits for the ack
+      'dealer' - pipelined requests to the stack's REP socket; acks are
+                 drained without blocking by poll_acks()
+      'push'   - fire and forget to a PULL endpoint
+    In the non-blocking modes a frame is dropped (and counted) when hwm
+    frames are already queued, so a slow stack never stalls the caller.
+    A DEALER hands frames straight on to the stack's receive queue, so its
+    hwm is rarely reached; there a beacon is also skipped (counted as
+    behind) while max_outstanding frames wait for their ack, so the stack
+    never works through a backlog of outdated positions. Frames unacked for
+    ack_timeout seconds are written off as lost.
+    """
+    def __init__(self, context, endpoint=WSMP_ENDPOINT, socket_type='dealer', hwm=100,
+                 max_outstanding=MAX_OUTSTANDING, ack_timeout=ACK_TIMEOUT_S):
+        self.socket_type = socket_type
+        if socket_type == 'req':
+            self.socket = context.socket(zmq.REQ)
+        elif socket_type == 'dealer':
+            self.socket = context.socket(zmq.DEALER)
+        elif socket_type == 'push':
+            self.socket = context.socket(zmq.PUSH)
+        else:
+            raise ValueError("unknown WSMP socket type: %s" % socket_type)
+        self.socket.setsockopt(zmq.SNDHWM, hwm)
+        self.socket.setsockopt(zmq.RCVHWM, hwm)
+        self.socket.setsockopt(zmq.LINGER, 0)
+        self.socket.connect(endpoint)
+        self.max_outstanding = max_outstanding
+        self.ack_timeout = ack_timeout
+        self.sent = 0
+        self.acked = 0
+        self.dropped = 0
+        self.behind = 0
+        self.lost = 0
+        self.last_ack = time.monotonic()
+
+    def send(self, frame):
+        if self.socket_type == 'req':
+            self.socket.send(frame)
+            self.socket.recv()
+            self.sent += 1
+            self.acked += 1
+            return True
+        if self.socket_type == 'dealer' and self.outstanding() >= self.max_outstanding:
+            self.poll_acks()
+            if self.outstanding() >= self.max_outstanding:
+                self.behind += 1
+                return False
+        try:
+            if self.socket_type == 'dealer':
+                # Empty delimiter frame so the stack's REP socket can route the ack back
+                self.socket.send_multipart([b'', frame], flags=zmq.NOBLOCK)
+            else:
+                self.socket.send(frame, flags=zmq.NOBLOCK)
+        except zmq.Again:
+            self.dropped += 1
+            return False
+        self.sent += 1
+        return True
+
+    def poll_acks(self):
+        if self.socket_type != 'dealer':
+            return 0
+        count = 0
+        while True:
+            try:
+                self.socket.recv_multipart(flags=zmq.NOBLOCK)
+            except zmq.Again:
+                break
+            count += 1
+        now = time.monotonic()
+        if count:
+            self.acked += count
+            self.last_ack = now
+        elif self.outstanding() and now - self.last_ack > self.ack_timeout:
+            # The stack dropped them or restarted, stop waiting
+            self.lost += self.outstanding()
+            self.last_ack = now
+        return count
+
+    def outstanding(self):
+        return self.sent - self.acked - self.lost
+
+    def close(self):
+        self.socket.close()